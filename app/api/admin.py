@@ -0,0 +1,106 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.models.user import User
+from app.api.auth import get_current_admin
+from app.services.vector_maintenance import collect_report, run_maintenance
+from app.services import diagnostics
+from app.core.config import DIAGNOSTICS_ENABLED
+
+router = APIRouter()
+
+
+@router.get("/vectors")
+async def vector_store_report(current_admin: User = Depends(get_current_admin)):
+    """
+    Размер CHROMA_DB_PATH по коллекциям, осиротевшие данные и итог последнего обслуживания.
+    """
+    return await asyncio.to_thread(collect_report)
+
+
+@router.post("/vectors/maintenance")
+async def vector_store_maintenance(
+    gc: bool = Query(True, description="Удалить данные групп, которых нет в базе"),
+    rebuild: bool = Query(True, description="Перестроить фрагментированные индексы"),
+    vacuum: bool = Query(False, description="Сжать chroma.sqlite3 (блокирует запись на время работы)"),
+    dry_run: bool = Query(False, description="Только показать, что будет сделано"),
+    current_admin: User = Depends(get_current_admin)
+):
+    """
+    Обслуживание векторного хранилища на работающем сервисе с ограничением скорости I/O.
+    """
+    result = await asyncio.to_thread(run_maintenance, gc, rebuild, vacuum, dry_run)
+    if result["status"] == "locked":
+        raise HTTPException(status_code=409, detail="Обслуживание уже выполняется")
+    return result
+
+
+def require_diagnostics(current_admin: User = Depends(get_current_admin)) -> User:
+    if not DIAGNOSTICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Диагностика выключена (DIAGNOSTICS_ENABLED)")
+    return current_admin
+
+
+@router.post("/diagnostics/profile")
+async def cpu_profile(
+    seconds: float = Query(10, gt=0, description="Длительность, не больше DIAGNOSTICS_MAX_PROFILE_SECONDS"),
+    interval_ms: float = Query(10, gt=0, description="Период снятия стеков"),
+    format: str = Query("folded", description="folded — для flamegraph.pl/speedscope, summary — самые частые функции"),
+    include_idle: bool = Query(False, description="Не отбрасывать потоки, которые ждут (очереди, select)"),
+    current_admin: User = Depends(require_diagnostics)
+):
+    """
+    Выборочный профиль всех потоков процесса по настенному времени: простаивающие потоки отбрасываются,
+    если не задан include_idle. Период — не меньше 10 мс; одновременно выполняется только один профиль.
+    """
+    if format not in ("folded", "summary"):
+        raise HTTPException(status_code=400, detail="Формат должен быть folded или summary")
+    try:
+        stacks, samples = await asyncio.to_thread(diagnostics.sample_stacks, seconds, interval_ms / 1000, include_idle)
+    except diagnostics.ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Профиль уже снимается")
+    if format == "summary":
+        return diagnostics.profile_summary(stacks, samples)
+    return PlainTextResponse(diagnostics.format_folded(stacks))
+
+
+@router.post("/diagnostics/tracemalloc/start")
+def tracemalloc_start(
+    frames: int = Query(10, ge=1, le=50, description="Глубина стека для каждого выделения"),
+    current_admin: User = Depends(require_diagnostics)
+):
+    """
+    Включает tracemalloc; он выключится сам через DIAGNOSTICS_TRACEMALLOC_MAX_MINUTES.
+    Учитываются только выделения после включения.
+    """
+    return diagnostics.start_tracemalloc(frames)
+
+
+@router.get("/diagnostics/tracemalloc")
+def tracemalloc_snapshot(
+    limit: int = Query(30, ge=1, le=500),
+    group_by: str = Query("lineno", description="lineno, filename или traceback"),
+    current_admin: User = Depends(require_diagnostics)
+):
+    """
+    Крупнейшие места выделения памяти, живой на момент снимка.
+    """
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by должен быть lineno, filename или traceback")
+    result = diagnostics.tracemalloc_top(limit, group_by)
+    if result is None:
+        raise HTTPException(status_code=409, detail="tracemalloc не включён: POST /admin/diagnostics/tracemalloc/start")
+    return result
+
+
+@router.post("/diagnostics/tracemalloc/stop")
+def tracemalloc_stop(current_admin: User = Depends(require_diagnostics)):
+    return diagnostics.stop_tracemalloc()
+
+
+@router.get("/diagnostics/memory")
+def memory_breakdown(current_admin: User = Depends(require_diagnostics)):
+    """
+    RSS процесса и его потомков (Chrome), крупнейшие отображения памяти, кэши и пулы приложения.
+    """
+    return diagnostics.memory_report()
@@ -1,26 +1,62 @@
+import threading
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.core.db import get_db
 from app.models.user import User
 from jose import JWTError, jwt
-from app.core.config import SECRET_KEY, ALGORITHM
+from app.core.config import SECRET_KEY, ALGORITHM, AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES, ADMIN_EMAILS
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-       
-        user_email = payload.get("sub")  
-   
-        if user_email is None:
-            raise HTTPException(status_code=401, detail="Ошибка проверки токена (неверный формат email)")
+# email -> ID пользователя для эндпоинтов, которым не нужен весь объект User
+user_id_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+user_id_cache_lock = threading.Lock()
 
-        user = db.query(User).filter(User.email == user_email).first()  
-        if user is None:
-            raise HTTPException(status_code=401, detail="Пользователь не найден")
 
-        return user
+def _email_from_token(token: str) -> str:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Некорректный токен")
+    user_email = payload.get("sub")
+    if user_email is None:
+        raise HTTPException(status_code=401, detail="Ошибка проверки токена (неверный формат email)")
+    return user_email
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_email = _email_from_token(token)
+
+    user = db.query(User).filter(User.email == user_email).first()
+    if user is None:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+
+    return user
+
+
+def get_current_user_id(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> int:
+    """
+    ID текущего пользователя без запроса к БД на повторных обращениях.
+    Подпись и срок токена проверяются каждый раз; кэшируется только поиск пользователя по email.
+    """
+    user_email = _email_from_token(token)
+    with user_id_cache_lock:
+        user_id = user_id_cache.get(user_email)
+    if user_id is not None:
+        return user_id
+
+    user_id = db.query(User.id).filter(User.email == user_email).scalar()
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+    with user_id_cache_lock:
+        user_id_cache[user_email] = user_id
+    return user_id
+
+
+def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Пользователь из ADMIN_EMAILS; остальным — 403"""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return current_user
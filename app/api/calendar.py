@@ -0,0 +1,119 @@
+import asyncio
+from datetime import date, timedelta
+from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+from app.core.db import get_db
+from app.models.user import User
+from app.models.calendar_job import CalendarJob
+from app.models.calendar_post import CalendarPost
+from app.models.user_group_association import UserGroupAssociation
+from app.api.auth import get_current_user
+from app.services.content_calendar import create_job, start_calendar_job, cancel_calendar_job, job_to_dict
+from app.core.config import CALENDAR_MAX_DAYS, CALENDAR_MAX_POSTS_PER_DAY, CALENDAR_MAX_POSTS
+
+router = APIRouter()
+
+class CalendarJobCreate(BaseModel):
+    group_ids: list[int] | None = None
+    days: int = 7
+    posts_per_day: int = 1
+    start_date: date | None = None
+
+
+def _get_user_job(db: Session, user_id: int, job_id: int) -> CalendarJob:
+    job = db.query(CalendarJob).filter(CalendarJob.id == job_id, CalendarJob.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача контент-плана не найдена")
+    return job
+
+
+@router.post("/jobs")
+async def create_calendar_job(
+    request: CalendarJobCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Запускает генерацию контент-плана на days дней по группам пользователя (по умолчанию — по всем).
+    Посты создаются в фоне; прогресс и готовые тексты — в GET /calendar/jobs/{id}.
+    """
+    if not 1 <= request.days <= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Период — от 1 до {CALENDAR_MAX_DAYS} дней")
+    if not 1 <= request.posts_per_day <= CALENDAR_MAX_POSTS_PER_DAY:
+        raise HTTPException(status_code=400, detail=f"Постов в день — от 1 до {CALENDAR_MAX_POSTS_PER_DAY}")
+    start_date = request.start_date or date.today() + timedelta(days=1)
+
+    owned = {
+        vk_group_id for (vk_group_id,) in
+        db.query(UserGroupAssociation.vk_group_id).filter(UserGroupAssociation.user_id == current_user.id)
+    }
+    if request.group_ids:
+        missing = set(request.group_ids) - owned
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Группы не привязаны к пользователю: {sorted(missing)}")
+        selected = sorted(set(request.group_ids))
+    else:
+        selected = sorted(owned)
+    if not selected:
+        raise HTTPException(status_code=400, detail="У пользователя нет групп")
+
+    total = len(selected) * request.days * request.posts_per_day
+    if total > CALENDAR_MAX_POSTS:
+        raise HTTPException(status_code=400, detail=f"Слишком много постов ({total}), максимум {CALENDAR_MAX_POSTS} за задачу")
+
+    job_id = await asyncio.to_thread(create_job, current_user.id, selected, start_date, request.days, request.posts_per_day)
+    start_calendar_job(job_id, current_user.id)
+    return {"id": job_id, "status": "pending", "total_posts": total, "group_ids": selected, "start_date": start_date}
+
+
+@router.get("/jobs")
+def list_calendar_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Задачи контент-плана пользователя, новые первыми.
+    """
+    jobs = (
+        db.query(CalendarJob)
+        .filter(CalendarJob.user_id == current_user.id)
+        .order_by(desc(CalendarJob.created_at))
+        .all()
+    )
+    return [job_to_dict(job) for job in jobs]
+
+
+@router.get("/jobs/{job_id}")
+def get_calendar_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Прогресс задачи и посты: готовые — с текстом, остальные — с темой и временем, если они уже запланированы.
+    """
+    job = _get_user_job(db, current_user.id, job_id)
+    posts = (
+        db.query(CalendarPost)
+        .filter(CalendarPost.job_id == job_id)
+        .order_by(CalendarPost.vk_group_id, CalendarPost.publish_date, CalendarPost.slot)
+        .all()
+    )
+    return job_to_dict(job, posts)
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Останавливает задачу. Уже созданные посты сохраняются.
+    """
+    _get_user_job(db, current_user.id, job_id)
+    if not await cancel_calendar_job(job_id):
+        raise HTTPException(status_code=409, detail="Задача уже завершена")
+    return {"id": job_id, "status": "cancelled"}
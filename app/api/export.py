@@ -0,0 +1,60 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.core.db import get_db
+from app.models.user import User
+from app.models.user_group_association import UserGroupAssociation
+from app.api.auth import get_current_user
+from app.services.export import DATASETS, FORMATS, stream_export
+
+router = APIRouter()
+
+
+@router.get("/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", description="ndjson или csv"),
+    compression: str | None = Query(None, description="zstd — сжать поток"),
+    group_ids: list[int] | None = Query(None, description="Только эти группы (по умолчанию все группы пользователя)"),
+    since: datetime | None = Query(None, description="Посты и аналитика начиная с даты"),
+    until: datetime | None = Query(None, description="Посты и аналитика по дату включительно"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Потоковая выгрузка данных групп пользователя: groups, posts, products, services или analytics.
+    Ответ не собирается в памяти — строки отдаются по мере чтения из БД.
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"Неизвестный набор данных. Доступны: {', '.join(DATASETS)}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Формат должен быть одним из: {', '.join(FORMATS)}")
+    if compression not in (None, "zstd"):
+        raise HTTPException(status_code=400, detail="Поддерживается только сжатие zstd")
+    if since and until and since > until:
+        raise HTTPException(status_code=400, detail="since позже until")
+
+    user_group_ids = {
+        vk_group_id for (vk_group_id,) in
+        db.query(UserGroupAssociation.vk_group_id).filter(UserGroupAssociation.user_id == current_user.id)
+    }
+    if group_ids:
+        missing = set(group_ids) - user_group_ids
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Группы не привязаны к пользователю: {sorted(missing)}")
+        selected = sorted(set(group_ids))
+    else:
+        selected = sorted(user_group_ids)
+
+    filename = f"{dataset}.{format}"
+    media_type = FORMATS[format]
+    if compression:
+        filename += ".zst"
+        media_type = "application/zstd"
+
+    return StreamingResponse(
+        stream_export(dataset, format, current_user.id, selected, since, until, compression),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,12 +1,15 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from app.core.db import get_db
 from app.models.user import User
 from app.models.group import Group
 from app.models.user_group_association import UserGroupAssociation
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_current_user_id
+from app.core.http_cache import make_etag, versioned_json_response
+from app.services.content_versions import content_versions
+from app.services.analytics import get_group_analytics
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -25,42 +28,46 @@ class GroupResponse(BaseModel):
 
 @router.get("/user_groups", response_model=List[GroupResponse])
 def get_user_groups(
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     Получает список всех групп, связанных с текущим пользователем, сортированных по последней загрузке.
+    Ответ кэшируется до импорта или отвязки группы: повторный опрос с If-None-Match получает 304 без запроса к БД.
     """
-    user_id = current_user.id
-
-    # Объединяем таблицы в одном запросе (используем JOIN)
-    groups = (
-        db.query(
-            Group.vk_group_id,
-            Group.name,
-            Group.description,
-            Group.category,
-            Group.subscribers_count,
-            UserGroupAssociation.last_uploaded_at
-        )
-        .join(UserGroupAssociation, UserGroupAssociation.vk_group_id == Group.vk_group_id)
-        .filter(UserGroupAssociation.user_id == user_id)
-        .order_by(desc(UserGroupAssociation.last_uploaded_at))  # Сортируем по дате обновления
-        .all()
-    )
-
-    # Если у пользователя нет групп, возвращаем пустой массив
-    return [
-        GroupResponse(
-            vk_group_id=g.vk_group_id,
-            name=g.name,
-            description=g.description,
-            category=g.category,
-            subscribers_count=g.subscribers_count,
-            last_uploaded_at=g.last_uploaded_at
+    def build():
+        # Объединяем таблицы в одном запросе (используем JOIN)
+        groups = (
+            db.query(
+                Group.vk_group_id,
+                Group.name,
+                Group.description,
+                Group.category,
+                Group.subscribers_count,
+                UserGroupAssociation.last_uploaded_at
+            )
+            .join(UserGroupAssociation, UserGroupAssociation.vk_group_id == Group.vk_group_id)
+            .filter(UserGroupAssociation.user_id == user_id)
+            .order_by(desc(UserGroupAssociation.last_uploaded_at))  # Сортируем по дате обновления
+            .all()
         )
-        for g in groups
-    ]
+
+        # Если у пользователя нет групп, возвращаем пустой массив
+        return [
+            GroupResponse(
+                vk_group_id=g.vk_group_id,
+                name=g.name,
+                description=g.description,
+                category=g.category,
+                subscribers_count=g.subscribers_count,
+                last_uploaded_at=g.last_uploaded_at
+            )
+            for g in groups
+        ]
+
+    etag = make_etag("user-groups", user_id, content_versions.user(user_id))
+    return versioned_json_response(request, ("user_groups", user_id), etag, build)
 
 
 
@@ -90,3 +97,32 @@ def delete_user_group_association(
     db.commit()
 
     return {"message": f"Пользователь {user_id} успешно отвязан от группы {vk_group_id}"}
+
+
+@router.get("/{vk_group_id}/analytics")
+def get_group_analytics_endpoint(
+    vk_group_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Возвращает аналитику вовлечённости группы: ER, регулярность, тепловую карту дней и часов,
+    прирост по хештегам, тренд и лучшие посты.
+    """
+    def build():
+        association = db.query(UserGroupAssociation).filter(
+            UserGroupAssociation.user_id == user_id,
+            UserGroupAssociation.vk_group_id == vk_group_id
+        ).first()
+        if not association:
+            raise HTTPException(status_code=404, detail="Связь пользователя с группой не найдена")
+
+        analytics = get_group_analytics(db, vk_group_id)
+        if analytics is None:
+            raise HTTPException(status_code=404, detail="Группа не найдена")
+        return analytics
+
+    # Версия пользователя меняется при отвязке группы — проверка связи из кэша не устаревает
+    etag = make_etag("analytics", user_id, vk_group_id, content_versions.user(user_id), content_versions.group(vk_group_id))
+    return versioned_json_response(request, ("analytics", user_id, vk_group_id), etag, build)
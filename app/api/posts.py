@@ -1,14 +1,86 @@
+import asyncio
+import logging
+from datetime import datetime
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from app.core.db import get_db
-from app.services.generator import generate_post_from_context, generate_ideas_for_group, generate_growth_plan_for_group
+from app.services.generator import (
+    generate_post_from_context,
+    generate_ideas_for_group,
+    generate_growth_plan_for_group,
+    GENERATION_MODEL_VERSION,
+)
+from app.services.generation_cache import cached_generation
+from app.services.pregeneration import pregenerator
+from app.services.llm_gateway import LLMGatewayOverloaded, LLMGatewayTimeout
 from app.api.auth import get_current_user
+from app.core.metrics import WEBSOCKET_SESSIONS, WEBSOCKET_MESSAGES
+from app.core.tracing import span, set_attributes
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # Вспомогательное хранилище диалогов для WebSocket (в памяти)
 user_sessions = {}
 
+# Команды с детерминированным контекстом: их ответы кэшируются до следующего импорта группы
+CACHED_COMMANDS = {
+    "auto_idea": generate_ideas_for_group,
+    "growth_plan": generate_growth_plan_for_group,
+}
+REGENERATE_SUFFIX = ":regenerate"
+
+
+async def read_messages(websocket: WebSocket, incoming: asyncio.Queue):
+    """Читает сообщения клиента в очередь; None в очереди означает конец соединения"""
+    try:
+        while True:
+            await incoming.put(await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        incoming.put_nowait(None)
+
+
+async def handle_message(db: Session, user_id: int, group_id: int, session_key: tuple, message: str) -> str:
+    """
+    Обрабатывает одно сообщение из чата и возвращает ответ бота.
+    """
+    # Спец-команды "Придумай сам" и "План развития".
+    # "<команда>:regenerate" — сгенерировать заново в обход кэша
+    command, regenerate = message, False
+    if message.endswith(REGENERATE_SUFFIX):
+        command, regenerate = message[:-len(REGENERATE_SUFFIX)], True
+
+    WEBSOCKET_MESSAGES.labels(command if command in CACHED_COMMANDS else "chat").inc()
+    if command in CACHED_COMMANDS:
+        generate = CACHED_COMMANDS[command]
+        if not regenerate:
+            # Ответ могут уже готовить после импорта — дожидаемся его вместо второго запроса к LLM
+            await pregenerator.wait(group_id, command)
+        result = await cached_generation(
+            db, group_id, command, GENERATION_MODEL_VERSION,
+            lambda: generate(db, group_id, tenant=user_id),
+            regenerate=regenerate,
+        )
+        user_sessions[session_key] += f"\nAssistant: {result}"
+        return result
+
+    # 🧠 Обычное взаимодействие
+    # Первое сообщение диалога не зависит от истории — его можно обслужить семантическим кэшем
+    is_first_turn = not user_sessions[session_key]
+    user_sessions[session_key] += f"\nUser: {message}"
+    response = await generate_post_from_context(
+        db, message, group_id,
+        history=user_sessions[session_key],
+        use_semantic_cache=is_first_turn,
+        tenant=user_id,
+    )
+    user_sessions[session_key] += f"\nAssistant: {response}"
+    return response
+
+
 @router.websocket("/ws/{group_id}")
 async def websocket_endpoint(websocket: WebSocket, group_id: int, db: Session = Depends(get_db)):
     """
@@ -29,34 +101,44 @@ async def websocket_endpoint(websocket: WebSocket, group_id: int, db: Session =
 
     user_id = current_user.id
     session_key = (user_id, group_id)
+    current_user.last_active_at = datetime.utcnow()
+    db.commit()
     if session_key not in user_sessions:
         user_sessions[session_key] = ""
 
     await websocket.accept()
+    WEBSOCKET_SESSIONS.inc()
+
+    # Сообщения читаются отдельной задачей, чтобы разрыв соединения был замечен
+    # во время генерации и запрос к LLM можно было отменить
+    incoming: asyncio.Queue = asyncio.Queue()
+    reader = asyncio.create_task(read_messages(websocket, incoming))
 
     try:
         while True:
-            message = await websocket.receive_text()
-
-            # Обработка спец-команды "Придумай сам"
-            if message == "auto_idea":
-                result = generate_ideas_for_group(db, group_id)
-                user_sessions[session_key] += f"\nAssistant: {result}"
-                await websocket.send_text(result)
-                continue
-            
-            if message == "growth_plan":
-                result = generate_growth_plan_for_group(db, group_id)
-                user_sessions[session_key] += f"\nAssistant: {result}"
-                await websocket.send_text(result)
-                continue
-
-
-            # 🧠 Обычное взаимодействие
-            user_sessions[session_key] += f"\nUser: {message}"
-            response = generate_post_from_context(db, message, group_id, history=user_sessions[session_key])
-            user_sessions[session_key] += f"\nAssistant: {response}"
-            await websocket.send_text(response)
+            message = await incoming.get()
+            if message is None:
+                break
+
+            # Спан сообщения — родитель спанов генерации: задача наследует контекст при создании
+            with span("websocket.message", vk_group_id=group_id, user_id=user_id) as message_span:
+                generation = asyncio.create_task(handle_message(db, user_id, group_id, session_key, message))
+                await asyncio.wait({generation, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if not generation.done():
+                    generation.cancel()
+                    set_attributes(message_span, cancelled=True)
+                    logger.info(f"🔌 Клиент отключился, генерация для группы {group_id} отменена")
+                    break
+
+                try:
+                    response = generation.result()
+                except (LLMGatewayOverloaded, LLMGatewayTimeout):
+                    set_attributes(message_span, overloaded=True)
+                    response = "⚠️ Сервис генерации сейчас перегружен. Попробуйте отправить запрос ещё раз чуть позже."
+                await websocket.send_text(response)
 
     except WebSocketDisconnect:
         pass
+    finally:
+        WEBSOCKET_SESSIONS.dec()
+        reader.cancel()
@@ -1,8 +1,15 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.db import SessionLocal
 from app.models.user import User
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import (
+    hash_password_async,
+    verify_and_update_password_async,
+    create_access_token,
+    PasswordHashingOverloaded,
+)
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -25,30 +32,62 @@ class UserLogin(BaseModel):
     password: str
 
 
+def get_user_by_email(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).first()
+
+
+def save_user(db: Session, user: User):
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+
+
+def overloaded_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Сервер перегружен, попробуйте позже",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register")
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Регистрация пользователя"""
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await run_in_threadpool(get_user_by_email, db, user_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email уже зарегистрирован")
     
-    hashed_password = hash_password(user_data.password)
+    try:
+        hashed_password = await hash_password_async(user_data.password)
+    except PasswordHashingOverloaded:
+        raise overloaded_error()
     new_user = User(username=user_data.username, email=user_data.email, password_hash=hashed_password)
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await run_in_threadpool(save_user, db, new_user)
     
     return {"message": "Регистрация успешна!"}
 
 
 @router.post("/login")
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """Авторизация пользователя"""
-    user = db.query(User).filter(User.email == user_data.email).first()
-    
-    if not user or not verify_password(user_data.password, user.password_hash):
+    user = await run_in_threadpool(get_user_by_email, db, user_data.email)
+    if not user:
         raise HTTPException(status_code=400, detail="Неверный email или пароль")
+
+    try:
+        is_valid, new_hash = await verify_and_update_password_async(user_data.password, user.password_hash)
+    except PasswordHashingOverloaded:
+        raise overloaded_error()
+
+    if not is_valid:
+        raise HTTPException(status_code=400, detail="Неверный email или пароль")
+
+    # Стоимость bcrypt изменилась — прозрачно пересохраняем хеш
+    if new_hash:
+        user.password_hash = new_hash
+    user.last_active_at = datetime.utcnow()
+    await run_in_threadpool(save_user, db, user)
     
     token = create_access_token({"sub": user.email})
     
@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from app.services.vk_service import get_community_data, get_community_data_by_id
 from app.services.group_utils import  generate_fake_group_id
 from app.services.vk_service import save_group_data
+from app.services.bulk_import import start_bulk_import, get_job
+from app.core.config import BULK_IMPORT_MAX_LINKS
 from app.core.db import get_db
 from app.models.user import User
 from app.api.auth import get_current_user
@@ -15,6 +17,9 @@ class VirtualGroupCreate(BaseModel):
     description: str = ""
     category: str = ""
 
+class BulkImportRequest(BaseModel):
+    links: list[str]
+
 @router.post("/parse_and_save")
 def parse_and_save_vk(
     community_link: str = Query(..., description="Ссылка на сообщество ВКонтакте"),
@@ -73,4 +78,36 @@ def create_virtual_group(
         "services": []
     }
 
-    return save_group_data(db, current_user.id, data)
\ No newline at end of file
+    return save_group_data(db, current_user.id, data)
+
+
+@router.post("/bulk_import")
+async def bulk_import(
+    request: BulkImportRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Запускает фоновый импорт нескольких сообществ. Статус по каждой группе — в GET /vk/bulk_import/{job_id}.
+    """
+    links = [link for link in request.links if link.strip()]
+    if not links:
+        raise HTTPException(status_code=400, detail="Список ссылок пуст")
+    if len(links) > BULK_IMPORT_MAX_LINKS:
+        raise HTTPException(status_code=400, detail=f"Не больше {BULK_IMPORT_MAX_LINKS} ссылок за раз")
+
+    job = start_bulk_import(current_user.id, links)
+    return job.to_dict()
+
+
+@router.get("/bulk_import/{job_id}")
+def bulk_import_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Статус пакетного импорта: общий прогресс и результат по каждой ссылке.
+    """
+    job = get_job(job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+    return job.to_dict()
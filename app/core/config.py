@@ -25,3 +25,129 @@ DATABASE_URL = f"postgresql+psycopg2://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB
 # Конфигурация VK API
 ACCESS_TOKEN=os.getenv("ACCESS_TOKEN")
 API_VERSION=os.getenv("API_VERSION")
+
+# Хеширование паролей (bcrypt)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "1"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+
+# Аналитика: часовой пояс аудитории относительно UTC (часы), по умолчанию Москва
+ANALYTICS_UTC_OFFSET_HOURS = int(os.getenv("ANALYTICS_UTC_OFFSET_HOURS", "3"))
+
+# Кэш ответов LLM для команд auto_idea / growth_plan
+GENERATION_CACHE_TTL_HOURS = int(os.getenv("GENERATION_CACHE_TTL_HOURS", "72"))
+
+# Семантический кэш свободных запросов в чате (выключен по умолчанию)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES_PER_GROUP = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES_PER_GROUP", "50"))
+SEMANTIC_CACHE_MAX_GROUPS = int(os.getenv("SEMANTIC_CACHE_MAX_GROUPS", "500"))
+
+# LLM-шлюз: общий клиент, лимиты параллельности, приоритеты и таймауты
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_CONCURRENCY_PER_TENANT = int(os.getenv("LLM_MAX_CONCURRENCY_PER_TENANT", "2"))
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "1"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_TIMEOUT_INTERACTIVE = float(os.getenv("LLM_TIMEOUT_INTERACTIVE", "90"))
+LLM_TIMEOUT_HEAVY = float(os.getenv("LLM_TIMEOUT_HEAVY", "240"))
+LLM_TIMEOUT_BATCH = float(os.getenv("LLM_TIMEOUT_BATCH", "600"))
+
+# Бюджет токенов промпта (без учёта ответа модели)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+TIKTOKEN_ENCODING = os.getenv("TIKTOKEN_ENCODING", "cl100k_base")
+
+# Гибридный поиск (BM25 + векторы)
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+
+# Модель эмбеддингов: huggingface (torch + sentence-transformers), onnx (квантованная модель в ONNX Runtime)
+# или remote (общий процесс app.services.embedding_server, модель загружается один раз на все воркеры)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "models/all-MiniLM-L6-v2-onnx-int8")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "1"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# Сервер эмбеддингов: http://host:port или unix:///путь/к/сокету
+EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL", "unix:///tmp/autosmm-embeddings.sock")
+EMBEDDING_SERVER_BACKEND = os.getenv("EMBEDDING_SERVER_BACKEND", "onnx")
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "64"))
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", "5"))
+EMBEDDING_REMOTE_TIMEOUT = float(os.getenv("EMBEDDING_REMOTE_TIMEOUT", "30"))
+
+# Фоновое обновление групп: окно низкой нагрузки (часы по ANALYTICS_UTC_OFFSET_HOURS), лимиты и приоритеты.
+# REFRESH_MAX_CONCURRENCY — общий лимит на все реплики (слоты advisory lock в PostgreSQL)
+REFRESH_SCHEDULER_ENABLED = os.getenv("REFRESH_SCHEDULER_ENABLED", "false").lower() == "true"
+REFRESH_CHECK_INTERVAL_MINUTES = float(os.getenv("REFRESH_CHECK_INTERVAL_MINUTES", "15"))
+REFRESH_MIN_AGE_HOURS = float(os.getenv("REFRESH_MIN_AGE_HOURS", "24"))
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "10"))
+REFRESH_MAX_CONCURRENCY = int(os.getenv("REFRESH_MAX_CONCURRENCY", "1"))
+REFRESH_WINDOW_START_HOUR = int(os.getenv("REFRESH_WINDOW_START_HOUR", "2"))
+REFRESH_WINDOW_END_HOUR = int(os.getenv("REFRESH_WINDOW_END_HOUR", "7"))
+REFRESH_ACTIVE_DAYS = int(os.getenv("REFRESH_ACTIVE_DAYS", "7"))
+
+# Общий бюджет запросов к VK API на все воркеры и реплики, через PostgreSQL (лимит VK — 3 запроса в секунду на токен)
+VK_API_RATE_PER_SECOND = float(os.getenv("VK_API_RATE_PER_SECOND", "3"))
+# Адреса VK API и сайта (для товаров и услуг через Selenium); в бенчмарках подменяются заглушками
+VK_API_URL = os.getenv("VK_API_URL", "https://api.vk.com/method")
+VK_WEB_URL = os.getenv("VK_WEB_URL", "https://vk.com")
+
+# Пакетный импорт сообществ: лимит ссылок и параллельность стадий (загрузка из VK, эмбеддинги)
+BULK_IMPORT_MAX_LINKS = int(os.getenv("BULK_IMPORT_MAX_LINKS", "100"))
+BULK_IMPORT_FETCH_CONCURRENCY = int(os.getenv("BULK_IMPORT_FETCH_CONCURRENCY", "2"))
+BULK_IMPORT_INDEX_CONCURRENCY = int(os.getenv("BULK_IMPORT_INDEX_CONCURRENCY", "1"))
+BULK_IMPORT_MAX_JOBS = int(os.getenv("BULK_IMPORT_MAX_JOBS", "100"))
+
+# Метрики Prometheus на GET /metrics (каждый воркер uvicorn отдаёт свои значения)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Трассировка OpenTelemetry: none, console, otlp, file или memory (см. app/core/tracing.py)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "autosmm")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+
+# Потоковый экспорт: строк за одно чтение серверного курсора, размер отдаваемого куска и уровень zstd
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", "65536"))
+EXPORT_ZSTD_LEVEL = int(os.getenv("EXPORT_ZSTD_LEVEL", "3"))
+
+# HTTP-кэш эндпоинтов чтения: ETag по версиям контента и ответы в памяти процесса
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "5000"))
+# Рассылка изменений версий между воркерами через LISTEN/NOTIFY PostgreSQL
+CONTENT_VERSION_NOTIFY = os.getenv("CONTENT_VERSION_NOTIFY", "true").lower() == "true"
+# Кэш email из токена -> ID пользователя: столько секунд удалённый пользователь ещё проходит проверку
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# Контент-план: пределы одной задачи, одновременные запросы к LLM на задачу и число задач, выполняемых процессом
+CALENDAR_MAX_DAYS = int(os.getenv("CALENDAR_MAX_DAYS", "31"))
+CALENDAR_MAX_POSTS_PER_DAY = int(os.getenv("CALENDAR_MAX_POSTS_PER_DAY", "3"))
+CALENDAR_MAX_POSTS = int(os.getenv("CALENDAR_MAX_POSTS", "500"))
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", "2"))
+CALENDAR_MAX_RUNNING_JOBS = int(os.getenv("CALENDAR_MAX_RUNNING_JOBS", "2"))
+
+# Предварительная генерация auto_idea (и, если указано, growth_plan) после импорта группы — в свободные слоты LLM
+PREGENERATE_ENABLED = os.getenv("PREGENERATE_ENABLED", "false").lower() == "true"
+PREGENERATE_COMMANDS = [c.strip() for c in os.getenv("PREGENERATE_COMMANDS", "auto_idea").split(",") if c.strip()]
+PREGENERATE_CONCURRENCY = int(os.getenv("PREGENERATE_CONCURRENCY", "1"))
+# Сколько ждать свободного слота LLM, прежде чем отказаться от предварительной генерации
+PREGENERATE_MAX_WAIT_SECONDS = float(os.getenv("PREGENERATE_MAX_WAIT_SECONDS", "300"))
+
+# Администраторы (через запятую): доступ к /admin
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+# Обслуживание CHROMA_DB_PATH: период в окне фонового обновления (0 — только вручную), лимит I/O,
+# доля мёртвых элементов HNSW для перестройки и возраст осиротевших файлов, после которого их можно удалять
+VECTOR_MAINTENANCE_INTERVAL_HOURS = float(os.getenv("VECTOR_MAINTENANCE_INTERVAL_HOURS", "0"))
+VECTOR_MAINTENANCE_IO_MB_PER_SECOND = float(os.getenv("VECTOR_MAINTENANCE_IO_MB_PER_SECOND", "20"))
+VECTOR_REBUILD_DEAD_RATIO = float(os.getenv("VECTOR_REBUILD_DEAD_RATIO", "0.3"))
+VECTOR_ORPHAN_GRACE_HOURS = float(os.getenv("VECTOR_ORPHAN_GRACE_HOURS", "1"))
+
+# Диагностика для администраторов (/admin/diagnostics): профиль CPU и tracemalloc с ограничением длительности
+DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS_ENABLED", "false").lower() == "true"
+DIAGNOSTICS_MAX_PROFILE_SECONDS = float(os.getenv("DIAGNOSTICS_MAX_PROFILE_SECONDS", "60"))
+DIAGNOSTICS_TRACEMALLOC_MAX_MINUTES = float(os.getenv("DIAGNOSTICS_TRACEMALLOC_MAX_MINUTES", "10"))
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.core.db import SessionLocal
 from app.models.user_group_association import UserGroupAssociation
 from app.models.group import Group
+from app.services.content_versions import content_versions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,9 @@ def track_deleted_group_ids(mapper, connection, target):
         if not hasattr(session, "_deleted_group_ids"):
             session._deleted_group_ids = set()
         session._deleted_group_ids.add(target.vk_group_id)
+        if not hasattr(session, "_unlinked_user_ids"):
+            session._unlinked_user_ids = set()
+        session._unlinked_user_ids.add(target.user_id)
 
 # 2️⃣ После коммита удаляем группы, если у них больше нет связей
 @event.listens_for(Session, "after_commit")
@@ -36,5 +40,10 @@ def after_commit_user_group_association(session):
                 new_session.commit()
                 logger.info(f"✅ Группа {vk_group_id} удалена из базы данных.")
 
+    # Списки групп отвязанных пользователей изменились — сбрасываем их версии (после коммита)
+    content_versions.changed(user_ids=getattr(session, "_unlinked_user_ids", ()), group_ids=group_ids_to_check)
+
     # Очищаем сохраненные ID
     session._deleted_group_ids.clear()
+    if hasattr(session, "_unlinked_user_ids"):
+        session._unlinked_user_ids.clear()
@@ -0,0 +1,86 @@
+"""
+Условные ответы и кэш ответов для эндпоинтов чтения.
+
+ETag строится из версий контента (app/services/content_versions.py). Если клиент прислал тот же ETag
+в If-None-Match — 304 без тела; иначе тело берётся из кэша в памяти, а при промахе собирается build().
+Версию нужно получить до построения ответа: если данные изменятся во время запроса, ответ ляжет
+в кэш под старой версией и не будет отдан следующему клиенту.
+"""
+import threading
+from typing import Any, Callable
+import orjson
+from cachetools import LRUCache
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.core.config import HTTP_CACHE_ENABLED, HTTP_CACHE_MAX_ENTRIES
+
+# Клиент может хранить ответ, но обязан сверять ETag перед использованием
+CACHE_CONTROL = "private, no-cache"
+
+
+class ResponseCache:
+    """LRU по ключу эндпоинта: на ключ хранится только последняя версия тела"""
+
+    def __init__(self, max_entries: int):
+        self._entries: LRUCache = LRUCache(maxsize=max_entries)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, key: tuple, etag: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == etag:
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: tuple, etag: str, body: bytes):
+        with self._lock:
+            self._entries[key] = (etag, body)
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+
+response_cache = ResponseCache(HTTP_CACHE_MAX_ENTRIES)
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Слабое сравнение (RFC 9110): W/ у тегов не учитывается
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return etag in candidates
+
+
+def versioned_json_response(request: Request, key: tuple, etag: str, build: Callable[[], Any]) -> Response:
+    """
+    304 при совпадении If-None-Match, тело из кэша или результат build() в JSON.
+    Исключения build() (например, HTTPException 404) не кэшируются.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if not HTTP_CACHE_ENABLED:
+        return Response(orjson.dumps(jsonable_encoder(build())), media_type="application/json")
+
+    if _matches(request, etag):
+        response_cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key, etag)
+    if body is None:
+        body = orjson.dumps(jsonable_encoder(build()))
+        response_cache.put(key, etag, body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,133 @@
+"""
+Метрики Prometheus: длительность стадий импорта и генерации, ошибки, websocket-сессии,
+состояние пулов и очередей. Отдаются на GET /metrics.
+
+Счётчики на горячем пути — только stage() и инкременты; состояние пулов, очередей и кэшей
+читается из их stats() в момент запроса /metrics и ничего не стоит между запросами.
+"""
+import time
+import logging
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# От быстрых стадий (BM25, кэш) до долгих (Selenium, LLM)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "autosmm_stage_seconds",
+    "Длительность стадии операции",
+    ["operation", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "autosmm_stage_errors_total",
+    "Стадии, завершившиеся исключением",
+    ["operation", "stage"],
+)
+WEBSOCKET_SESSIONS = Gauge(
+    "autosmm_websocket_sessions",
+    "Открытые websocket-соединения чата",
+)
+WEBSOCKET_MESSAGES = Counter(
+    "autosmm_websocket_messages_total",
+    "Сообщения в чате по типу команды",
+    ["command"],
+)
+PREGENERATIONS = Counter(
+    "autosmm_pregenerations_total",
+    "Предварительная генерация после импорта по результату",
+    ["command", "result"],
+)
+
+
+@contextmanager
+def stage(operation: str, name: str, **attributes):
+    """
+    Замеряет стадию: with stage("import", "vk_posts", vk_group_id=...): ...
+    Работает и вокруг await — время считается по часам, а не по CPU.
+    Если трассировка включена, стадия становится спаном "<operation>.<name>" с переданными атрибутами.
+    """
+    started = time.perf_counter()
+    try:
+        with span(f"{operation}.{name}", **attributes) as current:
+            yield current
+    except BaseException:
+        STAGE_ERRORS.labels(operation, name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(operation, name).observe(time.perf_counter() - started)
+
+
+class AppStatsCollector:
+    """Переводит stats() сервисов в метрики в момент опроса"""
+
+    def describe(self):
+        # Без describe реестр вызвал бы collect() при регистрации, то есть при импорте модуля
+        return []
+
+    def collect(self):
+        # Импорт внутри: модули сервисов тянут БД и LangChain, а metrics импортируется раньше всех
+        from app.core.db import engine
+        from app.core.security import password_hashing_stats
+        from app.services.llm_gateway import llm_gateway
+        from app.services.semantic_cache import semantic_cache
+        from app.services.refresh_scheduler import refresh_scheduler
+        from app.services.bulk_import import jobs
+        from app.core.http_cache import response_cache
+
+        pool = engine.pool
+        db_pool = GaugeMetricFamily("autosmm_db_pool_connections", "Соединения пула SQLAlchemy", labels=["state"])
+        for state, getter in (("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+            if hasattr(pool, getter):
+                # overflow() отрицателен, пока пул не заполнен до pool_size
+                db_pool.add_metric([state], max(getattr(pool, getter)(), 0))
+        yield db_pool
+
+        gateway = llm_gateway.stats()
+        yield GaugeMetricFamily("autosmm_llm_in_flight", "Запросы к LLM в работе", value=gateway["in_flight"])
+        queued = GaugeMetricFamily("autosmm_llm_queued", "Запросы к LLM в очереди", labels=["priority"])
+        for priority, count in gateway["queued"].items():
+            queued.add_metric([priority], count)
+        yield queued
+        outcomes = CounterMetricFamily("autosmm_llm_requests", "Запросы к LLM по исходу", labels=["outcome"])
+        for outcome in ("completed", "errors", "timeouts", "cancelled", "rejected"):
+            outcomes.add_metric([outcome], gateway[outcome])
+        yield outcomes
+
+        hashing = password_hashing_stats.snapshot()
+        yield GaugeMetricFamily("autosmm_password_hash_pending", "Задачи хеширования паролей в очереди и работе", value=hashing["pending"])
+        hashing_outcomes = CounterMetricFamily("autosmm_password_hash", "Хеширование паролей по исходу", labels=["outcome"])
+        for outcome in ("completed", "rejected", "expired"):
+            hashing_outcomes.add_metric([outcome], hashing[outcome])
+        yield hashing_outcomes
+
+        cache = semantic_cache.stats()
+        yield GaugeMetricFamily("autosmm_semantic_cache_entries", "Ответы в семантическом кэше", value=cache["entries"])
+        lookups = CounterMetricFamily("autosmm_semantic_cache_lookups", "Обращения к семантическому кэшу", labels=["result"])
+        lookups.add_metric(["hit"], cache["hits"])
+        lookups.add_metric(["miss"], cache["misses"])
+        yield lookups
+
+        refresh = refresh_scheduler.stats()
+        refreshes = CounterMetricFamily("autosmm_group_refresh", "Фоновые обновления групп по исходу", labels=["result"])
+        for result in ("refreshed", "locked", "busy", "fresh", "failed"):
+            refreshes.add_metric([result], refresh[result])
+        yield refreshes
+        http_cache = response_cache.stats()
+        yield GaugeMetricFamily("autosmm_http_cache_entries", "Ответы в HTTP-кэше", value=http_cache["entries"])
+        http_lookups = CounterMetricFamily("autosmm_http_cache_requests", "Запросы к кэшируемым эндпоинтам", labels=["result"])
+        for result in ("hits", "misses", "not_modified"):
+            http_lookups.add_metric([result], http_cache[result])
+        yield http_lookups
+        yield GaugeMetricFamily(
+            "autosmm_bulk_import_jobs_running",
+            "Незавершённые задачи пакетного импорта",
+            value=sum(1 for job in list(jobs.values()) if not job.finished_at),
+        )
+
+
+REGISTRY.register(AppStatsCollector())
@@ -1,8 +1,21 @@
 import os
 import jwt
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from dotenv import load_dotenv
+from app.core.config import (
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+    PASSWORD_HASH_QUEUE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -12,8 +25,93 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS"))
 
-# Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Контекст для хеширования паролей.
+# min/max совпадают с default, поэтому хеши с другой стоимостью считаются устаревшими
+# и пересчитываются при следующем успешном входе.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Отдельный ограниченный пул для bcrypt, чтобы всплеск логинов не занимал
+# общий threadpool и event loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+class PasswordHashingOverloaded(Exception):
+    """Очередь хеширования переполнена или задача слишком долго ждала в очереди"""
+
+
+class PasswordHashingStats:
+    """Счётчики очереди хеширования паролей"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    def record_queue_time(self, seconds: float):
+        with self._lock:
+            self.queue_time_total += seconds
+            self.queue_time_max = max(self.queue_time_max, seconds)
+
+    def increment(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            started = self.completed + self.expired
+            return {
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "queue_time_avg": self.queue_time_total / started if started else 0.0,
+                "queue_time_max": self.queue_time_max,
+            }
+
+
+password_hashing_stats = PasswordHashingStats()
+
+
+async def _run_in_hash_pool(func, *args):
+    """
+    Выполняет bcrypt-операцию в выделенном пуле.
+    Если в очереди уже слишком много задач — сразу отказываем, а не копим нагрузку.
+    """
+    stats = password_hashing_stats
+    if stats.pending >= PASSWORD_HASH_MAX_PENDING:
+        stats.increment("rejected")
+        logger.warning(f"⚠️ Очередь хеширования паролей переполнена ({stats.pending} задач)")
+        raise PasswordHashingOverloaded()
+
+    submitted_at = time.perf_counter()
+
+    def timed_call():
+        queue_time = time.perf_counter() - submitted_at
+        stats.record_queue_time(queue_time)
+        # Клиент, скорее всего, уже не ждёт ответа — не тратим на него CPU
+        if queue_time > PASSWORD_HASH_QUEUE_TIMEOUT:
+            stats.increment("expired")
+            raise PasswordHashingOverloaded()
+        result = func(*args)
+        stats.increment("completed")
+        return result
+
+    stats.pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, timed_call)
+    finally:
+        stats.pending -= 1
 
 
 def hash_password(password: str) -> str:
@@ -26,6 +124,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """Хеширует пароль в выделенном пуле, не блокируя event loop"""
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Проверяет пароль в выделенном пуле.
+    Возвращает (валиден ли пароль, новый хеш или None) — новый хеш появляется,
+    если стоимость bcrypt в конфиге изменилась и старый хеш нужно пересчитать.
+    """
+    return await _run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
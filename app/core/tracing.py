@@ -0,0 +1,158 @@
+"""
+Трассировка OpenTelemetry: спаны FastAPI и websocket, SQL, вызовов VK, Selenium, эмбеддингов, ChromaDB и LLM.
+
+TRACING_EXPORTER:
+    none    — трассировка выключена, span() ничего не делает
+    console — спаны в stdout
+    otlp    — OTLP/gRPC (адрес в стандартной OTEL_EXPORTER_OTLP_ENDPOINT)
+    file    — по спану на строку JSON в TRACING_FILE_PATH, для разбора без коллектора
+    memory  — в памяти процесса, см. get_memory_exporter() (бенчмарки и диагностика)
+"""
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from opentelemetry import trace
+from app.core.config import TRACING_EXPORTER, TRACING_FILE_PATH, TRACING_SAMPLE_RATIO, TRACING_SERVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+# Длинные SQL и промпты в атрибутах не нужны — достаточно начала
+MAX_ATTRIBUTE_LENGTH = 1000
+
+tracer = trace.get_tracer("autosmm")
+_enabled = False
+_memory_exporter = None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Дочерний спан текущего контекста. При TRACING_EXPORTER=none — пустой контекст без накладных расходов.
+    Атрибуты со значением None пропускаются.
+    """
+    if not _enabled:
+        yield None
+        return
+    with tracer.start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+        yield current
+
+
+def set_attributes(current, **attributes):
+    """Добавляет атрибуты к спану, полученному из span() (None, если трассировка выключена)"""
+    if current is None:
+        return
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key, value)
+
+
+class FileSpanExporter:
+    """Пишет каждый завершённый спан строкой JSON — файл можно разобрать pandas/jq без коллектора"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        lines = [json.dumps(json.loads(s.to_json()), ensure_ascii=False) for s in spans]
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def _create_exporter(kind: str):
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if kind == "file":
+        return FileSpanExporter(TRACING_FILE_PATH)
+    if kind == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        return InMemorySpanExporter()
+    raise ValueError(f"Неизвестный TRACING_EXPORTER: {kind}")
+
+
+def _instrument_sqlalchemy(engine):
+    """Спан на каждый SQL-запрос через события SQLAlchemy (отдельный пакет инструментирования не нужен)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_sql_span(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        current = tracer.start_span(f"SQL {operation}", attributes={
+            "db.system": "postgresql",
+            "db.statement": statement[:MAX_ATTRIBUTE_LENGTH],
+        })
+        conn.info.setdefault("otel_spans", []).append(current)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_sql_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("otel_spans")
+        if spans:
+            current = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                current.set_attribute("db.rowcount", cursor.rowcount)
+            current.end()
+
+    @event.listens_for(engine, "handle_error")
+    def fail_sql_span(exception_context):
+        connection = exception_context.connection
+        spans = connection.info.get("otel_spans") if connection is not None else None
+        if spans:
+            current = spans.pop()
+            current.record_exception(exception_context.original_exception)
+            current.set_status(trace.Status(trace.StatusCode.ERROR))
+            current.end()
+
+
+def setup_tracing(app=None):
+    """Настраивает провайдера, экспорт и инструментирование FastAPI и SQLAlchemy. Вызывается один раз при старте"""
+    global _enabled, _memory_exporter
+    if TRACING_EXPORTER == "none" or _enabled:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from app.core.db import engine
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    exporter = _create_exporter(TRACING_EXPORTER)
+    if TRACING_EXPORTER == "memory":
+        _memory_exporter = exporter
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+    else:
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    _instrument_sqlalchemy(engine)
+    if app is not None:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics")
+
+    _enabled = True
+    logger.info(f"🔭 Трассировка включена: экспорт {TRACING_EXPORTER}, доля запросов {TRACING_SAMPLE_RATIO}")
+
+
+def get_memory_exporter():
+    """InMemorySpanExporter при TRACING_EXPORTER=memory, иначе None"""
+    return _memory_exporter
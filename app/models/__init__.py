@@ -4,3 +4,8 @@ from app.models.post import Post
 from app.models.user_group_association import UserGroupAssociation
 from app.models.product import Product  
 from app.models.service import Service  
+from app.models.group_profile import GroupProfile
+from app.models.generation_cache import GenerationCache
+from app.models.calendar_job import CalendarJob
+from app.models.calendar_post import CalendarPost
+from app.models.rate_limit import RateLimit
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date
+from sqlalchemy.orm import relationship
+from app.core.db import Base
+from datetime import datetime
+
+class CalendarJob(Base):
+    """Пакетная генерация контент-плана по группам пользователя (см. app/services/content_calendar.py)"""
+    __tablename__ = "calendar_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # pending -> running -> done | failed | cancelled
+    status = Column(String, nullable=False, default="pending")
+    start_date = Column(Date, nullable=False)
+    days = Column(Integer, nullable=False)
+    posts_per_day = Column(Integer, nullable=False, default=1)
+    total_posts = Column(Integer, nullable=False, default=0)
+    completed_posts = Column(Integer, nullable=False, default=0, server_default="0")
+    failed_posts = Column(Integer, nullable=False, default=0, server_default="0")
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    posts = relationship("CalendarPost", back_populates="job", cascade="all, delete-orphan")
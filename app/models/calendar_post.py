@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Date, Index
+from sqlalchemy.orm import relationship
+from app.core.db import Base
+
+class CalendarPost(Base):
+    __tablename__ = "calendar_posts"
+    __table_args__ = (
+        Index("ix_calendar_posts_job_group", "job_id", "vk_group_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("calendar_jobs.id", ondelete="CASCADE"), nullable=False)
+    vk_group_id = Column(Integer, ForeignKey("groups.vk_group_id", ondelete="CASCADE"), nullable=False)
+    publish_date = Column(Date, nullable=False)
+    # Номер поста в течение дня (0..posts_per_day-1)
+    slot = Column(Integer, nullable=False, default=0)
+    # Время публикации подбирается по лучшим слотам из аналитики группы во время генерации
+    publish_at = Column(DateTime, nullable=True)
+    topic = Column(String, nullable=True)
+    text = Column(Text, nullable=True)
+    # pending -> done | failed
+    status = Column(String, nullable=False, default="pending")
+    error = Column(String, nullable=True)
+    generated_at = Column(DateTime, nullable=True)
+
+    job = relationship("CalendarJob", back_populates="posts")
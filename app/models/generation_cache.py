@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint
+from app.core.db import Base
+from datetime import datetime
+
+class GenerationCache(Base):
+    __tablename__ = "generation_cache"
+    __table_args__ = (
+        UniqueConstraint("vk_group_id", "command", "content_version", "model_version", name="uq_generation_cache_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    vk_group_id = Column(Integer, ForeignKey("groups.vk_group_id", ondelete="CASCADE"), nullable=False, index=True)
+    command = Column(String, nullable=False)
+    content_version = Column(Integer, nullable=False)
+    model_version = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
@@ -10,11 +10,16 @@ class Group(Base):
     description = Column(String, nullable=True)
     category = Column(String, nullable=True)
     subscribers_count = Column(Integer, nullable=True)
+    # Увеличивается при каждом импорте данных — ключ для кэшей генерации
+    content_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Связи с постами, продуктами и услугами
     posts = relationship("Post", back_populates="group", cascade="all, delete-orphan")
     products = relationship("Product", back_populates="group", cascade="all, delete-orphan")
     services = relationship("Service", back_populates="group", cascade="all, delete-orphan")
 
+    # Предрассчитанный профиль стиля и каталога (см. app/services/group_profile.py)
+    profile = relationship("GroupProfile", back_populates="group", uselist=False, cascade="all, delete-orphan")
+
     # Связь многие ко многим с пользователями
     user_associations = relationship("UserGroupAssociation", back_populates="group", cascade="all, delete-orphan")
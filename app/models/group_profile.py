@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, JSON
+from sqlalchemy.orm import relationship
+from app.core.db import Base
+from datetime import datetime
+
+class GroupProfile(Base):
+    __tablename__ = "group_profiles"
+
+    vk_group_id = Column(Integer, ForeignKey("groups.vk_group_id", ondelete="CASCADE"), primary_key=True)
+    post_count = Column(Integer, default=0)
+    tone = Column(String, nullable=True)
+    formality = Column(String, nullable=True)
+    emoji_rate = Column(Float, default=0.0)
+    typical_length = Column(Integer, default=0)
+    top_hashtags = Column(JSON, default=list)
+    exemplars = Column(JSON, default=list)
+    catalog_summary = Column(String, nullable=True)
+    last_post_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    group = relationship("Group", back_populates="profile")
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, DateTime
+from app.core.db import Base
+
+class RateLimit(Base):
+    __tablename__ = "rate_limits"
+
+    # Общий для всех реплик лимит: next_at — момент, с которого свободен следующий запрос
+    name = Column(String, primary_key=True)
+    next_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.orm import relationship
 from app.core.db import Base
 
@@ -9,6 +9,8 @@ class User(Base):
     username = Column(String, unique=True, nullable=False)
     email = Column(String, unique=True, nullable=False)
     password_hash = Column(String, nullable=False)
+    # Последний вход или подключение к чату — учитывается в приоритете фонового обновления групп
+    last_active_at = Column(DateTime, nullable=True)
 
     # Связь многие ко многим с группами
     user_group_associations = relationship("UserGroupAssociation", back_populates="user", cascade="all, delete-orphan")
@@ -0,0 +1,222 @@
+import logging
+import numpy as np
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.models import Group, Post
+from app.services.group_profile import extract_hashtags
+from app.core.config import ANALYTICS_UTC_OFFSET_HOURS
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+TOP_SLOTS = 3
+TOP_POSTS = 5
+TOP_HASHTAG_LIFTS = 10
+MIN_HASHTAG_POSTS = 2
+SECONDS_IN_DAY = 86400.0
+
+
+def load_post_arrays(db: Session, vk_group_id: int, since: datetime | None = None, until: datetime | None = None) -> dict:
+    """
+    Загружает историю постов группы в массивы NumPy (по возрастанию даты).
+    since/until — ограничить период (включительно).
+    """
+    query = (
+        db.query(Post.date, Post.likes, Post.comments, Post.reposts, Post.text)
+        .filter(Post.group_id == vk_group_id, Post.date.isnot(None))
+    )
+    if since is not None:
+        query = query.filter(Post.date >= since)
+    if until is not None:
+        query = query.filter(Post.date <= until)
+    rows = query.order_by(Post.date).all()
+    count = len(rows)
+    return {
+        "timestamps": np.fromiter((r.date.timestamp() for r in rows), dtype=np.float64, count=count),
+        "likes": np.fromiter((r.likes or 0 for r in rows), dtype=np.float64, count=count),
+        "comments": np.fromiter((r.comments or 0 for r in rows), dtype=np.float64, count=count),
+        "reposts": np.fromiter((r.reposts or 0 for r in rows), dtype=np.float64, count=count),
+        "texts": [r.text for r in rows],
+    }
+
+
+def _cadence(timestamps: np.ndarray) -> dict:
+    if timestamps.size < 2:
+        return {"posts_per_week": float(timestamps.size), "interval_hours_mean": None,
+                "interval_hours_median": None, "interval_hours_std": None}
+    intervals = np.diff(timestamps) / 3600.0
+    span_weeks = max((timestamps[-1] - timestamps[0]) / (7 * SECONDS_IN_DAY), 1 / 7)
+    return {
+        "posts_per_week": round(float(timestamps.size / span_weeks), 2),
+        "interval_hours_mean": round(float(intervals.mean()), 1),
+        "interval_hours_median": round(float(np.median(intervals)), 1),
+        "interval_hours_std": round(float(intervals.std()), 1),
+    }
+
+
+def _heatmap(timestamps: np.ndarray, engagement: np.ndarray) -> dict:
+    local = timestamps + ANALYTICS_UTC_OFFSET_HOURS * 3600
+    days = np.floor(local / SECONDS_IN_DAY).astype(np.int64)
+    # 1970-01-01 — четверг, поэтому сдвигаем на 3, чтобы 0 был понедельником
+    weekdays = (days + 3) % 7
+    hours = ((local % SECONDS_IN_DAY) // 3600).astype(np.int64)
+
+    counts = np.zeros((7, 24), dtype=np.int64)
+    totals = np.zeros((7, 24), dtype=np.float64)
+    np.add.at(counts, (weekdays, hours), 1)
+    np.add.at(totals, (weekdays, hours), engagement)
+    mean = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+
+    slot_order = np.argsort(mean, axis=None)[::-1]
+    best_slots = []
+    for flat in slot_order[:TOP_SLOTS]:
+        weekday, hour = divmod(int(flat), 24)
+        if counts[weekday, hour] == 0:
+            break
+        best_slots.append({"weekday": WEEKDAYS[weekday], "hour": hour,
+                           "posts": int(counts[weekday, hour]),
+                           "engagement_mean": round(float(mean[weekday, hour]), 3)})
+
+    day_counts = counts.sum(axis=1)
+    day_mean = np.divide(totals.sum(axis=1), day_counts, out=np.zeros(7), where=day_counts > 0)
+    best_weekdays = [WEEKDAYS[i] for i in np.argsort(day_mean)[::-1] if day_counts[i] > 0][:TOP_SLOTS]
+
+    return {
+        "counts": counts.tolist(),
+        "engagement_mean": np.round(mean, 3).tolist(),
+        "best_slots": best_slots,
+        "best_weekdays": best_weekdays,
+    }
+
+
+def _hashtag_lift(texts: list[str], engagement: np.ndarray) -> list[dict]:
+    tags_per_post = [set(extract_hashtags(text)) for text in texts]
+    vocabulary = sorted(set().union(*tags_per_post)) if tags_per_post else []
+    overall = engagement.mean() if engagement.size else 0.0
+    if not vocabulary or overall <= 0:
+        return []
+
+    index = {tag: i for i, tag in enumerate(vocabulary)}
+    matrix = np.zeros((len(texts), len(vocabulary)), dtype=np.float64)
+    for row, tags in enumerate(tags_per_post):
+        matrix[row, [index[tag] for tag in tags]] = 1.0
+
+    counts = matrix.sum(axis=0)
+    mask = counts >= MIN_HASHTAG_POSTS
+    if not mask.any():
+        return []
+    lift = (matrix.T @ engagement)[mask] / counts[mask] / overall
+    tags = np.array(vocabulary)[mask]
+    order = np.argsort(lift)[::-1][:TOP_HASHTAG_LIFTS]
+    return [{"hashtag": str(tags[i]), "posts": int(counts[mask][i]), "lift": round(float(lift[i]), 2)}
+            for i in order]
+
+
+def _trend(timestamps: np.ndarray, engagement: np.ndarray) -> dict:
+    if timestamps.size < 3 or np.ptp(timestamps) == 0:
+        return {"engagement_slope_per_week": None, "relative_slope_per_week": None}
+    weeks = (timestamps - timestamps[0]) / (7 * SECONDS_IN_DAY)
+    slope, _ = np.polyfit(weeks, engagement, 1)
+    mean = engagement.mean()
+    return {
+        "engagement_slope_per_week": round(float(slope), 4),
+        "relative_slope_per_week": round(float(slope / mean), 4) if mean > 0 else None,
+    }
+
+
+def compute_group_analytics(arrays: dict, subscribers_count: int | None) -> dict:
+    """
+    Считает показатели вовлечённости, регулярности, тепловую карту и тренды по массивам постов.
+    Вовлечённость поста (ER) — (лайки + комментарии + репосты) / подписчики × 100%.
+    Для групп без подписчиков используется абсолютное число реакций.
+    """
+    timestamps = arrays["timestamps"]
+    interactions = arrays["likes"] + arrays["comments"] + arrays["reposts"]
+    if subscribers_count:
+        engagement = interactions / subscribers_count * 100.0
+        engagement_unit = "er_percent"
+    else:
+        engagement = interactions
+        engagement_unit = "interactions"
+
+    result = {
+        "post_count": int(timestamps.size),
+        "engagement_unit": engagement_unit,
+    }
+    if not timestamps.size:
+        return result
+
+    top = np.argsort(interactions)[::-1][:TOP_POSTS]
+    result.update({
+        "engagement": {
+            "mean": round(float(engagement.mean()), 3),
+            "median": round(float(np.median(engagement)), 3),
+            "p90": round(float(np.percentile(engagement, 90)), 3),
+            "likes_mean": round(float(arrays["likes"].mean()), 1),
+            "comments_mean": round(float(arrays["comments"].mean()), 1),
+            "reposts_mean": round(float(arrays["reposts"].mean()), 1),
+        },
+        "cadence": _cadence(timestamps),
+        "heatmap": _heatmap(timestamps, engagement),
+        "hashtags": _hashtag_lift(arrays["texts"], engagement),
+        "trend": _trend(timestamps, engagement),
+        "top_posts": [
+            {
+                "text": arrays["texts"][i][:200],
+                "date": np.datetime64(int(timestamps[i]), "s").astype(str),
+                "likes": int(arrays["likes"][i]),
+                "comments": int(arrays["comments"][i]),
+                "reposts": int(arrays["reposts"][i]),
+                "engagement": round(float(engagement[i]), 3),
+            }
+            for i in top
+        ],
+    })
+    return result
+
+
+def get_group_analytics(db: Session, vk_group_id: int, since: datetime | None = None, until: datetime | None = None) -> dict | None:
+    group = db.query(Group).filter(Group.vk_group_id == vk_group_id).first()
+    if not group:
+        return None
+    analytics = compute_group_analytics(load_post_arrays(db, vk_group_id, since, until), group.subscribers_count)
+    analytics["vk_group_id"] = vk_group_id
+    return analytics
+
+
+def format_analytics_for_prompt(analytics: dict) -> str:
+    """
+    Компактная сводка аналитики для промпта плана развития.
+    """
+    if not analytics.get("post_count"):
+        return "Постов нет — статистика недоступна."
+
+    unit = "% ER" if analytics["engagement_unit"] == "er_percent" else " реакций"
+    engagement = analytics["engagement"]
+    cadence = analytics["cadence"]
+    heatmap = analytics["heatmap"]
+    trend = analytics["trend"]
+
+    slots = ", ".join(f"{s['weekday']} {s['hour']:02d}:00 ({s['engagement_mean']}{unit})"
+                      for s in heatmap["best_slots"]) or "нет данных"
+    hashtags = ", ".join(f"{h['hashtag']} ×{h['lift']}" for h in analytics["hashtags"]) or "нет данных"
+    if trend["relative_slope_per_week"] is None:
+        trend_text = "недостаточно данных"
+    else:
+        trend_text = f"{trend['relative_slope_per_week'] * 100:+.1f}% от среднего в неделю"
+    top_posts = "\n".join(f"- {p['date'][:10]}: {p['engagement']}{unit} — {p['text'][:120]}"
+                          for p in analytics["top_posts"])
+    interval = cadence["interval_hours_median"]
+
+    return f"""
+- Постов в выборке: {analytics["post_count"]}
+- Вовлечённость: средняя {engagement["mean"]}{unit}, медиана {engagement["median"]}{unit}, 90-й перцентиль {engagement["p90"]}{unit}
+- В среднем на пост: 👍 {engagement["likes_mean"]} 💬 {engagement["comments_mean"]} 🔁 {engagement["reposts_mean"]}
+- Частота: {cadence["posts_per_week"]} постов в неделю, медианный интервал {interval if interval is not None else "—"} ч
+- Лучшие дни: {", ".join(heatmap["best_weekdays"]) or "нет данных"}
+- Лучшие слоты (день, время): {slots}
+- Хештеги с наибольшим приростом вовлечённости: {hashtags}
+- Тренд вовлечённости: {trend_text}
+- Топ постов:
+{top_posts}
+""".strip()
@@ -0,0 +1,215 @@
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from app.core.db import SessionLocal
+from app.models import Group
+from app.services.vk_service import (
+    parse_screen_name,
+    get_communities_info,
+    get_community_data_by_id,
+    persist_group_data,
+    index_group_data,
+)
+from app.core.config import (
+    BULK_IMPORT_FETCH_CONCURRENCY,
+    BULK_IMPORT_INDEX_CONCURRENCY,
+    BULK_IMPORT_MAX_JOBS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Между стадиями держим не больше нескольких групп: загрузка из VK не убегает вперёд медленных эмбеддингов
+STAGE_QUEUE_SIZE = 2
+
+
+@dataclass
+class BulkImportItem:
+    link: str
+    screen_name: str | None = None
+    vk_group_id: int | None = None
+    name: str | None = None
+    # pending -> fetching -> persisting -> indexing -> done | failed | duplicate
+    status: str = "pending"
+    error: str | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    def fail(self, error: str):
+        self.status = "failed"
+        self.error = error
+        self.finished_at = datetime.utcnow()
+
+    def to_dict(self) -> dict:
+        return {
+            "link": self.link,
+            "vk_group_id": self.vk_group_id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "seconds": round((self.finished_at - self.started_at).total_seconds(), 1)
+            if self.started_at and self.finished_at else None,
+        }
+
+
+@dataclass
+class BulkImportJob:
+    user_id: int
+    items: list[BulkImportItem]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: datetime | None = None
+    task: asyncio.Task | None = None
+
+    def to_dict(self) -> dict:
+        counts: dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return {
+            "job_id": self.id,
+            "status": "done" if self.finished_at else "running",
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "counts": counts,
+            "items": [item.to_dict() for item in self.items],
+        }
+
+
+# Задачи хранятся в памяти процесса; старые вытесняются после BULK_IMPORT_MAX_JOBS
+jobs: OrderedDict[str, BulkImportJob] = OrderedDict()
+
+
+def create_job(user_id: int, links: list[str]) -> BulkImportJob:
+    job = BulkImportJob(user_id=user_id, items=[BulkImportItem(link=link.strip()) for link in links if link.strip()])
+    jobs[job.id] = job
+    while len(jobs) > BULK_IMPORT_MAX_JOBS:
+        jobs.popitem(last=False)
+    return job
+
+
+def get_job(job_id: str) -> BulkImportJob | None:
+    return jobs.get(job_id)
+
+
+def _resolve(job: BulkImportJob) -> list[tuple[BulkImportItem, dict]]:
+    """Разбирает ссылки и одним запросом groups.getById на 500 имён получает ID и описание сообществ"""
+    seen = set()
+    pending = []
+    for item in job.items:
+        item.screen_name = parse_screen_name(item.link)
+        if not item.screen_name:
+            item.fail("Некорректная ссылка")
+        elif item.screen_name.lower() in seen:
+            item.status = "duplicate"
+        else:
+            seen.add(item.screen_name.lower())
+            pending.append(item)
+
+    infos = get_communities_info([item.screen_name for item in pending]) if pending else {}
+    resolved = []
+    for item in pending:
+        info = infos.get(item.screen_name)
+        if not info:
+            item.fail("Сообщество не найдено")
+            continue
+        item.vk_group_id = info["id"]
+        item.name = info["name"]
+        resolved.append((item, info))
+    return resolved
+
+
+def _persist(user_id: int, data: dict):
+    with SessionLocal() as db:
+        persist_group_data(db, user_id, data)
+
+
+def _index(vk_group_id: int):
+    with SessionLocal() as db:
+        index_group_data(db, db.get(Group, vk_group_id))
+
+
+async def _run_stage(inbox: asyncio.Queue, outbox: asyncio.Queue | None, workers: int, next_workers: int, handler):
+    """
+    Запускает workers обработчиков очереди. handler возвращает данные для следующей стадии;
+    ошибка помечает группу как failed и не останавливает остальные.
+    """
+    async def worker():
+        while True:
+            entry = await inbox.get()
+            if entry is None:
+                return
+            item, payload = entry
+            try:
+                result = await handler(item, payload)
+            except Exception as e:
+                logger.error(f"❌ Пакетный импорт {item.link} ({item.status}): {e}")
+                item.fail(f"{item.status}: {e}")
+                continue
+            if outbox is not None:
+                await outbox.put((item, result))
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if outbox is not None:
+        for _ in range(next_workers):
+            await outbox.put(None)
+
+
+async def run_bulk_import(job: BulkImportJob):
+    """
+    Конвейер: загрузка из VK (BULK_IMPORT_FETCH_CONCURRENCY потоков) -> запись в PostgreSQL (один поток)
+    -> профиль и индексы (BULK_IMPORT_INDEX_CONCURRENCY потоков). Стадии работают одновременно над разными группами.
+    """
+    try:
+        resolved = await asyncio.to_thread(_resolve, job)
+        logger.info(f"📦 Пакетный импорт {job.id}: найдено {len(resolved)} из {len(job.items)} сообществ")
+
+        fetch_queue: asyncio.Queue = asyncio.Queue()
+        persist_queue: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+        index_queue: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+        for entry in resolved:
+            fetch_queue.put_nowait(entry)
+        for _ in range(BULK_IMPORT_FETCH_CONCURRENCY):
+            fetch_queue.put_nowait(None)
+
+        async def fetch(item: BulkImportItem, info: dict) -> dict:
+            item.status = "fetching"
+            item.started_at = datetime.utcnow()
+            data = await asyncio.to_thread(get_community_data_by_id, info["id"], info)
+            if not data:
+                raise ValueError("VK не вернул данные сообщества")
+            return data
+
+        async def persist(item: BulkImportItem, data: dict) -> int:
+            item.status = "persisting"
+            await asyncio.to_thread(_persist, job.user_id, data)
+            return item.vk_group_id
+
+        async def index(item: BulkImportItem, vk_group_id: int):
+            item.status = "indexing"
+            await asyncio.to_thread(_index, vk_group_id)
+            item.status = "done"
+            item.finished_at = datetime.utcnow()
+
+        await asyncio.gather(
+            _run_stage(fetch_queue, persist_queue, BULK_IMPORT_FETCH_CONCURRENCY, 1, fetch),
+            _run_stage(persist_queue, index_queue, 1, BULK_IMPORT_INDEX_CONCURRENCY, persist),
+            _run_stage(index_queue, None, BULK_IMPORT_INDEX_CONCURRENCY, 0, index),
+        )
+    except Exception as e:
+        logger.error(f"❌ Пакетный импорт {job.id} прерван: {e}")
+        for item in job.items:
+            if item.status not in ("done", "failed", "duplicate"):
+                item.fail(str(e))
+    finally:
+        job.finished_at = datetime.utcnow()
+        counts = job.to_dict()["counts"]
+        logger.info(f"📦 Пакетный импорт {job.id} завершён: {counts}")
+
+
+def start_bulk_import(user_id: int, links: list[str]) -> BulkImportJob:
+    """Создаёт задачу и запускает конвейер в текущем event loop"""
+    job = create_job(user_id, links)
+    job.task = asyncio.create_task(run_bulk_import(job))
+    return job
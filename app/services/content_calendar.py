@@ -0,0 +1,481 @@
+"""
+Контент-план на несколько дней для многих групп одной фоновой задачей.
+
+Задача и все её посты создаются в БД сразу (статус pending), затем генерируются:
+- контекст группы (профиль и посчитанная аналитика) собирается один раз и переиспользуется во всех её постах;
+- одним запросом к LLM планируются темы на весь период, чтобы посты не повторяли друг друга;
+- посты пишутся параллельно, но не больше CALENDAR_CONCURRENCY запросов задачи одновременно
+  и с приоритетом BATCH — интерактивный чат шлюз LLM обслуживает раньше.
+
+Каждый готовый пост сразу сохраняется, счётчики задачи обновляются атомарно — прогресс виден
+в GET /calendar/jobs/{id}. Задача выполняется под pg_try_advisory_lock: после перезапуска
+незавершённые задачи продолжает ровно один воркер, уже готовые посты не генерируются заново.
+"""
+import re
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sqlalchemy import text, update
+from app.core.db import SessionLocal, engine
+from app.models import Group, CalendarJob, CalendarPost
+from app.services.group_profile import get_group_profile, format_group_profile
+from app.services.analytics import get_group_analytics, format_analytics_for_prompt, WEEKDAYS
+from app.services.llm_gateway import llm_gateway, Priority, LLMGatewayOverloaded
+from app.services.prompt_budget import PromptSection, assemble_prompt
+from app.core.metrics import stage
+from app.core.config import (
+    PROMPT_TOKEN_BUDGET,
+    CALENDAR_CONCURRENCY,
+    CALENDAR_MAX_RUNNING_JOBS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Пространство ключей pg_advisory_lock(namespace, job_id) — рядом с фоновым обновлением групп (38001)
+CALENDAR_LOCK_NAMESPACE = 38002
+# Часы публикации, если у группы нет истории постов
+DEFAULT_HOURS = [10, 14, 19]
+OVERLOAD_RETRIES = 3
+OVERLOAD_RETRY_SECONDS = 10
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+# Задачи, выполняемые этим процессом
+running_tasks: dict[int, asyncio.Task] = {}
+_job_slots: asyncio.Semaphore | None = None
+
+
+@dataclass
+class GroupContext:
+    """Всё, что нужно для промптов группы; собирается один раз на задачу"""
+    vk_group_id: int
+    name: str
+    profile_text: str
+    analytics_text: str
+    hours_by_weekday: list[list[int]]
+
+
+def _best_hours(analytics: dict) -> list[list[int]]:
+    """Для каждого дня недели — часы по убыванию средней вовлечённости; без данных — лучшие часы недели"""
+    heatmap = analytics.get("heatmap")
+    if not heatmap:
+        return [DEFAULT_HOURS] * 7
+    counts, mean = heatmap["counts"], heatmap["engagement_mean"]
+    week_totals = [sum(mean[d][h] for d in range(7) if counts[d][h]) for h in range(24)]
+    week_hours = [h for h in sorted(range(24), key=lambda h: -week_totals[h]) if week_totals[h] > 0] or DEFAULT_HOURS
+    by_weekday = []
+    for weekday in range(7):
+        hours = [h for h in sorted(range(24), key=lambda h: -mean[weekday][h]) if counts[weekday][h]]
+        hours += [h for h in week_hours if h not in hours]
+        by_weekday.append(hours + [h for h in DEFAULT_HOURS if h not in hours])
+    return by_weekday
+
+
+def publish_time(context: GroupContext, publish_date: date, slot: int, posts_per_day: int) -> datetime:
+    """
+    Время публикации в местном времени (ANALYTICS_UTC_OFFSET_HOURS): берутся posts_per_day лучших часов
+    этого дня недели, и слоты занимают их по возрастанию.
+    """
+    hours = sorted(context.hours_by_weekday[publish_date.weekday()][:posts_per_day])
+    hour = hours[slot] if slot < len(hours) else DEFAULT_HOURS[slot % len(DEFAULT_HOURS)]
+    return datetime.combine(publish_date, datetime.min.time()).replace(hour=hour)
+
+
+def load_group_context(vk_group_id: int) -> GroupContext | None:
+    with SessionLocal() as db:
+        group = db.query(Group).filter(Group.vk_group_id == vk_group_id).first()
+        if not group:
+            return None
+        profile = get_group_profile(db, vk_group_id)
+        analytics = get_group_analytics(db, vk_group_id)
+        return GroupContext(
+            vk_group_id=vk_group_id,
+            name=group.name,
+            profile_text=format_group_profile(group, profile),
+            analytics_text=format_analytics_for_prompt(analytics),
+            hours_by_weekday=_best_hours(analytics),
+        )
+
+
+def parse_topics(response: str, count: int) -> list[str]:
+    """Строки вида "1. Тема" или "- Тема"; недостающие темы заполняются нейтральными"""
+    topics = []
+    for line in response.splitlines():
+        match = re.match(r"^\s*(?:\d+[.)]|[-•*])\s*(.+)$", line)
+        if match and match.group(1).strip():
+            topics.append(match.group(1).strip().strip("*").strip())
+    topics = topics[:count]
+    while len(topics) < count:
+        topics.append(f"Пост на свободную тему №{len(topics) + 1}")
+    return topics
+
+
+async def _invoke(prompt: str, tenant, label: str) -> str:
+    """Запрос к LLM с повтором при переполненной очереди шлюза: пакетная задача может подождать"""
+    for attempt in range(OVERLOAD_RETRIES + 1):
+        try:
+            return await llm_gateway.invoke(prompt, priority=Priority.BATCH, tenant=tenant, label=label)
+        except LLMGatewayOverloaded:
+            if attempt == OVERLOAD_RETRIES:
+                raise
+            await asyncio.sleep(OVERLOAD_RETRY_SECONDS * (attempt + 1))
+
+
+async def plan_topics(context: GroupContext, dates: list[date], tenant) -> list[str]:
+    schedule = "\n".join(f"{i}. {d.strftime('%d.%m.%Y')} ({WEEKDAYS[d.weekday()]})" for i, d in enumerate(dates, start=1))
+
+    def render(sections: dict[str, str]) -> str:
+        return f"""
+Ты — SMM-менеджер сообщества ВКонтакте. Составь контент-план: по одной теме поста на каждую дату ниже.
+
+📋 Профиль сообщества:
+{sections["profile"]}
+
+📊 Статистика постов:
+{sections["analytics"]}
+
+📅 Даты публикаций:
+{sections["schedule"]}
+
+Требования:
+- Темы не повторяются и чередуют форматы (товар или услуга, польза, вовлечение, новости, отзывы).
+- Используй только товары и услуги из каталога, ничего не выдумывай.
+- Учитывай праздники и события на эти даты, если они уместны для сообщества.
+- Ответь строго списком из {len(dates)} строк в формате "N. Тема" без пояснений.
+""".strip()
+
+    with stage("calendar", "plan_prompt", vk_group_id=context.vk_group_id):
+        prompt = assemble_prompt(render, [
+            PromptSection("profile", context.profile_text, priority=1, min_tokens=500),
+            PromptSection("analytics", context.analytics_text, priority=2, min_tokens=200),
+            PromptSection("schedule", schedule, priority=3, min_tokens=1000),
+        ], PROMPT_TOKEN_BUDGET)
+    with stage("calendar", "plan_llm", vk_group_id=context.vk_group_id):
+        response = await _invoke(prompt, tenant, "calendar_plan")
+    return parse_topics(response, len(dates))
+
+
+async def write_post(context: GroupContext, topic: str, publish_at: datetime, other_topics: list[str], tenant) -> str:
+    def render(sections: dict[str, str]) -> str:
+        return f"""
+Ты — SMM-менеджер, который ведёт это сообщество ВКонтакте и пишет посты в его стиле.
+
+📋 Профиль сообщества:
+{sections["profile"]}
+
+🗓 Публикация: {publish_at.strftime('%d.%m.%Y %H:%M')} ({WEEKDAYS[publish_at.weekday()]})
+🎯 Тема поста: {topic}
+
+Другие посты этого периода (не повторяй их содержание):
+{sections["others"]}
+
+Требования:
+- Соблюдай стиль прошлых постов: тон, обращение, длину, эмодзи и хештеги.
+- Упоминай только товары и услуги из каталога.
+- Добавь призыв к действию, если он уместен.
+- Выдай только готовый текст поста, без пояснений и заголовков вроде "Пост:".
+""".strip()
+
+    with stage("calendar", "post_prompt", vk_group_id=context.vk_group_id):
+        prompt = assemble_prompt(render, [
+            PromptSection("others", items=other_topics, priority=1),
+            PromptSection("profile", context.profile_text, priority=2, min_tokens=500),
+        ], PROMPT_TOKEN_BUDGET)
+    with stage("calendar", "post_llm", vk_group_id=context.vk_group_id):
+        return await _invoke(prompt, tenant, "calendar_post")
+
+
+# --- Работа с БД (вызывается через asyncio.to_thread) ---
+
+def create_job(user_id: int, group_ids: list[int], start_date: date, days: int, posts_per_day: int) -> int:
+    with SessionLocal() as db:
+        job = CalendarJob(
+            user_id=user_id,
+            status="pending",
+            start_date=start_date,
+            days=days,
+            posts_per_day=posts_per_day,
+            total_posts=len(group_ids) * days * posts_per_day,
+        )
+        db.add(job)
+        db.flush()
+        db.bulk_save_objects([
+            CalendarPost(job_id=job.id, vk_group_id=vk_group_id, publish_date=start_date + timedelta(days=day), slot=slot)
+            for vk_group_id in group_ids
+            for day in range(days)
+            for slot in range(posts_per_day)
+        ])
+        db.commit()
+        return job.id
+
+
+def _pending_posts(job_id: int) -> tuple[int, dict[int, list[CalendarPost]]]:
+    with SessionLocal() as db:
+        posts_per_day = db.query(CalendarJob.posts_per_day).filter(CalendarJob.id == job_id).scalar()
+        db.execute(
+            update(CalendarJob)
+            .where(CalendarJob.id == job_id, CalendarJob.status == "pending")
+            .values(status="running", started_at=datetime.utcnow())
+        )
+        db.commit()
+        posts = (
+            db.query(CalendarPost)
+            .filter(CalendarPost.job_id == job_id, CalendarPost.status == "pending")
+            .order_by(CalendarPost.vk_group_id, CalendarPost.publish_date, CalendarPost.slot)
+            .all()
+        )
+        db.expunge_all()
+    by_group: dict[int, list[CalendarPost]] = {}
+    for post in posts:
+        by_group.setdefault(post.vk_group_id, []).append(post)
+    return posts_per_day, by_group
+
+
+def _save_topics(posts: list[CalendarPost]):
+    with SessionLocal() as db:
+        for post in posts:
+            db.query(CalendarPost).filter(CalendarPost.id == post.id).update(
+                {CalendarPost.topic: post.topic, CalendarPost.publish_at: post.publish_at}
+            )
+        db.commit()
+
+
+def _save_post(job_id: int, post_id: int, text_value: str | None, error: str | None) -> str:
+    """Сохраняет результат поста и возвращает статус задачи (её могли отменить с другого воркера)"""
+    with SessionLocal() as db:
+        db.query(CalendarPost).filter(CalendarPost.id == post_id).update({
+            CalendarPost.text: text_value,
+            CalendarPost.status: "failed" if error else "done",
+            CalendarPost.error: error,
+            CalendarPost.generated_at: datetime.utcnow(),
+        })
+        counter = CalendarJob.failed_posts if error else CalendarJob.completed_posts
+        status = db.execute(
+            update(CalendarJob).where(CalendarJob.id == job_id).values({counter: counter + 1}).returning(CalendarJob.status)
+        ).scalar()
+        db.commit()
+        return status
+
+
+def _finish_job(job_id: int, error: str | None = None):
+    with SessionLocal() as db:
+        job = db.get(CalendarJob, job_id)
+        if job.status != "cancelled":
+            job.status = "failed" if error or (job.failed_posts and not job.completed_posts) else "done"
+            job.error = error
+        job.finished_at = datetime.utcnow()
+        db.commit()
+
+
+def job_to_dict(job: CalendarJob, posts: list[CalendarPost] | None = None) -> dict:
+    result = {
+        "id": job.id,
+        "status": job.status,
+        "start_date": job.start_date,
+        "days": job.days,
+        "posts_per_day": job.posts_per_day,
+        "total_posts": job.total_posts,
+        "completed_posts": job.completed_posts,
+        "failed_posts": job.failed_posts,
+        "progress": round((job.completed_posts + job.failed_posts) / job.total_posts, 3) if job.total_posts else 1.0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if posts is not None:
+        result["posts"] = [
+            {
+                "vk_group_id": post.vk_group_id,
+                "publish_date": post.publish_date,
+                "slot": post.slot,
+                "publish_at": post.publish_at,
+                "topic": post.topic,
+                "text": post.text,
+                "status": post.status,
+                "error": post.error,
+            }
+            for post in posts
+        ]
+    return result
+
+
+# --- Выполнение ---
+
+class JobCancelled(Exception):
+    pass
+
+
+async def _gather_or_cancel(coroutines):
+    """Как gather, но при первой ошибке отменяет остальные — отменённая задача не должна тратить запросы к LLM"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _fail_posts(job_id: int, posts: list[CalendarPost], error: str):
+    for post in posts:
+        status = await asyncio.to_thread(_save_post, job_id, post.id, None, error)
+        if status == "cancelled":
+            raise JobCancelled()
+
+
+async def _run_group(job_id: int, vk_group_id: int, posts: list[CalendarPost], posts_per_day: int,
+                     tenant, llm_slots: asyncio.Semaphore):
+    context = await asyncio.to_thread(load_group_context, vk_group_id)
+    if context is None:
+        await _fail_posts(job_id, posts, "Группа удалена")
+        return
+
+    # Темы планируются одним запросом на все посты группы, у которых их ещё нет (при продолжении — только для оставшихся)
+    unplanned = [post for post in posts if not post.topic]
+    if unplanned:
+        try:
+            async with llm_slots:
+                topics = await plan_topics(context, [post.publish_date for post in unplanned], tenant)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Ошибка одной группы не должна останавливать остальные: её посты без темы помечаются неудачными
+            reason = str(e) or e.__class__.__name__
+            logger.warning(f"⚠️ Контент-план {job_id}: темы для группы {vk_group_id} не составлены: {reason}")
+            await _fail_posts(job_id, unplanned, f"Не удалось составить темы: {reason}")
+            posts = [post for post in posts if post.topic]
+        else:
+            for post, topic in zip(unplanned, topics):
+                post.topic = topic
+                post.publish_at = publish_time(context, post.publish_date, post.slot, posts_per_day)
+            await asyncio.to_thread(_save_topics, unplanned)
+
+    all_topics = [post.topic for post in posts]
+
+    async def generate(post: CalendarPost):
+        async with llm_slots:
+            try:
+                result, error = await write_post(
+                    context, post.topic, post.publish_at or publish_time(context, post.publish_date, post.slot, posts_per_day),
+                    [topic for topic in all_topics if topic != post.topic], tenant,
+                ), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Контент-план {job_id}, группа {vk_group_id}: пост на {post.publish_date} не создан: {e}")
+                result, error = None, str(e) or e.__class__.__name__
+        status = await asyncio.to_thread(_save_post, job_id, post.id, result, error)
+        if status == "cancelled":
+            raise JobCancelled()
+
+    await _gather_or_cancel(generate(post) for post in posts)
+
+
+def _try_lock(job_id: int):
+    connection = engine.connect()
+    locked = connection.execute(
+        text("SELECT pg_try_advisory_lock(:namespace, :job_id)"),
+        {"namespace": CALENDAR_LOCK_NAMESPACE, "job_id": job_id},
+    ).scalar()
+    if not locked:
+        connection.close()
+        return None
+    return connection
+
+
+def _unlock(connection, job_id: int):
+    try:
+        connection.execute(
+            text("SELECT pg_advisory_unlock(:namespace, :job_id)"),
+            {"namespace": CALENDAR_LOCK_NAMESPACE, "job_id": job_id},
+        )
+    finally:
+        connection.close()
+
+
+async def run_calendar_job(job_id: int, tenant):
+    global _job_slots
+    if _job_slots is None:
+        _job_slots = asyncio.Semaphore(CALENDAR_MAX_RUNNING_JOBS)
+
+    async with _job_slots:
+        # Блокировка держится всё время задачи; при падении процесса PostgreSQL снимет её вместе с соединением
+        lock_connection = await asyncio.to_thread(_try_lock, job_id)
+        if lock_connection is None:
+            logger.info(f"🗓 Контент-план {job_id} уже выполняет другой воркер")
+            return
+        try:
+            posts_per_day, by_group = await asyncio.to_thread(_pending_posts, job_id)
+            logger.info(f"🗓 Контент-план {job_id}: {sum(map(len, by_group.values()))} постов для {len(by_group)} групп")
+            llm_slots = asyncio.Semaphore(CALENDAR_CONCURRENCY)
+            error = None
+            try:
+                await _gather_or_cancel(
+                    _run_group(job_id, vk_group_id, posts, posts_per_day, tenant, llm_slots) for vk_group_id, posts in by_group.items()
+                )
+            except JobCancelled:
+                logger.info(f"🛑 Контент-план {job_id} отменён")
+            except Exception as e:
+                logger.error(f"❌ Контент-план {job_id} прерван: {e}")
+                error = str(e)
+            await asyncio.to_thread(_finish_job, job_id, error)
+        finally:
+            await asyncio.to_thread(_unlock, lock_connection, job_id)
+            running_tasks.pop(job_id, None)
+
+
+def start_calendar_job(job_id: int, tenant) -> asyncio.Task:
+    """Запускает задачу в текущем event loop (uvicorn) и запоминает её для отмены"""
+    task = asyncio.create_task(run_calendar_job(job_id, tenant))
+    running_tasks[job_id] = task
+    return task
+
+
+def _mark_cancelled(job_id: int) -> bool:
+    with SessionLocal() as db:
+        updated = db.execute(
+            update(CalendarJob)
+            .where(CalendarJob.id == job_id, CalendarJob.status.notin_(FINISHED_STATUSES))
+            .values(status="cancelled", finished_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+        return bool(updated)
+
+
+async def cancel_calendar_job(job_id: int) -> bool:
+    """Помечает задачу отменённой; если она выполняется здесь — прерывает сразу, иначе воркер заметит статус"""
+    updated = await asyncio.to_thread(_mark_cancelled, job_id)
+    task = running_tasks.get(job_id)
+    if task is not None:
+        task.cancel()
+    return updated
+
+
+async def resume_calendar_jobs():
+    """При старте подхватывает незавершённые задачи; задачу, которую ведёт другой воркер, не даст взять блокировка"""
+    def unfinished() -> list[tuple[int, int]]:
+        with SessionLocal() as db:
+            return [
+                (job.id, job.user_id)
+                for job in db.query(CalendarJob).filter(CalendarJob.status.in_(("pending", "running")))
+            ]
+
+    try:
+        jobs = await asyncio.to_thread(unfinished)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось проверить незавершённые контент-планы: {e}")
+        return
+    for job_id, user_id in jobs:
+        if job_id not in running_tasks:
+            start_calendar_job(job_id, user_id)
+
+
+async def stop_calendar_jobs():
+    """При остановке прерывает задачи процесса; статус running остаётся, и после перезапуска они продолжатся"""
+    tasks = list(running_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,164 @@
+"""
+Версии контента пользователей и групп для HTTP-кэша (ETag, кэш ответов в памяти).
+
+Счётчики живут в памяти процесса и увеличиваются после коммита изменений: импорта группы
+(save_group_data, загрузка выгрузки) и удаления связи пользователя с группой. Версия читается
+без обращения к БД, поэтому проверка If-None-Match и кэш ответов не трогают PostgreSQL.
+
+Между воркерами uvicorn и скриптами изменения рассылаются через NOTIFY в PostgreSQL: каждый воркер
+слушает канал отдельным потоком и увеличивает у себя те же счётчики. Если соединение со слушателем
+потеряно, увеличивается общая эпоха — все версии процесса считаются изменёнными, пропущенные
+уведомления не приводят к устаревшим ответам.
+
+В версию входит случайный nonce процесса: после перезапуска счётчики начинаются заново,
+и старые ETag клиентов не совпадут с новыми.
+"""
+import json
+import select
+import secrets
+import logging
+import threading
+from collections import defaultdict
+from sqlalchemy import text
+from app.core.db import engine
+from app.core.config import CONTENT_VERSION_NOTIFY
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "autosmm_content"
+# Ограничение PostgreSQL на payload — 8000 байт; длинные списки заменяются сбросом всех версий
+MAX_NOTIFY_PAYLOAD = 7000
+LISTEN_RECONNECT_SECONDS = 5
+
+
+class ContentVersions:
+    def __init__(self):
+        self.nonce = secrets.token_hex(4)
+        self._epoch = 0
+        self._users: defaultdict[int, int] = defaultdict(int)
+        self._groups: defaultdict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: threading.Thread | None = None
+        self._stats = {"bumps": 0, "received": 0, "resets": 0}
+
+    def user(self, user_id: int) -> str:
+        return f"{self.nonce}.{self._epoch}.{self._users.get(user_id, 0)}"
+
+    def group(self, vk_group_id: int) -> str:
+        return f"{self.nonce}.{self._epoch}.{self._groups.get(vk_group_id, 0)}"
+
+    def _bump_local(self, user_ids=(), group_ids=()):
+        with self._lock:
+            for user_id in user_ids:
+                self._users[user_id] += 1
+            for vk_group_id in group_ids:
+                self._groups[vk_group_id] += 1
+
+    def _reset_local(self):
+        with self._lock:
+            self._epoch += 1
+            self._stats["resets"] += 1
+
+    def changed(self, user_ids=(), group_ids=()):
+        """
+        Отмечает изменения после коммита. Пользователи групп из group_ids находятся сами:
+        импорт группы меняет списки групп всех, кто к ней привязан.
+        Вызывать только после коммита — иначе конкурентный запрос закэширует старые данные под новой версией.
+        """
+        user_ids, group_ids = set(user_ids), set(group_ids)
+        if group_ids:
+            with engine.connect() as connection:
+                user_ids.update(connection.execute(
+                    text("SELECT DISTINCT user_id FROM user_group_association WHERE vk_group_id = ANY(:ids)"),
+                    {"ids": list(group_ids)},
+                ).scalars())
+        if not user_ids and not group_ids:
+            return
+        self._bump_local(user_ids, group_ids)
+        self._stats["bumps"] += 1
+        if CONTENT_VERSION_NOTIFY:
+            self._publish(user_ids, group_ids)
+
+    def _publish(self, user_ids: set[int], group_ids: set[int]):
+        payload = json.dumps({"origin": self.nonce, "users": sorted(user_ids), "groups": sorted(group_ids)})
+        if len(payload) > MAX_NOTIFY_PAYLOAD:
+            payload = json.dumps({"origin": self.nonce, "all": True})
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                   {"channel": NOTIFY_CHANNEL, "payload": payload})
+        except Exception as e:
+            # Другие воркеры отдадут устаревший список до своего перезапуска — это хуже ошибки импорта не делает
+            logger.warning(f"⚠️ Не удалось разослать изменение версий контента: {e}")
+
+    def _handle_notification(self, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f"⚠️ Некорректное уведомление о версиях: {payload[:200]}")
+            return
+        if message.get("origin") == self.nonce:
+            return
+        self._stats["received"] += 1
+        if message.get("all"):
+            self._reset_local()
+        else:
+            self._bump_local(message.get("users", []), message.get("groups", []))
+
+    def _listen(self):
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                # Соединение занято навсегда — выводим его из пула
+                connection.detach()
+                driver = connection.driver_connection
+                driver.autocommit = True
+                with driver.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Пока слушателя не было, уведомления могли потеряться
+                self._reset_local()
+                logger.info(f"👂 Слушаем изменения контента в канале {NOTIFY_CHANNEL}")
+                while not self._stop.is_set():
+                    if select.select([driver], [], [], 1.0)[0]:
+                        driver.poll()
+                        while driver.notifies:
+                            self._handle_notification(driver.notifies.pop(0).payload)
+            except Exception as e:
+                logger.warning(f"⚠️ Слушатель версий контента отключился: {e}")
+                self._reset_local()
+                self._stop.wait(LISTEN_RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def start_listener(self):
+        if not CONTENT_VERSION_NOTIFY or self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="content-versions", daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        if self._listener is None:
+            return
+        self._stop.set()
+        self._listener.join(timeout=5)
+        self._listener = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "epoch": self._epoch,
+                "users": len(self._users),
+                "groups": len(self._groups),
+                "listening": self._listener is not None and self._listener.is_alive(),
+            }
+
+
+content_versions = ContentVersions()
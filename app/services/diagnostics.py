@@ -0,0 +1,306 @@
+"""
+Диагностика работающего процесса для администраторов: профиль потоков, tracemalloc и разбивка памяти.
+
+Всё выключено, пока не задан DIAGNOSTICS_ENABLED, и рассчитано на продакшен:
+- профилировщик выборочный — отдельный поток раз в interval (не чаще MIN_INTERVAL_SECONDS) снимает стеки
+  всех потоков через sys._current_frames(), не трогая их выполнение; профиль длится не дольше
+  DIAGNOSTICS_MAX_PROFILE_SECONDS, одновременно идёт только один. Профиль по настенному времени:
+  снимаются и потоки, которые ждут, поэтому стеки, стоящие в известных ожиданиях (очереди пула потоков,
+  select event loop, слушатель версий контента), по умолчанию отбрасываются. Результат — свёрнутые
+  стеки (folded), их понимают flamegraph.pl и speedscope;
+- tracemalloc заметно замедляет выделение памяти и сам её потребляет, поэтому включается явно
+  и выключается сам через DIAGNOSTICS_TRACEMALLOC_MAX_MINUTES;
+- разбивка памяти читает /proc и счётчики кэшей приложения, ничего не выделяя заметного.
+"""
+import os
+import gc
+import sys
+import time
+import threading
+import tracemalloc
+import linecache
+from collections import Counter
+from app.core.config import (
+    DIAGNOSTICS_MAX_PROFILE_SECONDS,
+    DIAGNOSTICS_TRACEMALLOC_MAX_MINUTES,
+)
+
+# Снимок держит GIL, пока обходит и форматирует стеки всех потоков, — чаще 10 мс заметно тормозит процесс
+MIN_INTERVAL_SECONDS = 0.01
+# Функции на вершине стека, в которых поток простаивает: (модуль, функция)
+IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("queue", "get"),
+    ("selectors", "select"),
+    ("concurrent.futures.thread", "_worker"),
+    ("app.services.content_versions", "_listen"),
+}
+TOP_MAPPINGS = 15
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+_profile_lock = threading.Lock()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+def _is_idle(frame) -> bool:
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> tuple[Counter, int]:
+    """
+    Снимает стеки всех потоков, кроме собственного, каждые interval секунд.
+    include_idle=False — пропускать потоки, стоящие в известных ожиданиях (IDLE_FRAMES).
+    Возвращает счётчик свёрнутых стеков "поток;корень;...;лист" и число снимков.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        seconds = min(seconds, DIAGNOSTICS_MAX_PROFILE_SECONDS)
+        interval = max(interval, MIN_INTERVAL_SECONDS)
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (not include_idle and _is_idle(frame)):
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_name(frame))
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(frames))] += 1
+            samples += 1
+            time.sleep(interval)
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+
+def format_folded(stacks: Counter) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def profile_summary(stacks: Counter, samples: int, limit: int = 30) -> dict:
+    """Самые частые функции на вершине стека (self) и в стеке вообще (total), в долях всех снятых стеков потоков"""
+    own_time: Counter = Counter()
+    total_time: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]
+        if not frames:
+            continue
+        own_time[frames[-1]] += count
+        for name in set(frames):
+            total_time[name] += count
+
+    stack_count = sum(stacks.values())
+
+    def share(count: int) -> float:
+        return round(count / stack_count, 4) if stack_count else 0.0
+
+    return {
+        "samples": samples,
+        "self": [{"frame": name, "share": share(count)} for name, count in own_time.most_common(limit)],
+        "total": [{"frame": name, "share": share(count)} for name, count in total_time.most_common(limit)],
+    }
+
+
+# --- tracemalloc ---
+
+_tracemalloc_timer: threading.Timer | None = None
+_tracemalloc_lock = threading.Lock()
+
+
+def start_tracemalloc(frames: int = 10) -> dict:
+    global _tracemalloc_timer
+    with _tracemalloc_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        if _tracemalloc_timer is not None:
+            _tracemalloc_timer.cancel()
+        _tracemalloc_timer = threading.Timer(DIAGNOSTICS_TRACEMALLOC_MAX_MINUTES * 60, stop_tracemalloc)
+        _tracemalloc_timer.daemon = True
+        _tracemalloc_timer.start()
+    return tracemalloc_status()
+
+
+def stop_tracemalloc() -> dict:
+    global _tracemalloc_timer
+    with _tracemalloc_lock:
+        if _tracemalloc_timer is not None:
+            _tracemalloc_timer.cancel()
+            _tracemalloc_timer = None
+        tracemalloc.stop()
+    return tracemalloc_status()
+
+
+def tracemalloc_status() -> dict:
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+def tracemalloc_top(limit: int = 30, group_by: str = "lineno") -> dict | None:
+    """Крупнейшие места выделения памяти среди отслеживаемых с момента start_tracemalloc; None — трассировка выключена"""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    top = []
+    for stat in snapshot.statistics(group_by)[:limit]:
+        frames = [
+            {"file": frame.filename, "line": frame.lineno, "code": linecache.getline(frame.filename, frame.lineno).strip()}
+            for frame in stat.traceback
+        ]
+        top.append({"size_bytes": stat.size, "count": stat.count, "traceback": frames})
+    return {**tracemalloc_status(), "top": top}
+
+
+# --- Память ---
+
+def _read_status(pid: int | str = "self") -> dict[str, int]:
+    """Поля Vm*/Rss* из /proc/<pid>/status в байтах"""
+    result = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.startswith(("Vm", "Rss")) and value.strip().endswith("kB"):
+                    result[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return result
+
+
+def _child_processes() -> list[dict]:
+    """Потомки процесса (Chrome с драйвером, воркеры) с их RSS"""
+    parents: dict[int, int] = {}
+    commands: dict[int, str] = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Имя процесса в скобках может содержать пробелы — поля считаем после последней скобки
+        name = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        parents[int(entry)] = int(fields[1])
+        commands[int(entry)] = name
+
+    descendants, frontier = [], [os.getpid()]
+    while frontier:
+        parent = frontier.pop()
+        for pid, ppid in parents.items():
+            if ppid == parent:
+                descendants.append(pid)
+                frontier.append(pid)
+    return [
+        {"pid": pid, "name": commands[pid], "rss_bytes": _read_status(pid).get("VmRSS", 0)}
+        for pid in descendants
+    ]
+
+
+def _top_mappings() -> list[dict]:
+    """RSS по файлам отображений (/proc/self/smaps): видно, сколько занимают библиотеки torch, onnxruntime, chromadb"""
+    sizes: Counter = Counter()
+    current = "[anonymous]"
+    try:
+        with open("/proc/self/smaps") as f:
+            for line in f:
+                first = line.split(maxsplit=1)[0]
+                if "-" in first and not first.endswith(":"):
+                    parts = line.split(maxsplit=5)
+                    current = parts[5].strip() if len(parts) > 5 else "[anonymous]"
+                elif first == "Rss:":
+                    sizes[current] += int(line.split()[1]) * 1024
+    except OSError:
+        return []
+    return [{"mapping": name, "rss_bytes": size} for name, size in sizes.most_common(TOP_MAPPINGS)]
+
+
+def _cgroup_memory() -> dict:
+    result = {}
+    for key, path in (("usage_bytes", "/sys/fs/cgroup/memory.current"), ("limit_bytes", "/sys/fs/cgroup/memory.max")):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            result[key] = None if value == "max" else int(value)
+        except (OSError, ValueError):
+            pass
+    return result
+
+
+def _app_caches() -> dict:
+    # Импорт внутри, как в AppStatsCollector: модули тянут БД и LangChain
+    from app.api.posts import user_sessions
+    from app.core.http_cache import response_cache
+    from app.core.db import engine
+    from app.services.semantic_cache import semantic_cache
+    from app.services.embeddings import get_embeddings
+    from app.services import lexical_index
+    from app.services.llm_gateway import get_llm
+
+    sessions = list(user_sessions.values())
+    with lexical_index._cache_lock:
+        lexical = list(lexical_index._cache.values())
+    pool = engine.pool
+    return {
+        "user_sessions": {"count": len(sessions), "history_chars": sum(len(history) for history in sessions)},
+        "http_response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "lexical_indexes": {"groups": len(lexical), "documents": sum(len(index.documents) for _, index in lexical)},
+        "embeddings_model_loaded": get_embeddings.cache_info().currsize > 0,
+        "llm_clients": get_llm.cache_info().currsize,
+        "db_pool": {"checked_out": pool.checkedout(), "idle": pool.checkedin()} if hasattr(pool, "checkedout") else {},
+    }
+
+
+def memory_report() -> dict:
+    status = _read_status()
+    modules = {name: name in sys.modules for name in ("torch", "onnxruntime", "chromadb", "selenium", "langchain_huggingface")}
+    report = {
+        "rss_bytes": status.get("VmRSS"),
+        "peak_rss_bytes": status.get("VmHWM"),
+        "anon_rss_bytes": status.get("RssAnon"),
+        "file_rss_bytes": status.get("RssFile"),
+        "cgroup": _cgroup_memory(),
+        "children": _child_processes(),
+        "top_mappings": _top_mappings(),
+        "python": {
+            "allocated_blocks": sys.getallocatedblocks(),
+            "gc_counts": gc.get_count(),
+            "threads": threading.active_count(),
+        },
+        "modules_loaded": modules,
+        "caches": _app_caches(),
+        "tracemalloc": tracemalloc_status(),
+    }
+    if modules["torch"]:
+        torch = sys.modules["torch"]
+        report["torch"] = {"threads": torch.get_num_threads()}
+    report["children_rss_bytes"] = sum(child["rss_bytes"] for child in report["children"])
+    return report
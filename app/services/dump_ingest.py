@@ -0,0 +1,274 @@
+"""
+Загрузка выгрузок сообществ (NDJSON) без обращения к VK и Chrome.
+
+Каждая строка файла — JSON того же вида, что возвращает get_community_data_by_id:
+    {"community": {"id": ..., "name": ...}, "posts": [...], "products": [...], "services": [...]}
+
+Файл читается потоково, группы обрабатываются пачками: одна транзакция с COPY на пачку,
+затем эмбеддинги всех документов пачки крупными батчами. После каждой пачки сохраняется
+checkpoint с номером строки, поэтому прерванную загрузку можно продолжить с того же места.
+"""
+import io
+import os
+import csv
+import gzip
+import json
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from psycopg2.extras import execute_values
+from app.core.db import SessionLocal, engine
+from app.models import Group, Post, Product, Service
+from app.services.rag import get_group_vectorstore, build_group_documents, add_documents_with_vectors, group_vectors_lock
+from app.services.embeddings import get_embeddings
+from app.services.lexical_index import build_lexical_index
+from app.services.group_profile import refresh_group_profile
+from app.services.content_versions import content_versions
+from app.services.generation_cache import bump_content_version
+
+logger = logging.getLogger(__name__)
+
+COPY_NULL = r"\N"
+
+
+def _open_dump(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_checkpoint(path: str | None) -> dict:
+    if not path or not os.path.exists(path):
+        return {"line": 0, "groups": 0, "rows": 0, "documents": 0, "skipped": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_checkpoint(path: str | None, state: dict):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _copy_rows(cursor, table: str, columns: list[str], rows: list[tuple]):
+    if not rows:
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([COPY_NULL if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buffer,
+    )
+
+
+def load_chunk(records: list[dict], user_id: int | None = None) -> int:
+    """
+    Записывает пачку групп одной транзакцией: upsert групп, удаление старых постов/товаров/услуг,
+    COPY новых строк. content_version не меняется — это делает index_chunk (или ingest_dump без
+    индексации) после перестройки профилей. Возвращает число записанных строк.
+    """
+    uploaded_at = datetime.now(timezone.utc)
+    group_ids = [record["community"]["id"] for record in records]
+    posts, products, services = [], [], []
+    for record in records:
+        vk_group_id = record["community"]["id"]
+        for post in record.get("posts", []):
+            posts.append((
+                vk_group_id,
+                post["text"].strip(),
+                post.get("date") or datetime.utcnow().isoformat(),
+                post.get("likes", 0),
+                post.get("comments", 0),
+                post.get("reposts", 0),
+            ))
+        for items, target in ((record.get("products", []), products), (record.get("services", []), services)):
+            for item in items:
+                target.append((
+                    vk_group_id,
+                    item["name"].strip(),
+                    (item.get("description") or "").strip(),
+                    item.get("price") or "Не указано",
+                ))
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO groups (vk_group_id, name, description, subscribers_count, category, content_version)
+                VALUES %s
+                ON CONFLICT (vk_group_id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    description = EXCLUDED.description,
+                    subscribers_count = EXCLUDED.subscribers_count,
+                    category = EXCLUDED.category
+            """, [(
+                record["community"]["id"],
+                record["community"]["name"],
+                record["community"].get("description"),
+                record["community"].get("subscribers_count"),
+                record["community"].get("category"),
+                0,
+            ) for record in records])
+
+            if user_id is not None:
+                execute_values(cursor, """
+                    INSERT INTO user_group_association (user_id, vk_group_id, last_uploaded_at) VALUES %s
+                    ON CONFLICT (user_id, vk_group_id) DO UPDATE SET last_uploaded_at = EXCLUDED.last_uploaded_at
+                """, [(user_id, vk_group_id, uploaded_at) for vk_group_id in group_ids])
+            else:
+                cursor.execute(
+                    "UPDATE user_group_association SET last_uploaded_at = %s WHERE vk_group_id = ANY(%s)",
+                    (uploaded_at, group_ids),
+                )
+
+            for table in ("posts", "products", "services"):
+                cursor.execute(f"DELETE FROM {table} WHERE group_id = ANY(%s)", (group_ids,))
+
+            _copy_rows(cursor, "posts", ["group_id", "text", "date", "likes", "comments", "reposts"], posts)
+            _copy_rows(cursor, "products", ["group_id", "name", "description", "price"], products)
+            _copy_rows(cursor, "services", ["group_id", "name", "description", "price"], services)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    content_versions.changed(user_ids=[user_id] if user_id is not None else [], group_ids=group_ids)
+
+    return len(records) + len(posts) + len(products) + len(services)
+
+
+def index_chunk(group_ids: list[int], embed_batch: int) -> int:
+    """
+    Пересчитывает профили и строит документы пачки, считает эмбеддинги сразу для всех групп пачки
+    и раскладывает их по коллекциям ChromaDB, затем сбрасывает кэш ответов групп и увеличивает
+    content_version. Возвращает число документов.
+    """
+    with SessionLocal() as db:
+        groups = {group.vk_group_id: group for group in db.query(Group).filter(Group.vk_group_id.in_(group_ids))}
+        items = defaultdict(lambda: ([], [], []))
+        for position, model in enumerate((Post, Product, Service)):
+            for row in db.query(model).filter(model.group_id.in_(group_ids)).order_by(model.id):
+                items[row.group_id][position].append(row)
+
+        documents = {
+            vk_group_id: build_group_documents(groups[vk_group_id], *items[vk_group_id])
+            for vk_group_id in group_ids
+        }
+        for vk_group_id in group_ids:
+            refresh_group_profile(db, vk_group_id)
+
+    flat = [doc for vk_group_id in group_ids for doc in documents[vk_group_id]]
+    embeddings = get_embeddings()
+    vectors = []
+    for start in range(0, len(flat), embed_batch):
+        vectors.extend(embeddings.embed_documents([doc.page_content for doc in flat[start:start + embed_batch]]))
+
+    offset = 0
+    for vk_group_id in group_ids:
+        group_documents = documents[vk_group_id]
+        with group_vectors_lock(vk_group_id):
+            vectorstore = get_group_vectorstore(vk_group_id)
+            vectorstore.reset_collection()
+            add_documents_with_vectors(vectorstore, group_documents, vectors[offset:offset + len(group_documents)])
+        build_lexical_index(vk_group_id, group_documents)
+        offset += len(group_documents)
+
+    with SessionLocal() as db:
+        bump_content_version(db, group_ids)
+    return len(flat)
+
+
+def ingest_dump(
+    path: str,
+    user_id: int | None = None,
+    chunk_groups: int = 100,
+    embed_batch: int = 256,
+    checkpoint_path: str | None = None,
+    index: bool = True,
+) -> dict:
+    """
+    Загружает NDJSON-выгрузку. Пачка групп (chunk_groups) — единица транзакции и checkpoint:
+    при повторном запуске строки до сохранённой позиции пропускаются, а незавершённая пачка
+    загружается заново (загрузка идемпотентна: данные группы перезаписываются целиком).
+    """
+    state = read_checkpoint(checkpoint_path)
+    start_line = state["line"]
+    if start_line:
+        logger.info(f"↩️ Продолжаем загрузку {path} со строки {start_line + 1}")
+
+    started = time.perf_counter()
+    load_seconds = index_seconds = 0.0
+    run_rows = run_documents = 0
+    records: list[dict] = []
+    line_number = start_line
+
+    def flush():
+        nonlocal load_seconds, index_seconds, run_rows, run_documents, records
+        if records:
+            # Если группа встречается в пачке дважды, берём последнюю версию
+            unique = list({record["community"]["id"]: record for record in records}.values())
+            chunk_started = time.perf_counter()
+            rows = load_chunk(unique, user_id)
+            load_seconds += time.perf_counter() - chunk_started
+
+            documents = 0
+            group_ids = [record["community"]["id"] for record in unique]
+            if index:
+                chunk_started = time.perf_counter()
+                documents = index_chunk(group_ids, embed_batch)
+                index_seconds += time.perf_counter() - chunk_started
+            else:
+                with SessionLocal() as db:
+                    bump_content_version(db, group_ids)
+
+            run_rows += rows
+            run_documents += documents
+            state["groups"] += len(unique)
+            state["rows"] += rows
+            state["documents"] += documents
+        state["line"] = line_number
+        write_checkpoint(checkpoint_path, state)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"📥 Строка {line_number}: групп {state['groups']}, строк {state['rows']}, документов {state['documents']} "
+            f"({run_rows / elapsed if elapsed else 0:.0f} строк/с за этот запуск)"
+        )
+        records = []
+
+    with _open_dump(path) as dump:
+        for line_number, line in enumerate(dump, start=1):
+            if line_number <= start_line:
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if not record["community"].get("id"):
+                    raise ValueError("нет community.id")
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"⚠️ Строка {line_number} пропущена: {e}")
+                state["skipped"] += 1
+                continue
+            records.append(record)
+            if len(records) >= chunk_groups:
+                flush()
+        flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **state,
+        "seconds": round(elapsed, 2),
+        "load_seconds": round(load_seconds, 2),
+        "index_seconds": round(index_seconds, 2),
+        "rows_per_second": round(run_rows / load_seconds, 1) if load_seconds else None,
+        "documents_per_second": round(run_documents / index_seconds, 1) if index_seconds else None,
+    }
@@ -0,0 +1,208 @@
+"""
+Общий сервер эмбеддингов для всех воркеров uvicorn.
+
+Модель загружается один раз, запросы от воркеров собираются в батчи. Запуск:
+    python -m app.services.embedding_server
+
+В воркерах при этом EMBEDDING_BACKEND=remote, адрес сервера — EMBEDDING_SERVER_URL.
+
+    POST /embed   {"texts": [...]} -> {"vectors": [[...], ...]}
+    GET  /health  -> состояние и статистика батчей
+"""
+import os
+import json
+import queue
+import socket
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from app.core.config import (
+    EMBEDDING_SERVER_URL,
+    EMBEDDING_SERVER_BACKEND,
+    EMBEDDING_SERVER_MAX_BATCH,
+    EMBEDDING_SERVER_MAX_WAIT_MS,
+)
+from app.services.embeddings import create_embeddings
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_BYTES = 16 * 2**20
+
+
+class EmbeddingBatcher:
+    """
+    Собирает тексты из параллельных запросов в общий батч: ждёт не дольше max_wait_ms
+    после первого запроса или пока не наберётся max_batch текстов.
+    """
+
+    def __init__(self, embeddings, max_batch: int, max_wait_ms: float):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+        self.embed_seconds = 0.0
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        future: Future = Future()
+        self.queue.put((texts, future))
+        return future.result()
+
+    def _collect(self) -> list[tuple[list[str], Future]]:
+        items = [self.queue.get()]
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            texts = [text for item_texts, _ in items for text in item_texts]
+            started = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                logger.error(f"Ошибка расчёта эмбеддингов: {e}")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            with self.lock:
+                self.batches += 1
+                self.texts += len(texts)
+                self.requests += len(items)
+                self.embed_seconds += time.perf_counter() - started
+
+            offset = 0
+            for item_texts, future in items:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "embed_seconds": round(self.embed_seconds, 3),
+                "queued": self.queue.qsize(),
+            }
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive: клиент воркера держит соединение открытым между запросами
+    protocol_version = "HTTP/1.1"
+    batcher: EmbeddingBatcher
+    backend: str
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"detail": "Not found"})
+            return
+        self._send_json(200, {"status": "ok", "backend": self.backend, **self.batcher.stats()})
+
+    def do_POST(self):
+        if self.path != "/embed":
+            self._send_json(404, {"detail": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send_json(413, {"detail": "Слишком большой запрос"})
+            return
+        try:
+            texts = json.loads(self.rfile.read(length))["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts должен быть списком строк")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"detail": str(e)})
+            return
+
+        try:
+            vectors = self.batcher.embed(texts) if texts else []
+        except Exception as e:
+            self._send_json(500, {"detail": str(e)})
+            return
+        self._send_json(200, {"vectors": vectors})
+
+    def address_string(self) -> str:
+        # У unix-сокета нет адреса клиента
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class EmbeddingHTTPServer(ThreadingHTTPServer):
+    # Все воркеры подключаются одновременно при старте — стандартной очереди в 5 соединений мало
+    request_queue_size = 128
+
+
+class UnixHTTPServer(EmbeddingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = "embeddings"
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def create_server(url: str = EMBEDDING_SERVER_URL, backend: str = EMBEDDING_SERVER_BACKEND) -> ThreadingHTTPServer:
+    if backend == "remote":
+        raise ValueError("EMBEDDING_SERVER_BACKEND не может быть remote")
+
+    batcher = EmbeddingBatcher(create_embeddings(backend), EMBEDDING_SERVER_MAX_BATCH, EMBEDDING_SERVER_MAX_WAIT_MS)
+    handler = type("Handler", (EmbeddingRequestHandler,), {"batcher": batcher, "backend": backend})
+
+    if url.startswith("unix://"):
+        return UnixHTTPServer(url[len("unix://"):], handler)
+    parsed = urlparse(url)
+    return EmbeddingHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8856), handler)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    server = create_server()
+    logger.info(f"🧮 Сервер эмбеддингов ({EMBEDDING_SERVER_BACKEND}) слушает {EMBEDDING_SERVER_URL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
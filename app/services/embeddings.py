@@ -0,0 +1,126 @@
+import os
+import logging
+from functools import lru_cache
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.tracing import span
+from app.core.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_THREADS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_SERVER_URL,
+    EMBEDDING_REMOTE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# all-MiniLM-L6-v2 обучена на последовательностях до 256 токенов (как max_seq_length в sentence-transformers)
+ONNX_MAX_LENGTH = 256
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """
+    Эмбеддинги all-MiniLM-L6-v2 через ONNX Runtime без torch и sentence-transformers.
+    Повторяет пайплайн sentence-transformers: токенизация, mean pooling по маске внимания, L2-нормализация.
+    Модель готовится скриптом scripts/export_onnx_embeddings.py.
+    """
+
+    def __init__(self, model_dir: str, threads: int = 1, batch_size: int = 32):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        with span("embedding.batch", backend="onnx", size=len(texts)):
+            return self._run_batch(texts)
+
+    def _run_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = [
+            self._embed_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Клиент сервера эмбеддингов (app.services.embedding_server).
+    Воркеры uvicorn не загружают модель сами, а отправляют тексты в общий процесс по HTTP или unix-сокету.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        import httpx
+
+        if url.startswith("unix://"):
+            transport = httpx.HTTPTransport(uds=url[len("unix://"):])
+            base_url = "http://embeddings"
+        else:
+            transport = httpx.HTTPTransport()
+            base_url = url.rstrip("/")
+        self.client = httpx.Client(base_url=base_url, transport=transport, timeout=timeout)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        with span("embedding.batch", backend="remote", size=len(texts)):
+            response = self.client.post("/embed", json={"texts": texts})
+            response.raise_for_status()
+            return response.json()["vectors"]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    if backend == "onnx":
+        logger.info(f"🧮 Эмбеддинги: ONNX Runtime ({EMBEDDING_ONNX_DIR})")
+        return OnnxMiniLMEmbeddings(EMBEDDING_ONNX_DIR, threads=EMBEDDING_THREADS, batch_size=EMBEDDING_BATCH_SIZE)
+    if backend == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        logger.info(f"🧮 Эмбеддинги: sentence-transformers ({EMBEDDING_MODEL})")
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE})
+    if backend == "remote":
+        logger.info(f"🧮 Эмбеддинги: сервер {EMBEDDING_SERVER_URL}")
+        return RemoteEmbeddings(EMBEDDING_SERVER_URL, timeout=EMBEDDING_REMOTE_TIMEOUT)
+    raise ValueError(f"Неизвестный EMBEDDING_BACKEND: {backend}")
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> Embeddings:
+    """Модель эмбеддингов загружается один раз на процесс"""
+    return create_embeddings()
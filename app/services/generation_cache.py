@@ -0,0 +1,104 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from app.models import Group, GenerationCache
+from app.core.config import GENERATION_CACHE_TTL_HOURS
+
+logger = logging.getLogger(__name__)
+
+
+def get_content_version(db: Session, vk_group_id: int) -> int | None:
+    return db.query(Group.content_version).filter(Group.vk_group_id == vk_group_id).scalar()
+
+
+def get_cached_generation(db: Session, vk_group_id: int, command: str, content_version: int, model_version: str) -> str | None:
+    """
+    Возвращает сохранённый ответ, если он ещё не устарел.
+    """
+    entry = db.query(GenerationCache).filter(
+        GenerationCache.vk_group_id == vk_group_id,
+        GenerationCache.command == command,
+        GenerationCache.content_version == content_version,
+        GenerationCache.model_version == model_version,
+        GenerationCache.expires_at > datetime.utcnow()
+    ).first()
+    return entry.response if entry else None
+
+
+def store_generation(db: Session, vk_group_id: int, command: str, content_version: int, model_version: str, response: str):
+    """
+    Сохраняет ответ в кэш (перезаписывает запись с тем же ключом) и чистит просроченные записи группы.
+    """
+    now = datetime.utcnow()
+    db.query(GenerationCache).filter(
+        GenerationCache.vk_group_id == vk_group_id,
+        GenerationCache.expires_at <= now
+    ).delete()
+
+    values = {
+        "vk_group_id": vk_group_id,
+        "command": command,
+        "content_version": content_version,
+        "model_version": model_version,
+        "response": response,
+        "created_at": now,
+        "expires_at": now + timedelta(hours=GENERATION_CACHE_TTL_HOURS),
+    }
+    statement = insert(GenerationCache).values(**values).on_conflict_do_update(
+        constraint="uq_generation_cache_key",
+        set_={"response": values["response"], "created_at": values["created_at"], "expires_at": values["expires_at"]},
+    )
+    db.execute(statement)
+    db.commit()
+
+
+def invalidate_group_generations(db: Session, vk_group_id: int):
+    """
+    Удаляет все сохранённые ответы группы (вызывается при повторном импорте).
+    """
+    deleted = db.query(GenerationCache).filter(GenerationCache.vk_group_id == vk_group_id).delete()
+    if deleted:
+        logger.info(f"🧹 Удалено {deleted} закэшированных ответов для группы {vk_group_id}")
+
+
+def bump_content_version(db: Session, vk_group_ids: list[int]):
+    """
+    Удаляет сохранённые ответы групп и увеличивает content_version.
+    Вызывается, когда профиль, ChromaDB и лексический индекс уже перестроены: иначе ответ,
+    собранный из старого профиля, попал бы в кэш под новой версией.
+    """
+    for vk_group_id in vk_group_ids:
+        invalidate_group_generations(db, vk_group_id)
+    db.query(Group).filter(Group.vk_group_id.in_(vk_group_ids)).update(
+        {Group.content_version: Group.content_version + 1}, synchronize_session=False
+    )
+    db.commit()
+
+
+async def cached_generation(
+    db: Session,
+    vk_group_id: int,
+    command: str,
+    model_version: str,
+    generate: Callable[[], Awaitable[str]],
+    regenerate: bool = False,
+) -> str:
+    """
+    Возвращает ответ из кэша или генерирует новый и сохраняет его.
+    regenerate=True — явный обход кэша: ответ генерируется заново и перезаписывает старый.
+    """
+    content_version = get_content_version(db, vk_group_id)
+    if content_version is None:
+        return await generate()
+
+    if not regenerate:
+        cached = get_cached_generation(db, vk_group_id, command, content_version, model_version)
+        if cached is not None:
+            logger.info(f"⚡ Ответ '{command}' для группы {vk_group_id} взят из кэша (версия {content_version})")
+            return cached
+
+    result = await generate()
+    store_generation(db, vk_group_id, command, content_version, model_version, result)
+    return result
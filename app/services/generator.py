@@ -1,50 +1,84 @@
+import asyncio
 import logging
 from sqlalchemy.orm import Session
-from langchain_openai import ChatOpenAI
-from app.models import Group, Post, Product, Service
-from app.services.rag import get_group_vectorstore
-from app.core.config import OPENROUTER_API_KEY, AI_MODEL
+from app.models import Group
+from app.services.embeddings import get_embeddings
+from app.services.retrieval import hybrid_search
+from app.services.group_profile import get_group_profile, format_group_profile
+from app.services.analytics import get_group_analytics, format_analytics_for_prompt
+from app.services.generation_cache import get_content_version
+from app.services.semantic_cache import semantic_cache
+from app.services.llm_gateway import llm_gateway, Priority
+from app.services.prompt_budget import PromptSection, assemble_prompt
+from app.core.metrics import stage
+from app.core.config import AI_MODEL, SEMANTIC_CACHE_ENABLED, PROMPT_TOKEN_BUDGET
 
 logger = logging.getLogger(__name__)
 
-llm = ChatOpenAI(
-    openai_api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
-    model_name=AI_MODEL,
-    temperature=0.5,
-    max_tokens=3000
-)
+# Версия промптов: увеличивайте при изменении текстов, чтобы старые ответы в кэше не использовались
+PROMPT_VERSION = 2
+GENERATION_MODEL_VERSION = f"{AI_MODEL}:p{PROMPT_VERSION}"
 
+# Запросы к БД, эмбеддинги, поиск, аналитика и подсчёт токенов синхронные и выполняются через
+# asyncio.to_thread: в event loop остаётся только llm_gateway.invoke, чтобы приоритеты шлюза,
+# дедлайны и отмена по разрыву websocket не ждали чужой CPU-работы
 
-def generate_post_from_context(db: Session, query: str, vk_group_id: int, history: str = "") -> str:
+
+def _semantic_cache_lookup(db: Session, vk_group_id: int, query: str) -> tuple[int | None, list[float] | None, str | None]:
+    """Версия контента, эмбеддинг запроса и ответ из семантического кэша (если есть)"""
+    content_version = get_content_version(db, vk_group_id)
+    if content_version is None:
+        return None, None, None
+    # Эмбеддинг считается один раз: и для кэша, и для поиска
+    query_vector = get_embeddings().embed_query(query)
+    return content_version, query_vector, semantic_cache.lookup(vk_group_id, content_version, query_vector)
+
+
+def _load_profile_text(db: Session, vk_group_id: int) -> str:
+    group = db.query(Group).filter(Group.vk_group_id == vk_group_id).first()
+    return format_group_profile(group, get_group_profile(db, vk_group_id)) if group else ""
+
+
+def _load_profile(db: Session, vk_group_id: int):
+    group = db.query(Group).filter(Group.vk_group_id == vk_group_id).first()
+    profile = get_group_profile(db, vk_group_id)
+    return profile, format_group_profile(group, profile)
+
+
+def _load_analytics_text(db: Session, vk_group_id: int) -> str:
+    return format_analytics_for_prompt(get_group_analytics(db, vk_group_id))
+
+
+async def generate_post_from_context(db: Session, query: str, vk_group_id: int, history: str = "", use_semantic_cache: bool = False, tenant=None) -> str:
     """
-    Генерирует пост на основе данных из коллекции ChromaDB для сообщества.
-    Если поиск по запросу не возвращает документов, выполняется fallback-поиск по пустому запросу.
+    Генерирует пост на основе данных сообщества: профиля группы и документов, найденных гибридным поиском.
+    Если поиск ничего не нашёл, контекстом служит только профиль (стиль, лучшие посты, каталог).
+    use_semantic_cache — запрос не зависит от предыдущего диалога, и ответ можно взять
+    из семантического кэша (если он включён в конфиге).
     """
-    vectorstore = get_group_vectorstore(vk_group_id)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
+    query_vector = None
+    content_version = None
+    if use_semantic_cache and SEMANTIC_CACHE_ENABLED:
+        with stage("chat", "semantic_cache", vk_group_id=vk_group_id):
+            content_version, query_vector, cached = await asyncio.to_thread(_semantic_cache_lookup, db, vk_group_id, query)
+        if cached is not None:
+            return cached
+
+    # Без предпочтения популярных постов: иначе они вытесняют точные совпадения по товарам и ценам,
+    # а лучшие посты как образцы стиля и так есть в профиле группы
+    with stage("chat", "retrieval", vk_group_id=vk_group_id):
+        docs = await asyncio.to_thread(hybrid_search, vk_group_id, query, query_vector=query_vector)
+    if not docs:
+        # Повторный поиск по пустой строке ничего не даёт — профиль группы с лучшими постами
+        # и так входит в промпт и служит детерминированным запасным контекстом
+        logger.warning(f"Нет релевантных документов для vk_group_id {vk_group_id} по запросу: {query}. Используем профиль группы.")
     
-    try:
-        results = retriever.invoke(query)
-        docs = results if isinstance(results, list) else [results]
-        logger.info(f"Найдено документов: {len(docs)} для запроса: {query}")
-    except Exception as e:
-        logger.error(f"Ошибка поиска в коллекции для vk_group_id {vk_group_id}: {e}")
-        docs = []
-    
-    if not docs or all(not doc.page_content.strip() for doc in docs):
-        logger.warning(f"Нет релевантных документов для vk_group_id {vk_group_id} по запросу: {query}. Используем fallback.")
-        try:
-            fallback_results = retriever.invoke("")
-            docs = fallback_results if isinstance(fallback_results, list) else [fallback_results]
-            logger.info(f"Fallback найдено документов: {len(docs)}")
-        except Exception as e:
-            logger.error(f"Ошибка fallback поиска: {e}")
-            docs = []
-    
-    context_texts = "\n\n".join([doc.page_content for doc in docs if doc.page_content.strip()])
-    if not context_texts.strip():
-        context_texts = """
+    with stage("chat", "context", vk_group_id=vk_group_id):
+        profile_text = await asyncio.to_thread(_load_profile_text, db, vk_group_id)
+    doc_items = [doc.page_content for doc in docs if doc.page_content.strip()]
+
+    if not profile_text and not doc_items:
+        profile_text = """
         У нас нет данных о группе.  
         Прежде чем создать рекламный пост, уточни у пользователя ключевую информацию:  
         - О чём эта группа?  
@@ -55,19 +89,23 @@ def generate_post_from_context(db: Session, query: str, vk_group_id: int, histor
         Запроси только то, что критически важно для создания качественного поста.  
         После получения данных сразу сгенерируй публикацию.
         """
-        
-    prompt = f"""
+
+    def render(sections: dict[str, str]) -> str:
+        context_texts = sections["profile"]
+        if sections["documents"]:
+            context_texts += f"\n\nНайденные материалы:\n{sections['documents']}"
+        return f"""
     Ты — профессиональный маркетолог и копирайтер. Ты изучил группу ВКонтакте и её стиль общения. 
     Теперь ты отвечаешь на запрос пользователя, придерживаясь стиля и структуры, которые уже используются в этой группе.
 
     🔹 **История общения (для понимания запроса пользователя)**:  
-    {history}
+    {sections["history"]}
 
     🔹 **Данные о группе (используй как контекст)**:  
     {context_texts}
 
     🔹 **Что написал пользователь**:  
-    "{query}"
+    "{sections["query"]}"
 
     🔎 Твоя задача — понять, что именно хочет пользователь:
     - Если он просит «привет», «что ты умеешь» и т.п. — вежливо объясни, что ты можешь помочь с созданием постов для сообщества, которое ты уже изучил (вставь его название), и предложи задать тему поста.
@@ -99,37 +137,39 @@ def generate_post_from_context(db: Session, query: str, vk_group_id: int, histor
     5. **Не объясняй свои шаги. Пиши сразу как живой текст — будто ты SMM-менеджер, пишущий пост для сообщества.**
     """
 
+    # Бюджет: сначала сокращаются найденные документы (с конца), потом начало истории, профиль — в последнюю очередь
+    with stage("chat", "prompt", vk_group_id=vk_group_id):
+        prompt = await asyncio.to_thread(assemble_prompt, render, [
+            PromptSection("documents", items=doc_items, priority=1),
+            PromptSection("history", history, priority=2, min_tokens=300, keep="tail"),
+            PromptSection("profile", profile_text, priority=3, min_tokens=400),
+            PromptSection("query", query, priority=4, min_tokens=1000),
+        ], PROMPT_TOKEN_BUDGET)
 
-    
     logger.info(f"📢 [vk_group_id={vk_group_id}] Передаем запрос в {AI_MODEL}:\n{prompt}")
 
-    response = llm.invoke(prompt)
-    return response.content.strip()
+    with stage("chat", "llm", vk_group_id=vk_group_id):
+        result = await llm_gateway.invoke(prompt, priority=Priority.INTERACTIVE, tenant=tenant, label="chat")
+    if query_vector is not None:
+        semantic_cache.store(vk_group_id, content_version, query_vector, query, result)
+    return result
 
-def generate_ideas_for_group(db: Session, group_id: int) -> str:
+async def generate_ideas_for_group(db: Session, group_id: int, tenant=None, priority: Priority = Priority.HEAVY) -> str:
     """
     Генерирует 5 актуальных идей и готовых постов для сообщества, основываясь на полном анализе его данных.
     """
-    posts = db.query(Post).filter(Post.group_id == group_id).all()
-    group = db.query(Group).filter(Group.vk_group_id == group_id).first()
-    products = db.query(Product).filter(Product.group_id == group_id).all()
-    services = db.query(Service).filter(Service.group_id == group_id).all()
+    with stage("auto_idea", "context", vk_group_id=group_id):
+        profile, profile_text = await asyncio.to_thread(_load_profile, db, group_id)
 
-    formatted_posts = "\n\n".join([
-        f"📝 {p.text}\n👍 {p.likes} 💬 {p.comments} 🔁 {p.reposts}" for p in posts
-    ]) or "Нет постов."
+    last_post_date = profile.last_post_at.strftime('%d.%m.%Y') if profile.last_post_at else "Нет постов"
 
-    doc_description = f"Название группы: {group.name}\nОписание: {group.description}\nПодписчики: {group.subscribers_count}"
-    doc_products = "\n".join([f"{p.name} — {p.description} (Цена: {p.price})" for p in products]) or "Нет товаров."
-    doc_services = "\n".join([f"{s.name} — {s.description} (Цена: {s.price})" for s in services]) or "Нет услуг."
-    last_post_date = posts[-1].date.strftime('%d.%m.%Y') if posts else "Нет постов"
-
-    prompt = f"""
+    def render(sections: dict[str, str]) -> str:
+        return f"""
 Ты — креативный копирайтер и маркетолог. Твоя задача — полностью проанализировать сообщество ВКонтакте и предложить 5 самых актуальных тем для новых постов.
 
 🎯 Используй ВСЕ предоставленные данные, включая:
-- Посты (и их активность: лайки, комментарии, репосты)
-- Товары и услуги
+- Стиль постов и самые популярные посты (с их активностью: лайки, комментарии, репосты)
+- Товары и услуги из каталога
 - Название и описание группы
 - Подписчиков
 - Дату последней публикации: {last_post_date}
@@ -150,63 +190,47 @@ def generate_ideas_for_group(db: Session, group_id: int) -> str:
 6. Не пиши анализ группы, не вводи текст типа "Анализ:..." — сразу переходи к 5 идеям, их обоснованию и текстам постов.
 
 
-📋 Данные о группе:
-{doc_description}
-
-📦 Товары:
-{doc_products}
-
-🛠 Услуги:
-{doc_services}
-
-📜 Примеры постов с активностью:
-{formatted_posts}
+📋 Профиль сообщества:
+{sections["profile"]}
 
 🎁 Итог:
 Предложи 5 идей для постов, объясни каждую, и сразу приведи сам текст публикации.
     """.strip()
 
+    with stage("auto_idea", "prompt", vk_group_id=group_id):
+        prompt = await asyncio.to_thread(assemble_prompt, render, [
+            PromptSection("profile", profile_text, min_tokens=500),
+        ], PROMPT_TOKEN_BUDGET)
+
     logger.info(f"⚡ Генерация по команде 'auto_idea' (vk_group_id={group_id})")
     logger.debug(prompt)
 
-    response = llm.invoke(prompt)
-    return response.content.strip()
+    with stage("auto_idea", "llm", vk_group_id=group_id):
+        return await llm_gateway.invoke(prompt, priority=priority, tenant=tenant, label="auto_idea")
 
-def generate_growth_plan_for_group(db: Session, group_id: int) -> str:
+async def generate_growth_plan_for_group(db: Session, group_id: int, tenant=None, priority: Priority = Priority.HEAVY) -> str:
     """
     Генерирует подробный анализ сообщества и стратегический план его развития.
     """
-    posts = db.query(Post).filter(Post.group_id == group_id).all()
-    group = db.query(Group).filter(Group.vk_group_id == group_id).first()
-    products = db.query(Product).filter(Product.group_id == group_id).all()
-    services = db.query(Service).filter(Service.group_id == group_id).all()
-
-    formatted_posts = "\n\n".join([
-        f"📝 {p.text}\n👍 {p.likes} 💬 {p.comments} 🔁 {p.reposts}" for p in posts
-    ]) or "Нет постов."
+    with stage("growth_plan", "context", vk_group_id=group_id):
+        _, profile_text = await asyncio.to_thread(_load_profile, db, group_id)
+    with stage("growth_plan", "analytics", vk_group_id=group_id):
+        doc_analytics = await asyncio.to_thread(_load_analytics_text, db, group_id)
 
-    doc_description = f"Название группы: {group.name}\nОписание: {group.description}\nПодписчики: {group.subscribers_count}"
-    doc_products = "\n".join([f"{p.name} — {p.description} (Цена: {p.price})" for p in products]) or "Нет товаров."
-    doc_services = "\n".join([f"{s.name} — {s.description} (Цена: {s.price})" for s in services]) or "Нет услуг."
-    last_post_date = posts[-1].date.strftime('%d.%m.%Y') if posts else "Нет постов"
-
-    prompt = f"""
+    def render(sections: dict[str, str]) -> str:
+        return f"""
 Ты — лучший в мире специалист по продвижению сообществ ВКонтакте. Сейчас тебе предстоит провести **глубокий анализ** сообщества и выдать **план развития**, который реально поможет ему вырасти.
 
-🎯 Данные сообщества:
-- Название: {group.name}
-- Описание: {group.description}
-- Подписчиков: {group.subscribers_count}
-- Дата последнего поста: {last_post_date}
-- Примеры товаров: {doc_products}
-- Примеры услуг: {doc_services}
-- Примеры постов с активностью:  
-{formatted_posts}
+🎯 Профиль сообщества:
+{sections["profile"]}
+
+📊 Статистика постов (уже посчитана, не пересчитывай её):
+{sections["analytics"]}
 
 🔍 Что ты должен сделать:
 1. Проанализируй тематику сообщества — о чём оно, чем полезно подписчикам.
 2. Проанализируй товары и услуги: какие предложения стоит продвигать.
-3. Проанализируй посты:
+3. Проанализируй посты, опираясь на статистику:
    - Частота публикаций (редко/часто, есть ли регулярность).
    - Какие посты наиболее популярны (по лайкам, репостам, комментам).
    - Какой стиль оформления используется (эмодзи, обращения, структура).
@@ -216,7 +240,7 @@ def generate_growth_plan_for_group(db: Session, group_id: int) -> str:
 
 - Какие темы постов стоит публиковать в ближайший месяц.
 - Какую частоту постинга ты рекомендуешь (учти текущую активность).
-- В какие дни и время лучше публиковать.
+- В какие дни и время лучше публиковать (опирайся на лучшие дни и слоты из статистики).
 - Какие товары и услуги лучше всего продвигать (если они есть).
 - Какие форматы использовать (истории, опросы, розыгрыши, экспертные посты и т.д.).
 - Если нужно — порекомендуй обновить описание группы, название и т.д.
@@ -227,9 +251,16 @@ def generate_growth_plan_for_group(db: Session, group_id: int) -> str:
 🚫 Не пиши "анализ: ..." и "вывод: ..." — просто выдай текст как итоговый профессиональный отчёт с понятными рекомендациями.
     """.strip()
 
+    # Посчитанная статистика ценнее примеров постов из профиля — профиль сокращается первым
+    with stage("growth_plan", "prompt", vk_group_id=group_id):
+        prompt = await asyncio.to_thread(assemble_prompt, render, [
+            PromptSection("profile", profile_text, priority=1, min_tokens=500),
+            PromptSection("analytics", doc_analytics, priority=2, min_tokens=300),
+        ], PROMPT_TOKEN_BUDGET)
+
     logger.info(f"📊 Генерация плана развития (vk_group_id={group_id})")
     logger.debug(prompt)
 
-    response = llm.invoke(prompt)
-    return response.content.strip()
+    with stage("growth_plan", "llm", vk_group_id=group_id):
+        return await llm_gateway.invoke(prompt, priority=priority, tenant=tenant, label="growth_plan")
 
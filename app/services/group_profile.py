@@ -0,0 +1,184 @@
+import re
+import logging
+import statistics
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.models import Group, Post, Product, Service, GroupProfile
+
+logger = logging.getLogger(__name__)
+
+# Сколько элементов профиля попадает в промпт — от размера группы не зависит
+TOP_HASHTAGS = 10
+TOP_EXEMPLARS = 3
+EXEMPLAR_MAX_CHARS = 600
+CATALOG_MAX_ITEMS = 10
+
+EMOJI_RE = re.compile(
+    "[\U0001F300-\U0001FAFF\U00002600-\U000027BF\U0001F1E6-\U0001F1FF\U00002B00-\U00002BFF]"
+)
+WORD_RE = re.compile(r"[а-яёa-z]+", re.IGNORECASE)
+FORMAL_WORDS = {"вы", "вас", "вам", "вами", "ваш", "ваша", "ваше", "ваши", "вашего", "вашей", "ваших"}
+INFORMAL_WORDS = {"ты", "тебя", "тебе", "тобой", "твой", "твоя", "твоё", "твое", "твои", "твоего", "твоей", "твоих"}
+
+# Служебные тексты, которые vk_service подставляет вместо пустых постов
+PLACEHOLDER_PREFIX = "["
+
+
+def extract_hashtags(text: str) -> list[str]:
+    return [
+        word.lower().rstrip(".,!?:;")
+        for word in text.split()
+        if word.startswith("#") and len(word) > 1
+    ]
+
+
+def _engagement(post: Post) -> int:
+    return (post.likes or 0) + (post.comments or 0) + (post.reposts or 0)
+
+
+def _detect_formality(texts: list[str]) -> str:
+    formal = informal = 0
+    for text in texts:
+        for word in WORD_RE.findall(text.lower()):
+            if word in FORMAL_WORDS:
+                formal += 1
+            elif word in INFORMAL_WORDS:
+                informal += 1
+    if not formal and not informal:
+        return "без прямого обращения"
+    return "на «вы»" if formal >= informal else "на «ты»"
+
+
+def _detect_tone(texts: list[str], emoji_rate: float, typical_length: int) -> str:
+    if not texts:
+        return "не определён"
+    exclamations = sum(text.count("!") for text in texts) / len(texts)
+    if emoji_rate >= 3 or exclamations >= 2:
+        return "эмоциональный, дружелюбный"
+    if typical_length >= 800 and exclamations < 1:
+        return "экспертный, информационный"
+    if emoji_rate >= 1 or exclamations >= 1:
+        return "дружелюбный"
+    return "нейтральный"
+
+
+def _summarize_catalog(title: str, items: list) -> str:
+    if not items:
+        return f"{title}: нет."
+    names = [f"{item.name} ({item.price})" for item in items[:CATALOG_MAX_ITEMS]]
+    summary = f"{title} ({len(items)}): " + "; ".join(names)
+    if len(items) > CATALOG_MAX_ITEMS:
+        summary += f" и ещё {len(items) - CATALOG_MAX_ITEMS}"
+    return summary
+
+
+def build_group_profile(posts: list[Post], products: list[Product], services: list[Service]) -> dict:
+    """
+    Считает компактный профиль сообщества: стиль постов, хештеги, лучшие посты и сводку каталога.
+    """
+    texts = [p.text for p in posts if p.text and not p.text.startswith(PLACEHOLDER_PREFIX)]
+
+    emoji_rate = sum(len(EMOJI_RE.findall(text)) for text in texts) / len(texts) if texts else 0.0
+    typical_length = int(statistics.median(len(text) for text in texts)) if texts else 0
+
+    hashtags = Counter(tag for text in texts for tag in extract_hashtags(text))
+
+    exemplars = [
+        {
+            "text": p.text[:EXEMPLAR_MAX_CHARS],
+            "likes": p.likes or 0,
+            "comments": p.comments or 0,
+            "reposts": p.reposts or 0,
+        }
+        for p in sorted(
+            (p for p in posts if p.text and not p.text.startswith(PLACEHOLDER_PREFIX)),
+            key=_engagement,
+            reverse=True,
+        )[:TOP_EXEMPLARS]
+    ]
+
+    dates = [p.date for p in posts if p.date]
+
+    return {
+        "post_count": len(posts),
+        "tone": _detect_tone(texts, emoji_rate, typical_length),
+        "formality": _detect_formality(texts),
+        "emoji_rate": round(emoji_rate, 2),
+        "typical_length": typical_length,
+        "top_hashtags": [tag for tag, _ in hashtags.most_common(TOP_HASHTAGS)],
+        "exemplars": exemplars,
+        "catalog_summary": "\n".join([
+            _summarize_catalog("Товары", products),
+            _summarize_catalog("Услуги", services),
+        ]),
+        "last_post_at": max(dates) if dates else None,
+    }
+
+
+def refresh_group_profile(db: Session, vk_group_id: int) -> GroupProfile:
+    """
+    Пересчитывает и сохраняет профиль группы. Вызывается при импорте данных.
+    """
+    posts = db.query(Post).filter(Post.group_id == vk_group_id).all()
+    products = db.query(Product).filter(Product.group_id == vk_group_id).all()
+    services = db.query(Service).filter(Service.group_id == vk_group_id).all()
+
+    values = build_group_profile(posts, products, services)
+
+    profile = db.query(GroupProfile).filter(GroupProfile.vk_group_id == vk_group_id).first()
+    if not profile:
+        profile = GroupProfile(vk_group_id=vk_group_id)
+        db.add(profile)
+    for key, value in values.items():
+        setattr(profile, key, value)
+    profile.updated_at = datetime.utcnow()
+
+    db.commit()
+    db.refresh(profile)
+    logger.info(f"🧬 Профиль группы {vk_group_id} обновлён: {profile.post_count} постов, тон «{profile.tone}»")
+    return profile
+
+
+def get_group_profile(db: Session, vk_group_id: int) -> GroupProfile:
+    """
+    Возвращает профиль группы. Для групп, импортированных до появления профилей, считает его на лету.
+    """
+    profile = db.query(GroupProfile).filter(GroupProfile.vk_group_id == vk_group_id).first()
+    if profile:
+        return profile
+    return refresh_group_profile(db, vk_group_id)
+
+
+def format_group_profile(group: Group, profile: GroupProfile) -> str:
+    """
+    Текстовое представление профиля для промптов. Размер не зависит от количества постов.
+    """
+    exemplars = "\n\n".join(
+        f"📝 {e['text']}\n👍 {e['likes']} 💬 {e['comments']} 🔁 {e['reposts']}"
+        for e in (profile.exemplars or [])
+    ) or "Нет постов."
+    last_post = profile.last_post_at.strftime('%d.%m.%Y') if profile.last_post_at else "Нет постов"
+    hashtags = " ".join(profile.top_hashtags or []) or "не используются"
+
+    return f"""
+Название группы: {group.name}
+Описание: {group.description}
+Категория: {group.category or "не указана"}
+Подписчики: {group.subscribers_count}
+Постов проанализировано: {profile.post_count}
+Дата последнего поста: {last_post}
+
+Стиль постов:
+- Тон: {profile.tone}
+- Обращение: {profile.formality}
+- Эмодзи на пост: {profile.emoji_rate}
+- Типичная длина поста: {profile.typical_length} символов
+- Частые хештеги: {hashtags}
+
+Каталог:
+{profile.catalog_summary}
+
+Самые популярные посты:
+{exemplars}
+""".strip()
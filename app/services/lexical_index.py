@@ -0,0 +1,117 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+from langchain_core.documents import Document
+from app.core.config import CHROMA_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[0-9a-zа-яё]+", re.IGNORECASE)
+# Грубый стемминг: у длинных слов отрезаем окончание, чтобы «скидки» и «скидке» совпадали
+STEM_LENGTH = 5
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_cache: dict[int, tuple[float, "BM25Index"]] = {}
+_cache_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token.isalpha() and len(token) > STEM_LENGTH:
+            token = token[:STEM_LENGTH]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Инвертированный индекс BM25 по документам одной группы"""
+
+    def __init__(self, documents: list[Document]):
+        self.documents = documents
+        self.lengths = []
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        for doc_id, doc in enumerate(documents):
+            frequencies = Counter(tokenize(doc.page_content))
+            self.lengths.append(sum(frequencies.values()))
+            for term, frequency in frequencies.items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def search(self, query: str, k: int, doc_types: list[str] | None = None) -> list[tuple[Document, float]]:
+        count = len(self.documents)
+        if not count:
+            return []
+        scores: Counter = Counter()
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / (self.average_length or 1))
+                scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        if doc_types:
+            scores = Counter({
+                doc_id: score for doc_id, score in scores.items()
+                if self.documents[doc_id].metadata.get("type") in doc_types
+            })
+        return [(self.documents[doc_id], score) for doc_id, score in scores.most_common(k)]
+
+
+def _index_path(vk_group_id: int) -> str:
+    return os.path.join(CHROMA_DB_PATH, "lexical", f"group_{vk_group_id}.json")
+
+
+def build_lexical_index(vk_group_id: int, documents: list[Document]) -> BM25Index:
+    """
+    Сохраняет документы группы для лексического поиска. Вызывается при импорте вместе с обновлением ChromaDB.
+    """
+    path = _index_path(vk_group_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump([{"page_content": d.page_content, "metadata": d.metadata} for d in documents], f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    index = BM25Index(documents)
+    with _cache_lock:
+        _cache[vk_group_id] = (os.path.getmtime(path), index)
+    return index
+
+
+def get_lexical_index(vk_group_id: int) -> BM25Index | None:
+    """
+    Возвращает индекс группы (из памяти процесса, если файл не менялся) или None, если индекса ещё нет.
+    """
+    path = _index_path(vk_group_id)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _cache_lock:
+        cached = _cache.get(vk_group_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, encoding="utf-8") as f:
+        documents = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.load(f)]
+    index = BM25Index(documents)
+    with _cache_lock:
+        _cache[vk_group_id] = (mtime, index)
+    return index
+
+
+def delete_lexical_index(vk_group_id: int):
+    with _cache_lock:
+        _cache.pop(vk_group_id, None)
+    try:
+        os.remove(_index_path(vk_group_id))
+    except FileNotFoundError:
+        pass
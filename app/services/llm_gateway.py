@@ -0,0 +1,246 @@
+import time
+import asyncio
+import bisect
+import logging
+import itertools
+from enum import IntEnum
+from collections import Counter
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from app.services.prompt_budget import count_tokens
+from app.core.tracing import span, set_attributes
+from app.core.config import (
+    OPENROUTER_API_KEY,
+    AI_MODEL,
+    LLM_BASE_URL,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONCURRENCY_PER_TENANT,
+    LLM_INTERACTIVE_RESERVED,
+    LLM_MAX_QUEUE,
+    LLM_TIMEOUT_INTERACTIVE,
+    LLM_TIMEOUT_HEAVY,
+    LLM_TIMEOUT_BATCH,
+)
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Классы приоритета: чем меньше значение, тем раньше запрос получает слот"""
+    INTERACTIVE = 0  # свободный чат
+    HEAVY = 1        # auto_idea, growth_plan
+    BATCH = 2        # фоновые и пакетные задачи
+
+
+DEFAULT_TIMEOUTS = {
+    Priority.INTERACTIVE: LLM_TIMEOUT_INTERACTIVE,
+    Priority.HEAVY: LLM_TIMEOUT_HEAVY,
+    Priority.BATCH: LLM_TIMEOUT_BATCH,
+}
+
+
+class LLMGatewayOverloaded(Exception):
+    """Очередь к LLM переполнена"""
+
+
+class LLMGatewayTimeout(Exception):
+    """Запрос не уложился в дедлайн (с учётом ожидания в очереди)"""
+
+
+@lru_cache(maxsize=None)
+def get_llm(temperature: float = 0.5, max_tokens: int = 3000) -> "ChatOpenAI":
+    """Общий клиент для всех генераций. base_url настраивается, чтобы подменять OpenRouter локальной заглушкой"""
+    # langchain_openai тянет openai и tiktoken — импортируем при первой генерации, а не при старте
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        openai_api_key=OPENROUTER_API_KEY,
+        base_url=LLM_BASE_URL,
+        model_name=AI_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        max_retries=1,
+    )
+
+
+class LLMGateway:
+    """
+    Единая точка вызова LLM.
+    Ограничивает общее число параллельных запросов и число запросов одного пользователя,
+    выдаёт свободные слоты по приоритету (внутри приоритета — по очереди поступления)
+    и держит LLM_INTERACTIVE_RESERVED слотов только для интерактивного чата.
+    """
+
+    def __init__(self, max_concurrency: int, max_per_tenant: int, interactive_reserved: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_per_tenant = max_per_tenant
+        self.interactive_reserved = min(interactive_reserved, max_concurrency - 1)
+        self.max_queue = max_queue
+        self._waiters: list[tuple[int, int, object, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._tenant_in_flight: Counter = Counter()
+        self._stats = Counter()
+        self._queue_time_total = 0.0
+        self._queue_time_max = 0.0
+        self._tokens_by_label: dict[str, Counter] = {}
+
+    def _has_capacity(self, priority: int, tenant) -> bool:
+        limit = self.max_concurrency
+        if priority != Priority.INTERACTIVE:
+            limit -= self.interactive_reserved
+        if self._in_flight >= limit:
+            return False
+        return tenant is None or self._tenant_in_flight[tenant] < self.max_per_tenant
+
+    def has_idle_capacity(self) -> bool:
+        """Очереди нет, и после ещё одного фонового запроса останется свободный слот для auto_idea / growth_plan"""
+        spare = max(self.max_concurrency - self.interactive_reserved - 1, 1)
+        return not any(not w[3].done() for w in self._waiters) and self._in_flight < spare
+
+    def _dispatch(self):
+        for entry in list(self._waiters):
+            priority, _, tenant, future = entry
+            if future.done():
+                self._waiters.remove(entry)
+                continue
+            if self._has_capacity(priority, tenant):
+                self._waiters.remove(entry)
+                self._take_slot(tenant)
+                future.set_result(None)
+
+    def _take_slot(self, tenant):
+        self._in_flight += 1
+        if tenant is not None:
+            self._tenant_in_flight[tenant] += 1
+
+    def _release(self, tenant):
+        self._in_flight -= 1
+        if tenant is not None:
+            self._tenant_in_flight[tenant] -= 1
+            if self._tenant_in_flight[tenant] <= 0:
+                del self._tenant_in_flight[tenant]
+        self._dispatch()
+
+    async def _acquire(self, priority: int, tenant):
+        if len(self._waiters) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise LLMGatewayOverloaded()
+
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiters, (int(priority), next(self._sequence), tenant, future), key=lambda w: w[:2])
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Слот мог быть выдан в тот же момент, когда задачу отменили
+            if future.done() and not future.cancelled():
+                self._release(tenant)
+            else:
+                future.cancel()
+                self._dispatch()
+            raise
+
+    async def invoke(
+        self,
+        prompt: str,
+        *,
+        priority: Priority = Priority.INTERACTIVE,
+        tenant=None,
+        timeout: float | None = None,
+        temperature: float = 0.5,
+        max_tokens: int = 3000,
+        label: str = "llm",
+    ) -> str:
+        """
+        Выполняет запрос к LLM через очередь шлюза.
+        timeout — общий дедлайн с учётом ожидания в очереди; при отмене задачи
+        (например, при разрыве websocket) запрос снимается с очереди или прерывается.
+        label — тип запроса для учёта токенов (chat, auto_idea, growth_plan, ...).
+        """
+        # Спан охватывает и ожидание слота, и сам запрос: хвостовые задержки часто сидят в очереди
+        with span("llm.invoke", label=label, tenant=str(tenant) if tenant is not None else None,
+                  **{"llm.model": AI_MODEL, "llm.priority": priority.name}) as current:
+            deadline = timeout if timeout is not None else DEFAULT_TIMEOUTS[priority]
+            enqueued_at = time.perf_counter()
+            acquired = False
+            try:
+                async with asyncio.timeout(deadline):
+                    await self._acquire(priority, tenant)
+                    acquired = True
+                    queue_time = time.perf_counter() - enqueued_at
+                    self._queue_time_total += queue_time
+                    self._queue_time_max = max(self._queue_time_max, queue_time)
+                    set_attributes(current, **{"llm.queue_seconds": round(queue_time, 3)})
+                    if queue_time > 1:
+                        logger.info(f"⏳ Запрос к LLM ждал слот {queue_time:.1f} с (приоритет {priority.name})")
+
+                    started_at = time.perf_counter()
+                    response = await get_llm(temperature, max_tokens).ainvoke(prompt)
+                    elapsed = time.perf_counter() - started_at
+            except TimeoutError:
+                self._stats["timeouts"] += 1
+                logger.warning(f"⌛ Запрос к LLM не уложился в {deadline} с (приоритет {priority.name})")
+                raise LLMGatewayTimeout()
+            except asyncio.CancelledError:
+                self._stats["cancelled"] += 1
+                raise
+            except Exception:
+                self._stats["errors"] += 1
+                raise
+            finally:
+                if acquired:
+                    self._release(tenant)
+
+            self._stats["completed"] += 1
+            result = response.content.strip()
+            prompt_tokens, completion_tokens = self._record_usage(
+                label, prompt, result, getattr(response, "usage_metadata", None), elapsed
+            )
+            set_attributes(current, **{"llm.prompt_tokens": prompt_tokens, "llm.completion_tokens": completion_tokens})
+            return result
+
+    def _record_usage(self, label: str, prompt: str, result: str, usage: dict | None, elapsed: float):
+        # Если провайдер не вернул usage, считаем токены сами
+        prompt_tokens = usage.get("input_tokens") if usage else None
+        completion_tokens = usage.get("output_tokens") if usage else None
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(prompt)
+        if completion_tokens is None:
+            completion_tokens = count_tokens(result)
+
+        totals = self._tokens_by_label.setdefault(label, Counter())
+        totals["requests"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["llm_seconds"] += elapsed
+        logger.info(f"🧾 LLM [{label}]: промпт {prompt_tokens} ток., ответ {completion_tokens} ток., {elapsed:.1f} с")
+        return prompt_tokens, completion_tokens
+
+    def stats(self) -> dict:
+        queued = Counter(Priority(w[0]).name for w in self._waiters if not w[3].done())
+        started = self._stats["completed"] + self._stats["errors"] + self._stats["timeouts"] + self._stats["cancelled"]
+        return {
+            "in_flight": self._in_flight,
+            "queued": dict(queued),
+            "tenants_in_flight": len(self._tenant_in_flight),
+            "completed": self._stats["completed"],
+            "errors": self._stats["errors"],
+            "timeouts": self._stats["timeouts"],
+            "cancelled": self._stats["cancelled"],
+            "rejected": self._stats["rejected"],
+            "queue_time_avg": self._queue_time_total / started if started else 0.0,
+            "queue_time_max": self._queue_time_max,
+            "tokens": {label: dict(totals) for label, totals in self._tokens_by_label.items()},
+        }
+
+
+llm_gateway = LLMGateway(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_per_tenant=LLM_MAX_CONCURRENCY_PER_TENANT,
+    interactive_reserved=LLM_INTERACTIVE_RESERVED,
+    max_queue=LLM_MAX_QUEUE,
+)
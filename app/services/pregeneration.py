@@ -0,0 +1,146 @@
+"""
+Предварительная генерация после импорта группы.
+
+Первое, что пользователь делает после импорта, — нажимает "Придумай сам" и ждёт ответ LLM десятки секунд.
+Если PREGENERATE_ENABLED, save_group_data ставит в очередь генерацию команд PREGENERATE_COMMANDS:
+она ждёт свободных слотов шлюза LLM, идёт с приоритетом BATCH и сохраняет ответ в кэш генераций
+(generation_cache) под текущей версией контента группы — первое нажатие берёт готовый ответ.
+
+save_group_data вызывается из потоков пула FastAPI, поэтому задачи передаются в event loop,
+запомненный при старте приложения (run_coroutine_threadsafe). Повторный импорт группы отменяет
+её незавершённую генерацию: ответ по старым данным не нужен. Если пользователь нажал команду,
+пока генерация идёт, он дожидается её, а не запускает вторую такую же; если она ещё ждёт свободного
+слота — она отменяется, и ответ генерируется обычным интерактивным запросом.
+"""
+import asyncio
+import logging
+from app.core.db import SessionLocal
+from app.services.generator import generate_ideas_for_group, generate_growth_plan_for_group, GENERATION_MODEL_VERSION
+from app.services.generation_cache import cached_generation
+from app.services.llm_gateway import llm_gateway, Priority
+from app.core.metrics import PREGENERATIONS
+from app.core.config import (
+    PREGENERATE_ENABLED,
+    PREGENERATE_COMMANDS,
+    PREGENERATE_CONCURRENCY,
+    PREGENERATE_MAX_WAIT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+GENERATORS = {
+    "auto_idea": generate_ideas_for_group,
+    "growth_plan": generate_growth_plan_for_group,
+}
+IDLE_POLL_SECONDS = 5
+
+
+class Pregenerator:
+    def __init__(self, commands: list[str], concurrency: int, max_wait: float):
+        unknown = set(commands) - set(GENERATORS)
+        if unknown:
+            logger.warning(f"⚠️ Неизвестные команды в PREGENERATE_COMMANDS: {sorted(unknown)}")
+        self.commands = [command for command in commands if command in GENERATORS]
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._tasks: dict[tuple[int, str], asyncio.Task] = {}
+        # Задачи, которые уже дождались свободного слота и генерируют ответ
+        self._started: set[asyncio.Task] = set()
+
+    def bind_loop(self):
+        """Вызывается при старте приложения внутри event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def schedule(self, vk_group_id: int, user_id: int):
+        """Потокобезопасно: ставит генерацию в очередь loop'а приложения. Без loop (скрипты) ничего не делает"""
+        if not PREGENERATE_ENABLED or self._loop is None or not self.commands or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._schedule(vk_group_id, user_id), self._loop)
+
+    async def _schedule(self, vk_group_id: int, user_id: int):
+        for command in self.commands:
+            key = (vk_group_id, command)
+            previous = self._tasks.get(key)
+            if previous is not None and not previous.done():
+                previous.cancel()
+                logger.info(f"🧹 Предварительная генерация '{command}' для группы {vk_group_id} отменена: группа импортирована заново")
+            task = asyncio.create_task(self._run(vk_group_id, user_id, command))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+    def _forget(self, key: tuple[int, str], task: asyncio.Task):
+        self._started.discard(task)
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def _wait_for_idle(self) -> bool:
+        waited = 0.0
+        while not llm_gateway.has_idle_capacity():
+            if waited >= self.max_wait:
+                return False
+            await asyncio.sleep(IDLE_POLL_SECONDS)
+            waited += IDLE_POLL_SECONDS
+        return True
+
+    async def _run(self, vk_group_id: int, user_id: int, command: str):
+        try:
+            async with self._slots:
+                if not await self._wait_for_idle():
+                    PREGENERATIONS.labels(command, "busy").inc()
+                    logger.info(f"⏭ Предварительная генерация '{command}' для группы {vk_group_id} пропущена: LLM занят")
+                    return
+                generate = GENERATORS[command]
+                generated = False
+
+                async def run_generation() -> str:
+                    nonlocal generated
+                    generated = True
+                    self._started.add(asyncio.current_task())
+                    return await generate(db, vk_group_id, tenant=user_id, priority=Priority.BATCH)
+
+                with SessionLocal() as db:
+                    await cached_generation(db, vk_group_id, command, GENERATION_MODEL_VERSION, run_generation)
+                PREGENERATIONS.labels(command, "stored" if generated else "cached").inc()
+                if generated:
+                    logger.info(f"🔮 Ответ '{command}' для группы {vk_group_id} подготовлен заранее")
+        except asyncio.CancelledError:
+            PREGENERATIONS.labels(command, "cancelled").inc()
+            raise
+        except Exception as e:
+            PREGENERATIONS.labels(command, "error").inc()
+            logger.warning(f"⚠️ Предварительная генерация '{command}' для группы {vk_group_id} не удалась: {e}")
+
+    async def wait(self, vk_group_id: int, command: str):
+        """
+        Если предварительная генерация команды уже идёт, дожидается её, чтобы ответ взялся из кэша.
+        Генерацию, которая ещё ждёт свободного слота, отменяет: пользователь получит ответ быстрее
+        интерактивным запросом, чем дожидаясь фоновой очереди.
+        Ошибка или отмена генерации не мешают: вызывающий сгенерирует ответ сам.
+        """
+        task = self._tasks.get((vk_group_id, command))
+        if task is None or task.done():
+            return
+        if task not in self._started:
+            task.cancel()
+            PREGENERATIONS.labels(command, "preempted").inc()
+            return
+        PREGENERATIONS.labels(command, "joined").inc()
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Отменили самого ожидающего (например, клиент отключился) — генерация продолжится для следующего раза
+            if not task.cancelled():
+                raise
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+
+pregenerator = Pregenerator(PREGENERATE_COMMANDS, PREGENERATE_CONCURRENCY, PREGENERATE_MAX_WAIT_SECONDS)
@@ -0,0 +1,116 @@
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable
+from app.core.config import TIKTOKEN_ENCODING
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARK = "…"
+# Для оценки без словаря tiktoken: русский текст в cl100k — примерно 3 символа на токен
+APPROX_CHARS_PER_TOKEN = 3
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Словарь tiktoken загружается один раз. Без доступа к сети (и без кэша словаря)
+    переходим на приблизительный подсчёт по числу символов.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось загрузить кодировку tiktoken {TIKTOKEN_ENCODING}, считаем токены приблизительно: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // APPROX_CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    Обрезает текст до max_tokens. keep="head" сохраняет начало, keep="tail" — конец (для истории диалога).
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = get_encoding()
+    if encoding is None:
+        limit = max_tokens * APPROX_CHARS_PER_TOKEN
+        return TRUNCATION_MARK + text[-limit:] if keep == "tail" else text[:limit] + TRUNCATION_MARK
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if keep == "tail":
+        return TRUNCATION_MARK + encoding.decode(tokens[-max_tokens:])
+    return encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARK
+
+
+@dataclass
+class PromptSection:
+    """
+    Часть промпта с переменным размером.
+    priority — ценность раздела: при нехватке бюджета сначала сокращаются разделы с меньшим priority.
+    items — если задан, раздел состоит из элементов по убыванию важности (например, найденные документы):
+    сначала отбрасываются последние элементы целиком, и только потом обрезается текст.
+    min_tokens — сколько токенов раздела сохраняется в любом случае.
+    """
+    name: str
+    text: str = ""
+    priority: int = 0
+    min_tokens: int = 0
+    keep: str = "head"
+    items: list[str] | None = None
+    separator: str = "\n\n"
+    tokens: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        if self.items is not None:
+            self.items = [item for item in self.items if item.strip()]
+            self.text = self.separator.join(self.items)
+        self.tokens = count_tokens(self.text)
+
+    def shrink_to(self, max_tokens: int):
+        max_tokens = max(max_tokens, self.min_tokens)
+        if self.tokens <= max_tokens:
+            return
+        if self.items:
+            while len(self.items) > 1 and count_tokens(self.separator.join(self.items)) > max_tokens:
+                self.items.pop()
+            self.text = self.separator.join(self.items)
+        self.text = truncate_to_tokens(self.text, max_tokens, keep=self.keep)
+        self.tokens = count_tokens(self.text)
+
+
+def fit_sections(sections: list[PromptSection], budget: int) -> dict[str, str]:
+    """
+    Распределяет бюджет токенов между разделами, сокращая наименее ценные первыми.
+    """
+    overflow = sum(s.tokens for s in sections) - budget
+    for section in sorted(sections, key=lambda s: s.priority):
+        if overflow <= 0:
+            break
+        before = section.tokens
+        section.shrink_to(before - overflow)
+        overflow -= before - section.tokens
+        logger.info(f"✂️ Раздел промпта «{section.name}» сокращён: {before} → {section.tokens} токенов")
+    return {s.name: s.text for s in sections}
+
+
+def assemble_prompt(render: Callable[[dict[str, str]], str], sections: list[PromptSection], budget: int) -> str:
+    """
+    Собирает промпт в пределах бюджета.
+    render получает словарь {имя раздела: текст} и возвращает итоговый промпт;
+    неизменяемая часть (инструкции) измеряется рендером с пустыми разделами.
+    """
+    fixed_tokens = count_tokens(render({s.name: "" for s in sections}))
+    fitted = fit_sections(sections, budget - fixed_tokens)
+    return render(fitted)
@@ -1,26 +1,55 @@
+import uuid
 import logging
-from langchain_chroma import Chroma
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from app.core.config import CHROMA_DB_PATH, AI_MODEL, OPENROUTER_API_KEY
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from sqlalchemy import text
+from langchain_core.documents import Document
+from app.services.embeddings import get_embeddings
+from app.core.db import engine
+from app.core.config import CHROMA_DB_PATH
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)  
 
-llm = ChatOpenAI(
-    openai_api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
-    model_name=AI_MODEL,
-    temperature=0.5,
-    max_tokens=3000
-)
+# Ограничение ChromaDB на размер одной операции add
+CHROMA_ADD_BATCH = 1000
+# pg_advisory_lock(namespace, vk_group_id) на запись коллекции группы: импорт и перестройка при обслуживании
+# не должны перезаписывать коллекцию одновременно (38001–38003 заняты обновлением групп, контент-планом и обслуживанием)
+VECTORS_LOCK_NAMESPACE = 38004
+
+
+@contextmanager
+def group_vectors_lock(vk_group_id: int, wait: bool = True):
+    """
+    Блокировка записи векторов группы для всех воркеров и скриптов.
+    wait=False — не ждать: внутри блока получаем False, если коллекцию сейчас пишет кто-то другой.
+    """
+    params = {"namespace": VECTORS_LOCK_NAMESPACE, "vk_group_id": vk_group_id}
+    with engine.connect() as connection:
+        if wait:
+            connection.execute(text("SELECT pg_advisory_lock(:namespace, :vk_group_id)"), params)
+            locked = True
+        else:
+            locked = connection.execute(text("SELECT pg_try_advisory_lock(:namespace, :vk_group_id)"), params).scalar()
+        try:
+            yield locked
+        finally:
+            if locked:
+                connection.execute(text("SELECT pg_advisory_unlock(:namespace, :vk_group_id)"), params)
+
+
+def get_group_vectorstore(vk_group_id: int) -> "Chroma":
+    # chromadb загружается ~секунду, поэтому импортируем его только при первом обращении к векторам
+    from langchain_chroma import Chroma
 
-def get_group_vectorstore(vk_group_id: int) -> Chroma:
     collection_name = f"group_{vk_group_id}"
     vectorstore = Chroma(
         persist_directory=CHROMA_DB_PATH,
         collection_name=collection_name,
-        embedding_function=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        embedding_function=get_embeddings()
     )
     try:
         vectorstore.get()
@@ -29,3 +58,61 @@ def get_group_vectorstore(vk_group_id: int) -> Chroma:
         vectorstore.reset_collection()
     return vectorstore
 
+
+def build_group_documents(group, posts: list, products: list, services: list) -> list[Document]:
+    """
+    Готовит документы для поиска: отдельный документ на описание группы, каждый товар, услугу и пост.
+    В метаданных — тип, дата и вовлечённость, чтобы поиск мог фильтровать и ранжировать по ним
+    (ChromaDB принимает только str/int/float/bool, поэтому None не передаём).
+    """
+    vk_group_id = group.vk_group_id
+    documents = [Document(
+        page_content=f"Название группы: {group.name}\nОписание: {group.description}\nПодписчики: {group.subscribers_count}",
+        metadata={"type": "description", "vk_group_id": vk_group_id},
+    )]
+
+    for item_type, title, items in (("product", "Товар", products), ("service", "Услуга", services)):
+        for item in items:
+            description = f" — {item.description}" if item.description else ""
+            documents.append(Document(
+                page_content=f"{title}: {item.name}{description} (Цена: {item.price})",
+                metadata={
+                    "type": item_type,
+                    "vk_group_id": vk_group_id,
+                    "item_id": item.id,
+                    "name": item.name,
+                    "price": item.price or "",
+                },
+            ))
+
+    for post in posts:
+        likes, comments, reposts = post.likes or 0, post.comments or 0, post.reposts or 0
+        metadata = {
+            "type": "post",
+            "vk_group_id": vk_group_id,
+            "post_id": post.id,
+            "likes": likes,
+            "comments": comments,
+            "reposts": reposts,
+            "engagement": likes + comments + reposts,
+        }
+        if post.date:
+            metadata["date"] = post.date.isoformat()
+            metadata["timestamp"] = int(post.date.timestamp())
+        documents.append(Document(page_content=f"📝 {post.text}", metadata=metadata))
+
+    return documents
+
+
+def add_documents_with_vectors(vectorstore, documents: list[Document], vectors: list[list[float]]):
+    """
+    Добавляет документы с уже посчитанными эмбеддингами — при пакетной загрузке они считаются сразу для многих групп.
+    """
+    for start in range(0, len(documents), CHROMA_ADD_BATCH):
+        batch = documents[start:start + CHROMA_ADD_BATCH]
+        vectorstore._collection.add(
+            ids=[str(uuid.uuid4()) for _ in batch],
+            embeddings=vectors[start:start + CHROMA_ADD_BATCH],
+            documents=[doc.page_content for doc in batch],
+            metadatas=[doc.metadata for doc in batch],
+        )
@@ -0,0 +1,212 @@
+import math
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from app.core.db import SessionLocal, engine
+from app.models import Group, User, UserGroupAssociation
+from app.services.vk_service import get_community_data_by_id, save_group_data
+from app.services.vector_maintenance import maintenance_due, run_maintenance
+from app.core.config import (
+    ANALYTICS_UTC_OFFSET_HOURS,
+    REFRESH_CHECK_INTERVAL_MINUTES,
+    REFRESH_MIN_AGE_HOURS,
+    REFRESH_BATCH_SIZE,
+    REFRESH_MAX_CONCURRENCY,
+    REFRESH_WINDOW_START_HOUR,
+    REFRESH_WINDOW_END_HOUR,
+    REFRESH_ACTIVE_DAYS,
+    VECTOR_MAINTENANCE_INTERVAL_HOURS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Пространство ключей pg_advisory_lock(namespace, vk_group_id), чтобы не пересекаться с другими блокировками
+REFRESH_LOCK_NAMESPACE = 38001
+# Слоты pg_advisory_lock(namespace, 0..REFRESH_MAX_CONCURRENCY-1): общий лимит одновременных обновлений на все реплики
+REFRESH_SLOT_NAMESPACE = 38005
+ACTIVE_USER_WEIGHT = 2.0
+SIZE_WEIGHT = 0.5
+
+
+def in_refresh_window(now: datetime | None = None) -> bool:
+    """Окно низкой нагрузки [start, end) в местном времени; окно может переходить через полночь"""
+    local = (now or datetime.utcnow()) + timedelta(hours=ANALYTICS_UTC_OFFSET_HOURS)
+    start, end = REFRESH_WINDOW_START_HOUR, REFRESH_WINDOW_END_HOUR
+    if start == end:
+        return True
+    if start < end:
+        return start <= local.hour < end
+    return local.hour >= start or local.hour < end
+
+
+def refresh_priority(staleness_hours: float, active_users: int, subscribers: int) -> float:
+    """
+    Чем выше, тем раньше группа обновится:
+    устаревание в единицах REFRESH_MIN_AGE_HOURS + вес активных пользователей + логарифм размера группы.
+    """
+    return (
+        staleness_hours / REFRESH_MIN_AGE_HOURS
+        + ACTIVE_USER_WEIGHT * active_users
+        + SIZE_WEIGHT * math.log10(1 + max(subscribers, 0))
+    )
+
+
+def last_refreshed_at(db: Session, vk_group_id: int) -> datetime | None:
+    return db.query(func.max(UserGroupAssociation.last_uploaded_at)).filter(
+        UserGroupAssociation.vk_group_id == vk_group_id
+    ).scalar()
+
+
+def select_groups_to_refresh(db: Session, limit: int, now: datetime | None = None) -> list[int]:
+    """Реальные группы (vk_group_id > 0), не обновлявшиеся дольше REFRESH_MIN_AGE_HOURS, по убыванию приоритета"""
+    now = now or datetime.utcnow()
+    stale_before = now - timedelta(hours=REFRESH_MIN_AGE_HOURS)
+    active_since = now - timedelta(days=REFRESH_ACTIVE_DAYS)
+
+    last_upload = func.max(UserGroupAssociation.last_uploaded_at)
+    active_users = func.count(User.id).filter(User.last_active_at >= active_since)
+    rows = (
+        db.query(Group.vk_group_id, Group.subscribers_count, last_upload, active_users)
+        .join(UserGroupAssociation, UserGroupAssociation.vk_group_id == Group.vk_group_id)
+        .join(User, User.id == UserGroupAssociation.user_id)
+        .filter(Group.vk_group_id > 0)
+        .group_by(Group.vk_group_id, Group.subscribers_count)
+        .having((last_upload < stale_before) | (last_upload.is_(None)))
+        .all()
+    )
+
+    scored = []
+    for vk_group_id, subscribers, uploaded_at, active in rows:
+        uploaded_at = uploaded_at.replace(tzinfo=None) if uploaded_at else None
+        staleness = (now - uploaded_at).total_seconds() / 3600 if uploaded_at else REFRESH_MIN_AGE_HOURS * 10
+        scored.append((refresh_priority(staleness, active, subscribers or 0), vk_group_id))
+    scored.sort(reverse=True)
+    return [vk_group_id for _, vk_group_id in scored[:limit]]
+
+
+def _try_take_slot(connection) -> int | None:
+    """Занимает свободный слот общего лимита одновременных обновлений; None — все слоты заняты"""
+    for slot in range(REFRESH_MAX_CONCURRENCY):
+        params = {"namespace": REFRESH_SLOT_NAMESPACE, "slot": slot}
+        if connection.execute(text("SELECT pg_try_advisory_lock(:namespace, :slot)"), params).scalar():
+            return slot
+    return None
+
+
+def refresh_group(vk_group_id: int) -> str:
+    """
+    Обновляет группу из VK под pg_try_advisory_lock: если группу уже обновляет другая реплика, пропускаем.
+    Если все REFRESH_MAX_CONCURRENCY слотов заняты другими репликами, группа ждёт следующего прохода.
+    Возвращает "refreshed", "locked", "busy", "fresh" или "failed".
+    """
+    with engine.connect() as lock_connection:
+        params = {"namespace": REFRESH_LOCK_NAMESPACE, "vk_group_id": vk_group_id}
+        locked = lock_connection.execute(text("SELECT pg_try_advisory_lock(:namespace, :vk_group_id)"), params).scalar()
+        if not locked:
+            return "locked"
+        slot = _try_take_slot(lock_connection)
+        if slot is None:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:namespace, :vk_group_id)"), params)
+            return "busy"
+        try:
+            with SessionLocal() as db:
+                # Пока ждали очереди, группу могли обновить вручную или на другой реплике
+                uploaded_at = last_refreshed_at(db, vk_group_id)
+                stale_before = datetime.utcnow() - timedelta(hours=REFRESH_MIN_AGE_HOURS)
+                if uploaded_at and uploaded_at.replace(tzinfo=None) >= stale_before:
+                    return "fresh"
+
+                data = get_community_data_by_id(vk_group_id)
+                if not data:
+                    logger.error(f"❌ Не удалось получить данные группы {vk_group_id} из VK")
+                    return "failed"
+                save_group_data(db, None, data)
+                return "refreshed"
+        finally:
+            lock_connection.execute(
+                text("SELECT pg_advisory_unlock(:namespace, :slot)"), {"namespace": REFRESH_SLOT_NAMESPACE, "slot": slot}
+            )
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:namespace, :vk_group_id)"), params)
+
+
+class RefreshScheduler:
+    """
+    Периодически обновляет устаревшие группы в окне низкой нагрузки.
+    Запускается при старте приложения, если REFRESH_SCHEDULER_ENABLED=true.
+    """
+
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.semaphore = asyncio.Semaphore(REFRESH_MAX_CONCURRENCY)
+        self.counts = {"refreshed": 0, "locked": 0, "busy": 0, "fresh": 0, "failed": 0}
+        self.last_run_at: datetime | None = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._loop())
+            logger.info(
+                f"⏰ Фоновое обновление групп включено: окно {REFRESH_WINDOW_START_HOUR}:00–{REFRESH_WINDOW_END_HOUR}:00, "
+                f"не больше {REFRESH_MAX_CONCURRENCY} одновременно на все реплики"
+            )
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                if in_refresh_window():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления групп: {e}")
+            await asyncio.sleep(REFRESH_CHECK_INTERVAL_MINUTES * 60)
+
+    async def _refresh(self, vk_group_id: int):
+        async with self.semaphore:
+            # Окно могло закончиться, пока группа ждала своей очереди
+            if not in_refresh_window():
+                return
+            try:
+                result = await asyncio.to_thread(refresh_group, vk_group_id)
+            except Exception as e:
+                logger.error(f"Ошибка обновления группы {vk_group_id}: {e}")
+                result = "failed"
+            self.counts[result] += 1
+            logger.info(f"⏰ Фоновое обновление группы {vk_group_id}: {result}")
+
+    async def run_once(self):
+        self.last_run_at = datetime.utcnow()
+        group_ids = await asyncio.to_thread(self._select, REFRESH_BATCH_SIZE)
+        if group_ids:
+            logger.info(f"⏰ К обновлению {len(group_ids)} групп: {group_ids}")
+        await asyncio.gather(*(self._refresh(vk_group_id) for vk_group_id in group_ids))
+        # Обслуживание векторов — в том же окне низкой нагрузки, после обновления групп
+        if in_refresh_window() and maintenance_due(VECTOR_MAINTENANCE_INTERVAL_HOURS):
+            result = await asyncio.to_thread(run_maintenance)
+            logger.info(f"⏰ Обслуживание векторного хранилища: {result['status']}")
+
+    @staticmethod
+    def _select(limit: int) -> list[int]:
+        with SessionLocal() as db:
+            return select_groups_to_refresh(db, limit)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "in_window": in_refresh_window(),
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            **self.counts,
+        }
+
+
+refresh_scheduler = RefreshScheduler()
@@ -0,0 +1,104 @@
+import logging
+from langchain_core.documents import Document
+from app.services.rag import get_group_vectorstore
+from app.services.embeddings import get_embeddings
+from app.services.lexical_index import get_lexical_index, build_lexical_index
+from app.core.metrics import stage
+from app.core.tracing import set_attributes
+from app.core.config import RETRIEVAL_K, RETRIEVAL_CANDIDATES
+
+logger = logging.getLogger(__name__)
+
+# Константа сглаживания reciprocal rank fusion (стандартное значение из литературы)
+RRF_K = 60
+
+PREFERENCE_KEYS = {
+    "recent": "timestamp",
+    "engaging": "engagement",
+}
+
+
+def _ensure_lexical_index(vk_group_id: int, vectorstore):
+    index = get_lexical_index(vk_group_id)
+    if index is not None:
+        return index
+    # Группа импортирована до появления лексического индекса — строим его из ChromaDB
+    stored = vectorstore.get()
+    documents = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(stored["documents"], stored["metadatas"])
+        if text
+    ]
+    logger.info(f"📚 Строим лексический индекс для группы {vk_group_id} из {len(documents)} документов ChromaDB")
+    return build_lexical_index(vk_group_id, documents)
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int) -> list[Document]:
+    """
+    Объединяет несколько ранжированных списков: score(d) = Σ 1 / (RRF_K + rank).
+    Документы сопоставляются по тексту.
+    """
+    scores: dict[str, float] = {}
+    documents: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            documents.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ordered[:k]]
+
+
+def _preference_ranking(candidates: list[Document], prefer: str) -> list[Document]:
+    """Ранжирует кандидатов по свежести (prefer="recent") или вовлечённости (prefer="engaging")"""
+    key = PREFERENCE_KEYS[prefer]
+    ranked = [doc for doc in candidates if key in doc.metadata]
+    return sorted(ranked, key=lambda doc: doc.metadata[key], reverse=True)
+
+
+def hybrid_search(
+    vk_group_id: int,
+    query: str,
+    k: int = RETRIEVAL_K,
+    query_vector: list[float] | None = None,
+    doc_types: list[str] | None = None,
+    prefer: str | None = None,
+) -> list[Document]:
+    """
+    Ищет документы группы одновременно по BM25 (точные названия, цены) и по эмбеддингам (смысл),
+    объединяя результаты через reciprocal rank fusion.
+    query_vector — уже посчитанный эмбеддинг запроса, чтобы не считать его повторно.
+    doc_types — ограничить поиск типами документов (post, product, service, description).
+    prefer — "recent" или "engaging": дополнительно поднять свежие или популярные посты среди найденных.
+    Действует только при doc_types=["post"]: свежесть и вовлечённость есть лишь у постов, и в смешанной
+    выдаче лишний голос вытеснял бы точные совпадения по товарам и услугам.
+    """
+    vectorstore = get_group_vectorstore(vk_group_id)
+
+    try:
+        with stage("retrieval", "bm25", vk_group_id=vk_group_id):
+            index = _ensure_lexical_index(vk_group_id, vectorstore)
+            lexical = [doc for doc, _ in index.search(query, RETRIEVAL_CANDIDATES, doc_types=doc_types)]
+    except Exception as e:
+        logger.error(f"Ошибка лексического поиска для vk_group_id {vk_group_id}: {e}")
+        lexical = []
+
+    try:
+        if query_vector is None:
+            with stage("retrieval", "embed_query", vk_group_id=vk_group_id):
+                query_vector = get_embeddings().embed_query(query)
+        search_filter = {"type": {"$in": doc_types}} if doc_types else None
+        with stage("retrieval", "vector_search", vk_group_id=vk_group_id) as current:
+            semantic = vectorstore.similarity_search_by_vector(query_vector, k=RETRIEVAL_CANDIDATES, filter=search_filter)
+            set_attributes(current, results=len(semantic))
+    except Exception as e:
+        logger.error(f"Ошибка векторного поиска для vk_group_id {vk_group_id}: {e}")
+        semantic = []
+
+    rankings = [lexical, semantic]
+    if prefer and doc_types == ["post"]:
+        rankings.append(_preference_ranking(reciprocal_rank_fusion(rankings, RETRIEVAL_CANDIDATES), prefer))
+
+    docs = reciprocal_rank_fusion(rankings, k)
+    logger.info(f"Найдено документов: {len(docs)} (BM25: {len(lexical)}, векторы: {len(semantic)}) для запроса: {query}")
+    return docs
@@ -0,0 +1,123 @@
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.config import (
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES_PER_GROUP,
+    SEMANTIC_CACHE_MAX_GROUPS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _GroupEntries:
+    """Записи одной группы: векторы запросов (нормированные) и ответы в порядке LRU"""
+
+    def __init__(self, content_version: int):
+        self.content_version = content_version
+        self.entries: OrderedDict[int, tuple[np.ndarray, str, str]] = OrderedDict()
+        self._matrix: np.ndarray | None = None
+        self._keys: list[int] = []
+
+    def matrix(self) -> tuple[list[int], np.ndarray]:
+        # Матрица пересобирается только после изменения набора записей
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._matrix = np.stack([self.entries[k][0] for k in self._keys])
+        return self._keys, self._matrix
+
+    def invalidate_matrix(self):
+        self._matrix = None
+
+
+class SemanticCache:
+    """
+    In-memory кэш ответов на свободные запросы.
+    Запрос считается повтором, если косинусная близость его эмбеддинга к сохранённому
+    не ниже порога, а версия контента группы не изменилась.
+    """
+
+    def __init__(self, threshold: float, max_entries_per_group: int, max_groups: int):
+        self.threshold = threshold
+        self.max_entries_per_group = max_entries_per_group
+        self.max_groups = max_groups
+        self._groups: OrderedDict[int, _GroupEntries] = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _group(self, vk_group_id: int, content_version: int, create: bool) -> _GroupEntries | None:
+        group = self._groups.get(vk_group_id)
+        if group is not None and group.content_version != content_version:
+            # Группа переимпортирована — старые ответы больше не актуальны
+            del self._groups[vk_group_id]
+            group = None
+        if group is None and create:
+            group = _GroupEntries(content_version)
+            self._groups[vk_group_id] = group
+            if len(self._groups) > self.max_groups:
+                _, evicted = self._groups.popitem(last=False)
+                self.evictions += len(evicted.entries)
+        if group is not None:
+            self._groups.move_to_end(vk_group_id)
+        return group
+
+    def lookup(self, vk_group_id: int, content_version: int, vector) -> str | None:
+        query = self._normalize(vector)
+        with self._lock:
+            group = self._group(vk_group_id, content_version, create=False)
+            if group is None or not group.entries:
+                self.misses += 1
+                return None
+
+            keys, matrix = group.matrix()
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            group.entries.move_to_end(key)
+            self.hits += 1
+            _, cached_query, response = group.entries[key]
+            logger.info(f"⚡ Семантический кэш: «{cached_query}» ≈ запросу (близость {similarities[best]:.3f}, группа {vk_group_id})")
+            return response
+
+    def store(self, vk_group_id: int, content_version: int, vector, query: str, response: str):
+        with self._lock:
+            group = self._group(vk_group_id, content_version, create=True)
+            self._next_key += 1
+            group.entries[self._next_key] = (self._normalize(vector), query, response)
+            while len(group.entries) > self.max_entries_per_group:
+                group.entries.popitem(last=False)
+                self.evictions += 1
+            group.invalidate_matrix()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "groups": len(self._groups),
+                "entries": sum(len(g.entries) for g in self._groups.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries_per_group=SEMANTIC_CACHE_MAX_ENTRIES_PER_GROUP,
+    max_groups=SEMANTIC_CACHE_MAX_GROUPS,
+)
@@ -0,0 +1,405 @@
+"""
+Обслуживание каталога CHROMA_DB_PATH: отчёт о размере, удаление осиротевших данных и перестройка индексов.
+
+Каталог только растёт: коллекции удалённых групп (группа удаляется, когда от неё отвязался последний
+пользователь) остаются на диске вместе с лексическими индексами, а после сбоев остаются каталоги
+HNSW-сегментов, на которые уже не ссылается ни одна коллекция. Удаления внутри HNSW-индекса только
+помечают элементы, поэтому файлы индекса не уменьшаются.
+
+Отчёт читает chroma.sqlite3 в режиме только для чтения и не загружает индексы в память; схема —
+chromadb 0.6 (версия закреплена в requirements.txt). Удаление и перестройка идут через клиент chromadb.
+Перестройка переносит уже посчитанные эмбеддинги во временную коллекцию без обращения к модели
+и подменяет ею старую под той же блокировкой группы (rag.group_vectors_lock), что берёт импорт, —
+переимпорт во время перестройки не будет перезаписан старыми векторами.
+
+Всё работает на живом сервисе: чтение и запись ограничены VECTOR_MAINTENANCE_IO_MB_PER_SECOND,
+а запуски на разных воркерах и репликах не пересекаются благодаря pg_try_advisory_lock.
+"""
+import os
+import re
+import time
+import json
+import shutil
+import struct
+import sqlite3
+import logging
+from datetime import datetime
+from sqlalchemy import text
+from app.core.db import SessionLocal, engine
+from app.models import Group
+from app.services.rag import group_vectors_lock
+from app.core.config import (
+    CHROMA_DB_PATH,
+    VECTOR_MAINTENANCE_IO_MB_PER_SECOND,
+    VECTOR_REBUILD_DEAD_RATIO,
+    VECTOR_ORPHAN_GRACE_HOURS,
+)
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock(namespace, 0): одно обслуживание на все воркеры (38001 — обновление групп, 38002 — контент-план)
+MAINTENANCE_LOCK_NAMESPACE = 38003
+CHROMA_SQLITE_FILE = "chroma.sqlite3"
+LEXICAL_DIR = "lexical"
+STATE_FILE = "maintenance.json"
+COLLECTION_NAME = re.compile(r"^group_(-?\d+)$")
+LEXICAL_FILE = re.compile(r"^group_(-?\d+)\.json(\.tmp)?$")
+SEGMENT_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+# Заголовок hnswlib: offsetLevel0, max_elements, cur_element_count, size_data_per_element, label_offset, offsetData
+HNSW_HEADER = struct.Struct("<QQQQQQ")
+REBUILD_PAGE_SIZE = 1000
+REBUILD_SUFFIX = "__rebuild"
+
+
+class IOBudget:
+    """Ограничение скорости ввода-вывода: после каждой операции спим столько, чтобы средняя скорость не превышала лимит"""
+
+    def __init__(self, mb_per_second: float):
+        self.bytes_per_second = mb_per_second * 1024 * 1024
+        self.started = time.monotonic()
+        self.spent = 0
+
+    def spend(self, nbytes: int):
+        self.spent += nbytes
+        if self.bytes_per_second <= 0:
+            return
+        ahead = self.spent / self.bytes_per_second - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _hnsw_elements(segment_dir: str) -> int | None:
+    """Сколько элементов записано в HNSW-индекс, включая помеченные удалёнными; None — индекс ещё в памяти или другой формата"""
+    try:
+        with open(os.path.join(segment_dir, "header.bin"), "rb") as f:
+            return HNSW_HEADER.unpack(f.read(HNSW_HEADER.size))[2]
+    except (OSError, struct.error):
+        return None
+
+
+def _read_catalog() -> list[dict]:
+    """Коллекции с числом документов и ID векторного сегмента из chroma.sqlite3"""
+    path = os.path.join(CHROMA_DB_PATH, CHROMA_SQLITE_FILE)
+    if not os.path.exists(path):
+        return []
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        rows = connection.execute("""
+            SELECT c.name,
+                   (SELECT s.id FROM segments s WHERE s.collection = c.id AND s.scope = 'VECTOR'),
+                   (SELECT COUNT(*) FROM embeddings e JOIN segments s ON e.segment_id = s.id
+                     WHERE s.collection = c.id AND s.scope = 'METADATA')
+            FROM collections c
+        """).fetchall()
+    finally:
+        connection.close()
+    return [{"name": name, "segment_id": segment_id, "documents": count} for name, segment_id, count in rows]
+
+
+def _sqlite_stats() -> dict:
+    path = os.path.join(CHROMA_DB_PATH, CHROMA_SQLITE_FILE)
+    if not os.path.exists(path):
+        return {"bytes": 0, "free_bytes": 0}
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        connection.close()
+    return {"bytes": os.path.getsize(path), "free_bytes": page_size * free_pages}
+
+
+def _existing_group_ids(group_ids: set[int]) -> set[int]:
+    if not group_ids:
+        return set()
+    with SessionLocal() as db:
+        return {
+            vk_group_id for (vk_group_id,) in
+            db.query(Group.vk_group_id).filter(Group.vk_group_id.in_(group_ids))
+        }
+
+
+def _lexical_files() -> dict[str, int | None]:
+    """Файлы лексических индексов: имя -> ID группы"""
+    directory = os.path.join(CHROMA_DB_PATH, LEXICAL_DIR)
+    if not os.path.isdir(directory):
+        return {}
+    files = {}
+    for name in os.listdir(directory):
+        match = LEXICAL_FILE.match(name)
+        files[name] = int(match.group(1)) if match else None
+    return files
+
+
+def collect_report() -> dict:
+    """
+    Размер каталога по коллекциям: документы, байты HNSW-сегмента, доля мёртвых элементов индекса,
+    а также осиротевшие коллекции, сегменты и лексические индексы.
+    """
+    catalog = _read_catalog()
+    group_ids = {int(m.group(1)) for c in catalog if (m := COLLECTION_NAME.match(c["name"]))}
+    lexical = _lexical_files()
+    group_ids |= {vk_group_id for vk_group_id in lexical.values() if vk_group_id is not None}
+    existing = _existing_group_ids(group_ids)
+
+    collections = []
+    for entry in catalog:
+        match = COLLECTION_NAME.match(entry["name"])
+        vk_group_id = int(match.group(1)) if match else None
+        segment_dir = os.path.join(CHROMA_DB_PATH, entry["segment_id"]) if entry["segment_id"] else None
+        elements = _hnsw_elements(segment_dir) if segment_dir else None
+        dead_ratio = round(1 - entry["documents"] / elements, 3) if elements else 0.0
+        collections.append({
+            "name": entry["name"],
+            "vk_group_id": vk_group_id,
+            "documents": entry["documents"],
+            "bytes": _dir_size(segment_dir) if segment_dir and os.path.isdir(segment_dir) else 0,
+            "hnsw_elements": elements,
+            "dead_ratio": max(dead_ratio, 0.0),
+            "orphan": vk_group_id is not None and vk_group_id not in existing,
+        })
+
+    referenced = {entry["segment_id"] for entry in catalog if entry["segment_id"]}
+    orphan_segments = [
+        name for name in (os.listdir(CHROMA_DB_PATH) if os.path.isdir(CHROMA_DB_PATH) else [])
+        if SEGMENT_DIR.match(name) and name not in referenced and os.path.isdir(os.path.join(CHROMA_DB_PATH, name))
+    ]
+    orphan_lexical = [
+        name for name, vk_group_id in lexical.items()
+        if vk_group_id is not None and (vk_group_id not in existing or name.endswith(".tmp"))
+    ]
+
+    return {
+        "path": CHROMA_DB_PATH,
+        "total_bytes": _dir_size(CHROMA_DB_PATH) if os.path.isdir(CHROMA_DB_PATH) else 0,
+        "sqlite": _sqlite_stats(),
+        "lexical_bytes": _dir_size(os.path.join(CHROMA_DB_PATH, LEXICAL_DIR)),
+        "collections": sorted(collections, key=lambda c: -c["bytes"]),
+        "orphan_collections": [c["name"] for c in collections if c["orphan"]],
+        "leftover_rebuilds": [c["name"] for c in collections if c["name"].endswith(REBUILD_SUFFIX)],
+        "orphan_segments": orphan_segments,
+        "orphan_lexical": orphan_lexical,
+        "last_run": read_state(),
+    }
+
+
+def _older_than_grace(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) > VECTOR_ORPHAN_GRACE_HOURS * 3600
+    except OSError:
+        return False
+
+
+def _get_client():
+    # chromadb загружается ~секунду — как и в rag.py, импортируем при первом обращении
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_DB_PATH)
+
+
+def _page_bytes(page: dict) -> int:
+    return sum(len(e) * 4 for e in page["embeddings"]) + sum(len(d or "") for d in page["documents"])
+
+
+def rebuild_collection(client, name: str, vk_group_id: int, budget: IOBudget) -> int | None:
+    """
+    Переносит документы коллекции с готовыми эмбеддингами в новый HNSW-индекс без мёртвых элементов.
+    Копия строится постранично во временной коллекции, без блокировок и без буфера в памяти.
+    Подмена — под блокировкой записи векторов группы, которую берёт и импорт: если за время копирования
+    группу переимпортировали (коллекция пересоздана или изменилось число документов), копия выбрасывается.
+    Возвращает число перенесённых документов или None, если перестройка пропущена.
+    """
+    source = client.get_collection(name)
+    temporary_name = f"{name}{REBUILD_SUFFIX}"
+    _delete_if_exists(client, temporary_name)
+    temporary = client.create_collection(temporary_name, metadata=source.metadata)
+
+    copied = 0
+    while True:
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=REBUILD_PAGE_SIZE, offset=copied)
+        if not page["ids"]:
+            break
+        temporary.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"], metadatas=page["metadatas"])
+        copied += len(page["ids"])
+        # Чтение и запись — поэтому байты страницы считаются дважды
+        budget.spend(2 * _page_bytes(page))
+
+    with group_vectors_lock(vk_group_id, wait=False) as locked:
+        current = _get_if_exists(client, name)
+        if not locked or current is None or current.id != source.id or current.count() != copied:
+            logger.info(f"⏭ Перестройка {name} пропущена: коллекция изменилась во время копирования")
+            client.delete_collection(temporary_name)
+            return None
+        client.delete_collection(name)
+        try:
+            temporary.modify(name=name)
+        except Exception:
+            # Запрос чтения успел создать пустую коллекцию с тем же именем (get_group_vectorstore) — заменяем её
+            _delete_if_exists(client, name)
+            temporary.modify(name=name)
+    return copied
+
+
+def _get_if_exists(client, name: str):
+    try:
+        return client.get_collection(name)
+    except Exception:
+        return None
+
+
+def _delete_if_exists(client, name: str):
+    if _get_if_exists(client, name) is not None:
+        client.delete_collection(name)
+
+
+def delete_orphan_collection(client, name: str, vk_group_id: int) -> bool:
+    """Удаляет коллекцию, если группы всё ещё нет в базе: её могли импортировать заново после отчёта"""
+    with group_vectors_lock(vk_group_id, wait=False) as locked:
+        if not locked or _existing_group_ids({vk_group_id}):
+            return False
+        client.delete_collection(name)
+        return True
+
+
+def _vacuum_sqlite():
+    connection = sqlite3.connect(os.path.join(CHROMA_DB_PATH, CHROMA_SQLITE_FILE), timeout=60)
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+
+def run_maintenance(gc: bool = True, rebuild: bool = True, vacuum: bool = False, dry_run: bool = False) -> dict:
+    """
+    gc — удалить коллекции, сегменты и лексические индексы групп, которых нет в PostgreSQL;
+    rebuild — перестроить коллекции с долей мёртвых элементов не меньше VECTOR_REBUILD_DEAD_RATIO;
+    vacuum — сжать chroma.sqlite3 (VACUUM переписывает файл целиком и на это время блокирует запись).
+    dry_run — только показать, что было бы сделано.
+    Возвращает {"status": "locked"}, если обслуживание уже идёт на другом воркере.
+    """
+    with engine.connect() as lock_connection:
+        params = {"namespace": MAINTENANCE_LOCK_NAMESPACE, "key": 0}
+        if not lock_connection.execute(text("SELECT pg_try_advisory_lock(:namespace, :key)"), params).scalar():
+            return {"status": "locked"}
+        try:
+            return _run(gc, rebuild, vacuum, dry_run)
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:namespace, :key)"), params)
+
+
+def _run(gc: bool, rebuild: bool, vacuum: bool, dry_run: bool) -> dict:
+    started = time.perf_counter()
+    budget = IOBudget(VECTOR_MAINTENANCE_IO_MB_PER_SECOND)
+    report = collect_report()
+    actions = {"deleted_collections": [], "deleted_segments": [], "deleted_lexical": [], "rebuilt": [], "errors": []}
+    client = None if dry_run else _get_client()
+
+    if gc:
+        for name in report["orphan_collections"]:
+            if dry_run:
+                actions["deleted_collections"].append(name)
+                continue
+            try:
+                if delete_orphan_collection(client, name, int(COLLECTION_NAME.match(name).group(1))):
+                    actions["deleted_collections"].append(name)
+            except Exception as e:
+                actions["errors"].append(f"{name}: {e}")
+        # Временные коллекции прерванных перестроек: пока держим блокировку обслуживания, их никто не пишет
+        for name in report["leftover_rebuilds"]:
+            actions["deleted_collections"].append(name)
+            if not dry_run:
+                _delete_if_exists(client, name)
+        lexical_dir = os.path.join(CHROMA_DB_PATH, LEXICAL_DIR)
+        for name in report["orphan_lexical"]:
+            path = os.path.join(lexical_dir, name)
+            if not _older_than_grace(path):
+                continue
+            actions["deleted_lexical"].append(name)
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        for name in report["orphan_segments"]:
+            path = os.path.join(CHROMA_DB_PATH, name)
+            if not _older_than_grace(path):
+                continue
+            actions["deleted_segments"].append(name)
+            if not dry_run:
+                shutil.rmtree(path, ignore_errors=True)
+
+    if rebuild:
+        orphans = set(report["orphan_collections"])
+        for collection in report["collections"]:
+            if collection["name"] in orphans or collection["dead_ratio"] < VECTOR_REBUILD_DEAD_RATIO:
+                continue
+            if collection["vk_group_id"] is None:
+                continue
+            if dry_run:
+                actions["rebuilt"].append(collection["name"])
+                continue
+            try:
+                if rebuild_collection(client, collection["name"], collection["vk_group_id"], budget) is not None:
+                    actions["rebuilt"].append(collection["name"])
+            except Exception as e:
+                actions["errors"].append(f"{collection['name']}: {e}")
+
+    if vacuum and not dry_run:
+        free_bytes = report["sqlite"]["free_bytes"]
+        _vacuum_sqlite()
+        budget.spend(report["sqlite"]["bytes"] - free_bytes)
+        actions["vacuumed_bytes"] = free_bytes
+
+    result = {
+        "status": "dry_run" if dry_run else "done",
+        "finished_at": datetime.utcnow().isoformat(),
+        "seconds": round(time.perf_counter() - started, 1),
+        "bytes_before": report["total_bytes"],
+        "bytes_after": report["total_bytes"] if dry_run else _dir_size(CHROMA_DB_PATH),
+        **actions,
+    }
+    if not dry_run:
+        write_state(result)
+    logger.info(
+        f"🧹 Обслуживание векторов: удалено коллекций {len(actions['deleted_collections'])}, "
+        f"сегментов {len(actions['deleted_segments'])}, лексических индексов {len(actions['deleted_lexical'])}, "
+        f"перестроено {len(actions['rebuilt'])}; {result['bytes_before']} → {result['bytes_after']} байт"
+    )
+    return result
+
+
+def read_state() -> dict | None:
+    try:
+        with open(os.path.join(CHROMA_DB_PATH, STATE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_state(result: dict):
+    """Итог последнего запуска хранится рядом с данными — его видят все воркеры этой машины"""
+    path = os.path.join(CHROMA_DB_PATH, STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def maintenance_due(interval_hours: float) -> bool:
+    if interval_hours <= 0:
+        return False
+    state = read_state()
+    if not state or not state.get("finished_at"):
+        return True
+    finished_at = datetime.fromisoformat(state["finished_at"])
+    return (datetime.utcnow() - finished_at).total_seconds() >= interval_hours * 3600
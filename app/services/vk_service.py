@@ -1,29 +1,101 @@
 import re
+import time
 import requests
 import logging
 from datetime import datetime, timezone
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from langchain_core.documents import Document
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
+from app.core.db import engine
 from app.models import Group, Post, Product, Service, UserGroupAssociation
-from app.services.rag import get_group_vectorstore
-from app.core.config import ACCESS_TOKEN, API_VERSION
+from app.services.rag import get_group_vectorstore, build_group_documents, add_documents_with_vectors, group_vectors_lock
+from app.services.embeddings import get_embeddings
+from app.services.lexical_index import build_lexical_index
+from app.services.group_profile import refresh_group_profile
+from app.services.generation_cache import bump_content_version
+from app.services.pregeneration import pregenerator
+from app.services.content_versions import content_versions
+from app.core.metrics import stage
+from app.core.tracing import span, set_attributes
+from app.core.config import ACCESS_TOKEN, API_VERSION, VK_API_RATE_PER_SECOND, VK_API_URL, VK_WEB_URL
 
 logger = logging.getLogger(__name__)
 
 
-def save_group_data(db: Session, user_id: int, data: dict):
+class SharedRateLimiter:
+    """
+    Не больше rate запросов в секунду на все процессы и реплики: состояние лимита — строка rate_limits в PostgreSQL.
+    acquire() одним UPSERT резервирует ближайший свободный момент (next_at сдвигается на 1/rate)
+    и спит до него, поэтому очередь справедлива и не требует блокировок.
+    """
+
+    def __init__(self, name: str, rate: float):
+        self.name = name
+        self.rate = rate
+
+    def acquire(self):
+        with engine.begin() as connection:
+            wait = connection.execute(text("""
+                INSERT INTO rate_limits (name, next_at) VALUES (:name, clock_timestamp() + make_interval(secs => :step))
+                ON CONFLICT (name) DO UPDATE
+                    SET next_at = GREATEST(rate_limits.next_at, clock_timestamp()) + make_interval(secs => :step)
+                RETURNING EXTRACT(EPOCH FROM rate_limits.next_at - clock_timestamp()) - :step
+            """), {"name": self.name, "step": 1 / self.rate}).scalar()
+        if wait > 0:
+            time.sleep(float(wait))
+
+
+# groups.getById принимает до 500 идентификаторов за запрос
+VK_GETBYID_BATCH = 500
+
+# Все обращения к VK API (ручные и фоновые, со всех воркеров и реплик) делят один бюджет токена
+vk_rate_limiter = SharedRateLimiter("vk_api", VK_API_RATE_PER_SECOND)
+
+
+def vk_api_get(url: str, params: dict) -> dict:
+    """GET к VK API с общим лимитом запросов и спаном трассировки"""
+    with span("vk.api", **{"vk.method": url.rsplit("/", 1)[-1]}) as current:
+        vk_rate_limiter.acquire()
+        response = requests.get(url, params=params).json()
+        if "error" in response:
+            set_attributes(current, **{"vk.error": response["error"].get("error_msg")})
+        return response
+
+
+def save_group_data(db: Session, user_id: int | None, data: dict):
+    """
+    Сохраняет данные сообщества в PostgreSQL, ChromaDB и лексический индекс.
+    user_id=None — фоновое обновление: время загрузки обновляется у всех пользователей группы.
+    """
     vk_group_id = data["community"].get("id")
     if not vk_group_id:
         logger.error("❌ Не найден vk_group_id в данных сообщества!")
         return {"status": "error", "message": "Ошибка: отсутствует vk_group_id"}
 
+    with stage("import", "postgres", vk_group_id=vk_group_id):
+        group, last_uploaded_at = persist_group_data(db, user_id, data)
+    index_group_data(db, group)
+    # Пользователь, скорее всего, сразу нажмёт "Придумай сам" — готовим ответ заранее (фоновые обновления пропускаем)
+    if user_id is not None:
+        pregenerator.schedule(vk_group_id, user_id)
+
+    return {
+        "status": "success",
+        "message": "✅ Данные обновлены и сохранены",
+        "group": {
+            "vk_group_id": vk_group_id,
+            "name": group.name,
+            "description": group.description,
+            "category": group.category,
+            "subscribers_count": group.subscribers_count,
+            "last_uploaded_at": last_uploaded_at.isoformat()
+        }
+    }
+
+
+def persist_group_data(db: Session, user_id: int | None, data: dict) -> tuple[Group, datetime]:
+    """Записывает группу, связь с пользователем, посты, товары и услуги в PostgreSQL"""
+    vk_group_id = data["community"]["id"]
     last_uploaded_at = datetime.now(timezone.utc)
 
     # 🔁 Обновление или создание группы
@@ -42,17 +114,22 @@ def save_group_data(db: Session, user_id: int, data: dict):
     db.refresh(group)
 
     # 🔁 Обновление связи пользователя и группы
-    association = db.query(UserGroupAssociation).filter(
-        UserGroupAssociation.user_id == user_id,
-        UserGroupAssociation.vk_group_id == vk_group_id
-    ).first()
-    if not association:
-        association = UserGroupAssociation(user_id=user_id, vk_group_id=vk_group_id)
-        db.add(association)
-    association.last_uploaded_at = last_uploaded_at
+    if user_id is None:
+        db.query(UserGroupAssociation).filter(
+            UserGroupAssociation.vk_group_id == vk_group_id
+        ).update({UserGroupAssociation.last_uploaded_at: last_uploaded_at})
+    else:
+        association = db.query(UserGroupAssociation).filter(
+            UserGroupAssociation.user_id == user_id,
+            UserGroupAssociation.vk_group_id == vk_group_id
+        ).first()
+        if not association:
+            association = UserGroupAssociation(user_id=user_id, vk_group_id=vk_group_id)
+            db.add(association)
+        association.last_uploaded_at = last_uploaded_at
     db.commit()
 
-    # ❌ Удаляем старые посты/товары/услуги
+    # ❌ Удаляем старые посты/товары/услуги (кэш ответов сбрасывается в конце index_group_data)
     db.query(Post).filter(Post.group_id == vk_group_id).delete()
     db.query(Product).filter(Product.group_id == vk_group_id).delete()
     db.query(Service).filter(Service.group_id == vk_group_id).delete()
@@ -63,6 +140,7 @@ def save_group_data(db: Session, user_id: int, data: dict):
         db.add(Post(
             group_id=vk_group_id,
             text=post["text"].strip(),
+            date=datetime.fromisoformat(post["date"]) if post.get("date") else datetime.utcnow(),
             likes=post.get("likes", 0),
             comments=post.get("comments", 0),
             reposts=post.get("reposts", 0)
@@ -87,51 +165,48 @@ def save_group_data(db: Session, user_id: int, data: dict):
         ))
 
     db.commit()
+    # Данные в PostgreSQL уже закоммичены — списки групп и аналитику можно отдавать заново.
+    # Здесь, а не в save_group_data: пакетный импорт вызывает persist_group_data напрямую
+    content_versions.changed(user_ids=[user_id] if user_id is not None else [], group_ids=[vk_group_id])
+    return group, last_uploaded_at
 
-    # 🧠 Обновляем ChromaDB
-    logger.info("🧠 Обновляем коллекцию ChromaDB для группы...")
-    vectorstore = get_group_vectorstore(vk_group_id)
-    vectorstore.reset_collection()
+
+def index_group_data(db: Session, group: Group):
+    """
+    Пересчитывает профиль группы, перестраивает ChromaDB и лексический индекс,
+    затем сбрасывает закэшированные ответы и увеличивает content_version.
+    """
+    vk_group_id = group.vk_group_id
+
+    # 🧬 Пересчитываем профиль группы для генерации
+    with stage("import", "profile", vk_group_id=vk_group_id):
+        refresh_group_profile(db, vk_group_id)
 
     # 📄 Собираем документы
-    posts = db.query(Post).filter(Post.group_id == vk_group_id).all()
-    products = db.query(Product).filter(Product.group_id == vk_group_id).all()
-    services = db.query(Service).filter(Service.group_id == vk_group_id).all()
-
-    doc_description = f"Название группы: {group.name}\nОписание: {group.description}\nПодписчики: {group.subscribers_count}"
-    doc_products = "Товары:\n" + "\n".join([f"{p.name} - {p.description} (Цена: {p.price})" for p in products]) if products else "Нет товаров."
-    doc_services = "Услуги:\n" + "\n".join([f"{s.name} - {s.description} (Цена: {s.price})" for s in services]) if services else "Нет услуг."
-    post_docs = [
-    Document(
-        page_content=f"📝 {p.text}",
-        metadata={"type": "post", "vk_group_id": vk_group_id}
-    )
-    for p in posts[-15:]
-    ]
-    
-    documents = [
-    Document(page_content=doc_description, metadata={"type": "description", "vk_group_id": vk_group_id}),
-    Document(page_content=doc_products, metadata={"type": "products", "vk_group_id": vk_group_id}),
-    Document(page_content=doc_services, metadata={"type": "services", "vk_group_id": vk_group_id}),
-    ] + post_docs
+    with stage("import", "documents", vk_group_id=vk_group_id):
+        posts = db.query(Post).filter(Post.group_id == vk_group_id).all()
+        products = db.query(Product).filter(Product.group_id == vk_group_id).all()
+        services = db.query(Service).filter(Service.group_id == vk_group_id).all()
+        documents = build_group_documents(group, posts, products, services)
 
+    # Эмбеддинги считаем отдельно от записи в ChromaDB, чтобы время модели и хранилища было видно раздельно
+    with stage("import", "embedding", vk_group_id=vk_group_id):
+        vectors = get_embeddings().embed_documents([doc.page_content for doc in documents])
 
-    vectorstore.add_documents(documents)
+    # 🧠 Обновляем ChromaDB
+    logger.info("🧠 Обновляем коллекцию ChromaDB для группы...")
+    with stage("import", "chroma", vk_group_id=vk_group_id), group_vectors_lock(vk_group_id):
+        vectorstore = get_group_vectorstore(vk_group_id)
+        vectorstore.reset_collection()
+        add_documents_with_vectors(vectorstore, documents, vectors)
 
-    logger.info(f"✅ Данные о группе {vk_group_id} сохранены в PostgreSQL и ChromaDB.")
+    with stage("import", "lexical_index", vk_group_id=vk_group_id):
+        build_lexical_index(vk_group_id, documents)
 
-    return {
-        "status": "success",
-        "message": "✅ Данные обновлены и сохранены",
-        "group": {
-            "vk_group_id": vk_group_id,
-            "name": group.name,
-            "description": group.description,
-            "category": group.category,
-            "subscribers_count": group.subscribers_count,
-            "last_uploaded_at": last_uploaded_at.isoformat()
-        }
-    }
+    # Только теперь новая версия: ответы, посчитанные во время перестройки, остались под старой
+    bump_content_version(db, [vk_group_id])
+
+    logger.info(f"✅ Данные о группе {vk_group_id} сохранены в PostgreSQL и ChromaDB.")
 
 
 
@@ -142,47 +217,67 @@ def get_community_data(community_link: str) -> dict:
     return get_community_data_by_id(community_id)
 
 
-def get_community_data_by_id(community_id: int) -> dict:
+def get_community_data_by_id(community_id: int, community_info: dict | None = None) -> dict:
     """
     Получает данные о сообществе ВКонтакте, используя его ID.
+    community_info — уже полученные через get_communities_info сведения, чтобы не запрашивать их повторно.
     """
-    community_info = get_community_info(community_id)
+    if not community_info:
+        with stage("fetch", "vk_info", vk_group_id=int(community_id)):
+            community_info = get_community_info(community_id)
     if not community_info:
         return None  # Если сообщество не найдено, ничего не возвращаем
 
+    with stage("fetch", "vk_posts", vk_group_id=int(community_id)):
+        posts = get_community_posts(community_id)
+    with stage("fetch", "selenium_products", vk_group_id=int(community_id)):
+        products = parse_market_with_selenium(community_id)
+    with stage("fetch", "selenium_services", vk_group_id=int(community_id)):
+        services = parse_services_with_selenium(community_id)
+
     return {
         'community': community_info,
-        'posts': get_community_posts(community_id),
-        'products': parse_market_with_selenium(community_id),
-        'services': parse_services_with_selenium(community_id)
+        'posts': posts,
+        'products': products,
+        'services': services
     }
 
 
 def get_driver():
+    # selenium и webdriver_manager нужны только при парсинге товаров и услуг
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from webdriver_manager.chrome import ChromeDriverManager
+
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')  # Без UI
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument("--disable-blink-features=AutomationControlled")
-    service = Service(ChromeDriverManager().install())
+    service = ChromeService(ChromeDriverManager().install())
     return webdriver.Chrome(service=service, options=options)
 
 
-def get_community_id_from_link(community_link: str) -> str:
+def parse_screen_name(community_link: str) -> str | None:
+    """vk.com/club123 -> club123, vk.com/shop_name -> shop_name"""
     match = re.search(r"vk\.com/([\w\d_.-]+)", community_link)
-    if not match:
+    return match.group(1) if match else None
+
+
+def get_community_id_from_link(community_link: str) -> str:
+    screen_name = parse_screen_name(community_link)
+    if not screen_name:
         print("Ошибка: Некорректная ссылка.")
         return None
-    screen_name = match.group(1)
     if screen_name.isdigit():
         return screen_name
-    url = "https://api.vk.com/method/utils.resolveScreenName"
+    url = f"{VK_API_URL}/utils.resolveScreenName"
     params = {
         "access_token": ACCESS_TOKEN,
         "v": API_VERSION,
         "screen_name": screen_name
     }
-    response = requests.get(url, params=params).json()
+    response = vk_api_get(url, params)
     if "error" in response:
         print(f"Ошибка VK API: {response['error']['error_msg']}")
         return None
@@ -193,14 +288,14 @@ def get_community_id_from_link(community_link: str) -> str:
 
 
 def get_community_info(community_id: str) -> dict:
-    url = 'https://api.vk.com/method/groups.getById'
+    url = f'{VK_API_URL}/groups.getById'
     params = {
         'access_token': ACCESS_TOKEN,
         'v': API_VERSION,
         'group_id': community_id,
         'fields': 'description,members_count'
     }
-    response = requests.get(url, params=params).json()
+    response = vk_api_get(url, params)
     if 'error' in response:
         print(f"Ошибка при получении информации о сообществе: {response['error']['error_msg']}")
         return None
@@ -213,15 +308,58 @@ def get_community_info(community_id: str) -> dict:
     }
     
     
+def get_communities_info(screen_names: list[str]) -> dict[str, dict]:
+    """
+    Сведения о нескольких сообществах пачками по VK_GETBYID_BATCH за один запрос groups.getById.
+    Принимает короткие имена, clubN/publicN или числовые ID; возвращает {screen_name: info} только для найденных.
+    """
+    url = f'{VK_API_URL}/groups.getById'
+    found = {}
+    for start in range(0, len(screen_names), VK_GETBYID_BATCH):
+        batch = screen_names[start:start + VK_GETBYID_BATCH]
+        params = {
+            'access_token': ACCESS_TOKEN,
+            'v': API_VERSION,
+            'group_ids': ','.join(batch),
+            'fields': 'description,members_count'
+        }
+        response = vk_api_get(url, params)
+        if 'error' in response:
+            logger.error(f"Ошибка VK API при получении сообществ: {response['error']['error_msg']}")
+            continue
+        groups = response['response']
+        # В новых версиях API группы вложены в {"groups": [...], "profiles": [...]}
+        if isinstance(groups, dict):
+            groups = groups.get('groups', [])
+
+        by_key = {}
+        for community in groups:
+            info = {
+                'id': community['id'],
+                'name': community['name'],
+                'description': community.get('description', ''),
+                'subscribers_count': community.get('members_count', 0)
+            }
+            by_key[str(community['id'])] = info
+            by_key[community.get('screen_name', '').lower()] = info
+        for screen_name in batch:
+            key = screen_name.lower()
+            numeric = re.fullmatch(r"(?:club|public|event)?(\d+)", key)
+            info = by_key.get(key) or (by_key.get(numeric.group(1)) if numeric else None)
+            if info:
+                found[screen_name] = info
+    return found
+
+
 def get_community_posts(community_id: str) -> list:
-    url = 'https://api.vk.com/method/wall.get'
+    url = f'{VK_API_URL}/wall.get'
     params = {
         'access_token': ACCESS_TOKEN,
         'v': API_VERSION,
         'owner_id': f'-{community_id}',
         'count': 15  #  Берем всегда последние 15 постов
     }
-    response = requests.get(url, params=params).json()
+    response = vk_api_get(url, params)
 
     if 'error' in response:
         print(f"Ошибка при получении постов: {response['error']['error_msg']}")
@@ -266,10 +404,15 @@ def get_community_posts(community_id: str) -> list:
 
 
 def parse_market_with_selenium(group_id: str) -> list:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     driver = get_driver()
     try:
-        community_url = f'https://vk.com/market-{group_id}?screen=group'
-        driver.get(community_url)
+        community_url = f'{VK_WEB_URL}/market-{group_id}?screen=group'
+        with span("selenium.page_load", url=community_url):
+            driver.get(community_url)
 
         try:
             WebDriverWait(driver, 5).until(
@@ -284,7 +427,8 @@ def parse_market_with_selenium(group_id: str) -> list:
                  for item in driver.find_elements(By.CLASS_NAME, "market_row")]
 
         for link in links[:15]:
-            driver.get(link)
+            with span("selenium.page_load", url=link):
+                driver.get(link)
             try:
                 WebDriverWait(driver, 5).until(
                     EC.presence_of_element_located((By.XPATH, '//*[@data-testid="market_item_page_title"]'))
@@ -306,10 +450,15 @@ def parse_market_with_selenium(group_id: str) -> list:
 
 
 def parse_services_with_selenium(group_id: str) -> list:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     driver = get_driver()
     try:
-        community_url = f'https://vk.com/uslugi-{group_id}?screen=group'
-        driver.get(community_url)
+        community_url = f'{VK_WEB_URL}/uslugi-{group_id}?screen=group'
+        with span("selenium.page_load", url=community_url):
+            driver.get(community_url)
 
         try:
             WebDriverWait(driver, 5).until(
@@ -324,7 +473,8 @@ def parse_services_with_selenium(group_id: str) -> list:
                  for item in driver.find_elements(By.CLASS_NAME, "market_row")]
 
         for link in links[:15]:
-            driver.get(link)
+            with span("selenium.page_load", url=link):
+                driver.get(link)
             try:
                 WebDriverWait(driver, 5).until(
                     EC.presence_of_element_located((By.XPATH, '//*[@data-testid="market_item_page_title"]'))
@@ -0,0 +1,114 @@
+"""
+Сравнение двух прогонов benchmarks.run для поиска регрессий.
+
+    python -m benchmarks.compare baseline.json results.json --threshold 10
+
+Сравниваются метрики с понятным направлением:
+    *_ms, *_seconds    — чем меньше, тем лучше
+    *_per_second      — чем больше, тем лучше
+Остальные числа (размеры, параметры) выводятся только для справки.
+Код выхода 1, если хотя бы одна метрика ухудшилась больше чем на --threshold процентов
+или сценарий, прошедший в базовом прогоне, завершился ошибкой.
+"""
+import sys
+import json
+import argparse
+
+# Время прогрева зависит от дискового кэша, а не от кода
+IGNORED = {"warmup_seconds"}
+
+
+def flatten(value, prefix: str = "") -> dict:
+    """{"save": {"size_10": {"median_ms": 1}}} -> {"save.size_10.median_ms": 1}"""
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    return {prefix: value}
+
+
+def direction(metric: str) -> int | None:
+    """+1 — больше значит хуже, -1 — меньше значит хуже, None — метрика не сравнивается"""
+    name = metric.rsplit(".", 1)[-1]
+    if name in IGNORED:
+        return None
+    if name.endswith("_per_second"):
+        return -1
+    if name.endswith(("_ms", "_seconds")):
+        return 1
+    return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> tuple[list[dict], list[str]]:
+    """Возвращает строки сравнения и список проблем (регрессии и упавшие сценарии)"""
+    rows, problems = [], []
+    for name, scenario in current["scenarios"].items():
+        base_scenario = baseline["scenarios"].get(name)
+        if "error" in scenario:
+            if base_scenario and "error" not in base_scenario:
+                problems.append(f"{name}: сценарий упал ({scenario['error']})")
+            continue
+        if not base_scenario or "error" in base_scenario:
+            continue
+
+        base_flat = flatten(base_scenario, name)
+        for metric, value in flatten(scenario, name).items():
+            sign = direction(metric)
+            base_value = base_flat.get(metric)
+            if sign is None or not isinstance(value, (int, float)) or not isinstance(base_value, (int, float)):
+                continue
+            if base_value == 0:
+                continue
+            change = (value - base_value) / abs(base_value) * 100
+            regression = change * sign > threshold
+            rows.append({
+                "metric": metric,
+                "baseline": base_value,
+                "current": value,
+                "change_percent": round(change, 1),
+                "regression": regression,
+            })
+            if regression:
+                problems.append(f"{metric}: {base_value} -> {value} ({change:+.1f}%)")
+    return rows, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарков")
+    parser.add_argument("baseline", help="JSON базового прогона")
+    parser.add_argument("current", help="JSON нового прогона")
+    parser.add_argument("--threshold", type=float, default=10, help="Допустимое ухудшение, %%")
+    parser.add_argument("--output", help="Сохранить сравнение в JSON")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    print(f"База: {baseline['meta'].get('commit')} — новый прогон: {current['meta'].get('commit')}")
+    if baseline["meta"].get("params") != current["meta"].get("params"):
+        print("⚠️ Параметры прогонов различаются, сравнение может быть некорректным")
+
+    rows, problems = compare(baseline, current, args.threshold)
+    width = max((len(row["metric"]) for row in rows), default=10)
+    for row in rows:
+        mark = "❌" if row["regression"] else "  "
+        print(f"{mark} {row['metric']:<{width}} {row['baseline']:>12} -> {row['current']:>12} {row['change_percent']:+7.1f}%")
+
+    if problems:
+        print(f"\nРегрессии (порог {args.threshold}%):")
+        for problem in problems:
+            print(f"  {problem}")
+    else:
+        print(f"\n✅ Регрессий больше {args.threshold}% нет")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "problems": problems}, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Сравнение бэкендов эмбеддингов: совпадение векторов, скорость и память.
+
+    python -m benchmarks.embeddings --backends huggingface onnx --min-cosine 0.98
+
+Каждый бэкенд запускается в отдельном процессе, чтобы время загрузки и RSS не смешивались.
+Проверка паритета: косинусная близость векторов ONNX и эталонной torch-модели для каждого текста
+должна быть не ниже --min-cosine, иначе скрипт завершается с кодом 1.
+"""
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+import numpy as np
+
+PARITY_TEXTS = [
+    "Скидка 20% на все кружки до конца недели!",
+    "Кружка керамическая, 350 мл — 450 ₽",
+    "Запишитесь на мастер-класс по гончарному делу в субботу",
+    "Доставка по городу бесплатно при заказе от 2000 рублей",
+    "Привет! Что ты умеешь?",
+    "Напиши пост про новогодние подарки для коллег",
+    "#скидки #подарки #ручнаяработа",
+    "Мы открылись! Ждём вас по адресу ул. Ленина, 10, с 10:00 до 20:00 каждый день.",
+    "Handmade ceramic mugs, free shipping worldwide",
+    "",
+]
+
+
+def read_memory_mb() -> dict:
+    """Текущий и пиковый RSS процесса из /proc (Linux)"""
+    values = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":")
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return {"rss_mb": values.get("VmRSS"), "peak_rss_mb": values.get("VmHWM")}
+
+
+def run_backend(backend: str, corpus_size: int, queue: multiprocessing.Queue):
+    try:
+        baseline = read_memory_mb()
+        started = time.perf_counter()
+        from app.services.embeddings import create_embeddings
+        embeddings = create_embeddings(backend)
+        embeddings.embed_query("прогрев")
+        load_seconds = time.perf_counter() - started
+        loaded = read_memory_mb()
+
+        parity = embeddings.embed_documents(PARITY_TEXTS)
+
+        corpus = [PARITY_TEXTS[i % (len(PARITY_TEXTS) - 1)] + f" {i}" for i in range(corpus_size)]
+        started = time.perf_counter()
+        embeddings.embed_documents(corpus)
+        batch_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for text in corpus[:50]:
+            embeddings.embed_query(text)
+        query_seconds = (time.perf_counter() - started) / min(50, corpus_size)
+
+        queue.put({
+            "backend": backend,
+            "load_seconds": round(load_seconds, 2),
+            "documents_per_second": round(corpus_size / batch_seconds, 1),
+            "query_latency_ms": round(query_seconds * 1000, 2),
+            "rss_before_mb": baseline["rss_mb"],
+            "rss_loaded_mb": loaded["rss_mb"],
+            "peak_rss_mb": read_memory_mb()["peak_rss_mb"],
+            "vectors": parity,
+        })
+    except Exception as e:
+        queue.put({"backend": backend, "error": repr(e)})
+
+
+def measure(backend: str, corpus_size: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_backend, args=(backend, corpus_size, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def cosine_agreement(reference: list, candidate: list) -> list[float]:
+    a = np.asarray(reference, dtype=np.float64)
+    b = np.asarray(candidate, dtype=np.float64)
+    a /= np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b /= np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Паритет и производительность бэкендов эмбеддингов")
+    parser.add_argument("--backends", nargs="+", default=["huggingface", "onnx"])
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = [measure(backend, args.corpus_size) for backend in args.backends]
+    report = {"results": [], "parity": {}}
+    failed = False
+
+    for result in results:
+        if "error" in result:
+            print(f"❌ {result['backend']}: {result['error']}")
+            failed = True
+        report["results"].append({k: v for k, v in result.items() if k != "vectors"})
+
+    reference = results[0]
+    for result in results[1:]:
+        if "vectors" not in reference or "vectors" not in result:
+            continue
+        agreement = cosine_agreement(reference["vectors"], result["vectors"])
+        report["parity"][f"{reference['backend']}~{result['backend']}"] = {
+            "min_cosine": round(min(agreement), 5),
+            "mean_cosine": round(float(np.mean(agreement)), 5),
+        }
+        if min(agreement) < args.min_cosine:
+            failed = True
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Воспроизводимые бенчмарки без сети: VK API, страницы каталога и LLM подменяются локальными заглушками
+(benchmarks/stubs.py), ChromaDB пишется во временный каталог. Нужен только PostgreSQL из .env.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --scenarios save retrieval --save-sizes 10 100 1000
+    python -m benchmarks.run --scenarios import --catalog        # с Selenium, нужен Chrome
+    python -m benchmarks.compare baseline.json results.json
+
+Сценарии:
+    import    — загрузка сообществ из заглушки VK (get_community_data_by_id), групп в секунду и разбивка по стадиям
+    save      — save_group_data для групп разного размера (постов + товаров + услуг)
+    retrieval — задержка hybrid_search (p50/p95/p99)
+    chat      — generate_post_from_context целиком, с параллельными запросами к LLM-заглушке
+
+Группы бенчмарка получают ID от GROUP_ID_BASE и удаляются из БД после прогона.
+Лимит VK API поднимается (--vk-rate), чтобы замер показывал наш код, а не паузы токен-бакета.
+Код выхода 1, если хотя бы один сценарий завершился ошибкой.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stubs import StubData, start_stub_server, benchmark_group_ids, GROUP_ID_BASE
+
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("import", "save", "retrieval", "chat")
+
+QUERIES = [
+    "Напиши пост про скидку на кружки",
+    "Сколько стоит набор тарелок?",
+    "Пост про мастер-класс в выходные",
+    "Расскажи о доставке по городу",
+    "Подарок на праздник ручной работы",
+    "Новинки коллекции этого сезона",
+]
+
+# Диапазоны ID для сценариев, чтобы группы не пересекались между собой
+SAVE_GROUP_OFFSET = 100_000
+SEARCH_GROUP_OFFSET = 200_000
+
+
+def percentiles(values: list[float]) -> dict:
+    """p50/p95/p99 и максимум в миллисекундах"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def stage_totals(operation: str) -> dict[str, tuple[float, float]]:
+    """Сумма времени и число замеров по стадиям операции из гистограммы autosmm_stage_seconds"""
+    from app.core.metrics import STAGE_SECONDS
+
+    totals: dict[str, list[float]] = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.labels.get("operation") != operation:
+                continue
+            entry = totals.setdefault(sample.labels["stage"], [0.0, 0.0])
+            if sample.name.endswith("_sum"):
+                entry[0] = sample.value
+            elif sample.name.endswith("_count"):
+                entry[1] = sample.value
+    return {name: (total, count) for name, (total, count) in totals.items()}
+
+
+def stage_breakdown(operation: str, before: dict) -> dict:
+    """Среднее время стадий операции (мс) с момента снимка before"""
+    breakdown = {}
+    for name, (total, count) in stage_totals(operation).items():
+        previous_total, previous_count = before.get(name, (0.0, 0.0))
+        if count > previous_count:
+            breakdown[f"{name}_ms"] = round((total - previous_total) / (count - previous_count) * 1000, 2)
+    return breakdown
+
+
+def synthetic_community(data: StubData, group_id: int, size: int) -> dict:
+    """Данные сообщества в формате get_community_data_by_id: 60% постов, по 20% товаров и услуг"""
+    info = data.group(group_id)
+    posts_count = max(1, size * 3 // 5)
+    items_count = max(0, (size - posts_count) // 2)
+    posts = []
+    for i in range(posts_count):
+        text = data.sentence(data.rng_for("save", group_id, i), data.words_per_post)
+        posts.append({
+            "date": datetime.fromtimestamp(1_700_000_000 - i * 3600).isoformat(),
+            "text": text,
+            "hashtags": [tag for tag in text.split() if tag.startswith("#")],
+            "likes": i % 300,
+            "comments": i % 40,
+            "reposts": i % 20,
+        })
+    return {
+        "community": {
+            "id": group_id,
+            "name": info["name"],
+            "description": info["description"],
+            "subscribers_count": info["members_count"],
+        },
+        "posts": posts,
+        "products": [data.catalog_item("market", group_id, i) for i in range(1, items_count + 1)],
+        "services": [data.catalog_item("uslugi", group_id, i) for i in range(1, size - posts_count - items_count + 1)],
+    }
+
+
+def warm_up() -> float:
+    """Загрузка модели эмбеддингов не должна попадать в замеры сценариев"""
+    from app.services.embeddings import get_embeddings
+
+    started = time.perf_counter()
+    get_embeddings().embed_query("прогрев")
+    return round(time.perf_counter() - started, 2)
+
+
+def scenario_import(args, data: StubData) -> dict:
+    from app.core.metrics import stage
+    from app.services.vk_service import get_community_data_by_id, get_community_info, get_community_posts
+
+    def fetch(group_id: int) -> float:
+        started = time.perf_counter()
+        if args.catalog:
+            result = get_community_data_by_id(str(group_id))
+        else:
+            # Без Selenium — те же стадии VK API, что и в get_community_data_by_id
+            with stage("fetch", "vk_info", vk_group_id=group_id):
+                result = get_community_info(str(group_id))
+            with stage("fetch", "vk_posts", vk_group_id=group_id):
+                result = result and get_community_posts(str(group_id))
+        if not result:
+            raise RuntimeError(f"Группа {group_id} не загрузилась из заглушки")
+        return time.perf_counter() - started
+
+    group_ids = benchmark_group_ids(args.groups)
+    before = stage_totals("fetch")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.import_concurrency) as pool:
+        latencies = list(pool.map(fetch, group_ids))
+    elapsed = time.perf_counter() - started
+    return {
+        "groups": len(group_ids),
+        "catalog": args.catalog,
+        "concurrency": args.import_concurrency,
+        "total_seconds": round(elapsed, 3),
+        "groups_per_second": round(len(group_ids) / elapsed, 2),
+        "latency": percentiles(latencies),
+        "stages": stage_breakdown("fetch", before),
+    }
+
+
+def scenario_save(args, data: StubData) -> dict:
+    from app.core.db import SessionLocal
+    from app.services.vk_service import save_group_data
+
+    results = {"warmup_seconds": warm_up()}
+    for size in args.save_sizes:
+        group_id = GROUP_ID_BASE + SAVE_GROUP_OFFSET + size
+        community = synthetic_community(data, group_id, size)
+        before = stage_totals("import")
+        timings = []
+        for _ in range(args.repeat):
+            with SessionLocal() as db:
+                started = time.perf_counter()
+                save_group_data(db, None, community)
+                timings.append(time.perf_counter() - started)
+        median = statistics.median(timings)
+        results[f"size_{size}"] = {
+            "median_ms": round(median * 1000, 2),
+            "items_per_second": round(size / median, 1),
+            "stages": stage_breakdown("import", before),
+        }
+    return results
+
+
+def _prepare_search_group(args, data: StubData) -> int:
+    from app.core.db import SessionLocal
+    from app.services.vk_service import save_group_data
+
+    group_id = GROUP_ID_BASE + SEARCH_GROUP_OFFSET
+    with SessionLocal() as db:
+        save_group_data(db, None, synthetic_community(data, group_id, args.search_group_size))
+    return group_id
+
+
+def scenario_retrieval(args, data: StubData) -> dict:
+    from app.services.retrieval import hybrid_search
+
+    warmup = warm_up()
+    group_id = _prepare_search_group(args, data)
+    hybrid_search(group_id, QUERIES[0])
+
+    before = stage_totals("retrieval")
+    latencies = []
+    for i in range(args.queries):
+        started = time.perf_counter()
+        hybrid_search(group_id, f"{QUERIES[i % len(QUERIES)]} {i}")
+        latencies.append(time.perf_counter() - started)
+    return {
+        "warmup_seconds": warmup,
+        "documents": args.search_group_size,
+        "queries": args.queries,
+        "latency": percentiles(latencies),
+        "queries_per_second": round(len(latencies) / sum(latencies), 1),
+        "stages": stage_breakdown("retrieval", before),
+    }
+
+
+def scenario_chat(args, data: StubData) -> dict:
+    from app.core.db import SessionLocal
+    from app.services.generator import generate_post_from_context
+
+    warmup = warm_up()
+    group_id = _prepare_search_group(args, data)
+
+    async def one(i: int) -> float:
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            result = await generate_post_from_context(db, f"{QUERIES[i % len(QUERIES)]} {i}", group_id, tenant=i)
+            if not result:
+                raise RuntimeError("Пустой ответ генерации")
+            return time.perf_counter() - started
+
+    async def run_all() -> tuple[list[float], float]:
+        semaphore = asyncio.Semaphore(args.chat_concurrency)
+
+        async def limited(i: int) -> float:
+            async with semaphore:
+                return await one(i)
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(limited(i) for i in range(args.chat_requests)))
+        return latencies, time.perf_counter() - started
+
+    before = stage_totals("chat")
+    latencies, elapsed = asyncio.run(run_all())
+    return {
+        "warmup_seconds": warmup,
+        "requests": args.chat_requests,
+        "concurrency": args.chat_concurrency,
+        "llm_stub_delay": args.llm_latency_ms,
+        "latency": percentiles(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "stages": stage_breakdown("chat", before),
+    }
+
+
+def cleanup(args):
+    """Удаляет группы бенчмарка; посты, товары, профили и кэш удаляются каскадом"""
+    from sqlalchemy import text
+    from app.core.db import engine
+
+    group_ids = (
+        benchmark_group_ids(args.groups)
+        + [GROUP_ID_BASE + SAVE_GROUP_OFFSET + size for size in args.save_sizes]
+        + [GROUP_ID_BASE + SEARCH_GROUP_OFFSET]
+    )
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM groups WHERE vk_group_id = ANY(:ids)"), {"ids": group_ids})
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(args, base_url: str, chroma_path: str):
+    """Переменные окружения задаются до импорта app: config читает их один раз при импорте"""
+    os.environ["VK_API_URL"] = f"{base_url}/method"
+    os.environ["VK_WEB_URL"] = base_url
+    os.environ["LLM_BASE_URL"] = f"{base_url}/v1"
+    os.environ["VK_API_RATE_PER_SECOND"] = str(args.vk_rate)
+    os.environ["CHROMA_DB_PATH"] = chroma_path
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    os.environ["METRICS_ENABLED"] = "true"
+    os.environ.setdefault("ACCESS_TOKEN", "benchmark")
+    os.environ.setdefault("API_VERSION", "5.199")
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ.setdefault("AI_MODEL", "benchmark-stub")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки импорта, сохранения, поиска и чата")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--groups", type=int, default=20, help="Групп в сценарии import")
+    parser.add_argument("--import-concurrency", type=int, default=4)
+    parser.add_argument("--catalog", action="store_true", help="Разбирать товары и услуги через Selenium (нужен Chrome)")
+    parser.add_argument("--catalog-items", type=int, default=15)
+    parser.add_argument("--vk-rate", type=float, default=1000, help="Лимит запросов к заглушке VK в секунду")
+    parser.add_argument("--save-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого размера в сценарии save")
+    parser.add_argument("--search-group-size", type=int, default=300, help="Документов в группе для retrieval и chat")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chat-requests", type=int, default=20)
+    parser.add_argument("--chat-concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--keep-data", action="store_true", help="Не удалять группы бенчмарка из БД")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    data = StubData(seed=args.seed, catalog_items=args.catalog_items)
+    server = start_stub_server(data=data, llm_latency_ms=args.llm_latency_ms, llm_jitter_ms=args.llm_jitter_ms)
+    chroma_dir = tempfile.TemporaryDirectory(prefix="autosmm-bench-")
+    configure_environment(args, server.base_url, chroma_dir.name)
+
+    from app.core.config import EMBEDDING_BACKEND
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_backend": EMBEDDING_BACKEND,
+            "params": vars(args),
+        },
+        "scenarios": {},
+    }
+    failed = False
+    runners = {"import": scenario_import, "save": scenario_save, "retrieval": scenario_retrieval, "chat": scenario_chat}
+    try:
+        for name in args.scenarios:
+            print(f"▶️ {name}", file=sys.stderr)
+            try:
+                report["scenarios"][name] = runners[name](args, data)
+            except Exception as e:
+                # Один упавший сценарий (например, нет Chrome) не мешает остальным
+                logger.exception(f"❌ Сценарий {name} завершился ошибкой")
+                report["scenarios"][name] = {"error": repr(e)}
+                failed = True
+    finally:
+        if not args.keep_data and any(name != "import" for name in args.scenarios):
+            try:
+                cleanup(args)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось удалить группы бенчмарка: {e}")
+        server.shutdown()
+        chroma_dir.cleanup()
+
+    report["meta"]["stub_requests"] = server.stats()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
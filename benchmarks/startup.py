@@ -0,0 +1,107 @@
+"""
+Время старта приложения и разбивка импорта по пакетам.
+
+    python -m benchmarks.startup --budget 3 --top 20
+
+Импорт main выполняется в чистом процессе с `-X importtime` несколько раз, берётся медиана.
+Скрипт завершается с кодом 1, если медиана превышает --budget секунд или при старте
+импортирован один из тяжёлых пакетов, которые должны загружаться лениво (HEAVY_MODULES).
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+# Пакеты, которые нужны только отдельным подсистемам и не должны попадать в импорт main
+HEAVY_MODULES = [
+    "selenium",
+    "webdriver_manager",
+    "chromadb",
+    "langchain_chroma",
+    "langchain_openai",
+    "langchain_huggingface",
+    "sentence_transformers",
+    "transformers",
+    "torch",
+    "onnxruntime",
+]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_import(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Возвращает общее время импорта (с) и строки importtime: (модуль, self мкс, cumulative мкс)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Импорт {module} завершился ошибкой:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    total = sum(self_us for _, self_us, _ in rows) / 1e6
+    return total, rows
+
+
+def package_breakdown(rows: list[tuple[str, int, int]]) -> dict[str, float]:
+    """Собственное время импорта, сгруппированное по пакету верхнего уровня (мс)"""
+    packages: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    return {name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda x: -x[1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль импорта при старте приложения")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget", type=float, help="Максимально допустимое время импорта, с")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    runs = [profile_import(args.module) for _ in range(args.runs)]
+    median = statistics.median(total for total, _ in runs)
+    rows = runs[-1][1]
+    imported = {name.split(".")[0] for name, _, _ in rows}
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+
+    report = {
+        "module": args.module,
+        "runs": [round(total, 3) for total, _ in runs],
+        "median_seconds": round(median, 3),
+        "budget_seconds": args.budget,
+        "heavy_modules_imported": heavy,
+        "packages_ms": dict(list(package_breakdown(rows).items())[:args.top]),
+        "slowest_modules_ms": {
+            name: round(self_us / 1000, 1)
+            for name, self_us, _ in sorted(rows, key=lambda r: -r[1])[:args.top]
+        },
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = False
+    if heavy:
+        print(f"❌ При старте импортированы тяжёлые пакеты: {', '.join(heavy)}")
+        failed = True
+    if args.budget is not None and median > args.budget:
+        print(f"❌ Старт {median:.2f} с превышает бюджет {args.budget:.2f} с")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
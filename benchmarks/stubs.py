@@ -0,0 +1,308 @@
+"""
+Локальные заглушки внешних сервисов для бенчмарков: VK API, страницы товаров и услуг, OpenAI-совместимая LLM.
+
+    python -m benchmarks.stubs --port 8765 --llm-latency-ms 800
+
+Один HTTP-сервер обслуживает всё сразу:
+    /method/groups.getById, /method/wall.get, /method/utils.resolveScreenName — VK API (VK_API_URL=<адрес>/method)
+    /market-<id>, /uslugi-<id> и страницы позиций — разметка, которую разбирает Selenium (VK_WEB_URL=<адрес>)
+    /v1/chat/completions — ответ LLM с заданной задержкой (LLM_BASE_URL=<адрес>/v1)
+
+Данные синтетические, но детерминированные: одна и та же группа при любом запуске даёт те же посты,
+товары и цены (генератор инициализируется её ID и --seed), поэтому результаты прогонов сравнимы.
+"""
+import json
+import itertools
+import time
+import random
+import logging
+import argparse
+import threading
+from html import escape
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "кружка керамика ручная работа подарок скидка доставка мастер-класс глазурь набор чашка тарелка "
+    "ваза новинка акция выходные город заказ цвет сезон коллекция упаковка праздник уют дом кухня"
+).split()
+HASHTAGS = ["#керамика", "#подарки", "#скидки", "#ручнаяработа", "#новинки", "#мастеркласс"]
+
+# ID группы начинаются с этого числа, чтобы не пересекаться с реальными в общей БД
+GROUP_ID_BASE = 900_000_000
+
+
+def benchmark_group_ids(count: int) -> list[int]:
+    return [GROUP_ID_BASE + i for i in range(1, count + 1)]
+
+
+class StubData:
+    """Синтетическое содержимое групп; всё вычисляется из (seed, group_id) без хранения"""
+
+    def __init__(self, seed: int = 42, posts: int = 15, catalog_items: int = 15, words_per_post: int = 60):
+        self.seed = seed
+        self.posts = posts
+        self.catalog_items = catalog_items
+        self.words_per_post = words_per_post
+
+    def rng_for(self, *key) -> random.Random:
+        return random.Random(f"{self.seed}:{':'.join(map(str, key))}")
+
+    def sentence(self, rng: random.Random, words: int) -> str:
+        text = " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+        return text + " " + " ".join(rng.sample(HASHTAGS, 2))
+
+    def group(self, group_id: int) -> dict:
+        rng = self.rng_for("group", group_id)
+        return {
+            "id": group_id,
+            "name": f"Мастерская {group_id}",
+            "screen_name": f"shop{group_id}",
+            "description": self.sentence(rng, 30),
+            "members_count": rng.randint(100, 200_000),
+        }
+
+    def posts_for(self, group_id: int, count: int) -> list[dict]:
+        rng = self.rng_for("posts", group_id)
+        now = 1_700_000_000
+        items = []
+        for i in range(min(count, self.posts)):
+            post = {
+                "id": i + 1,
+                "date": now - i * 86_400 - rng.randint(0, 3600),
+                "text": self.sentence(rng, rng.randint(self.words_per_post // 2, self.words_per_post)),
+                "likes": {"count": rng.randint(0, 500)},
+                "comments": {"count": rng.randint(0, 50)},
+                "reposts": {"count": rng.randint(0, 30)},
+            }
+            # Немного постов без текста — как в реальных группах
+            if i % 7 == 6:
+                post["text"] = ""
+                post["attachments"] = [{"type": "photo"}]
+            items.append(post)
+        return items
+
+    def catalog_item(self, kind: str, group_id: int, item_id: int) -> dict:
+        rng = self.rng_for(kind, group_id, item_id)
+        title = " ".join(rng.choice(WORDS) for _ in range(3)).capitalize()
+        return {
+            "name": f"{title} №{item_id}",
+            "price": f"{rng.randint(1, 200) * 50} ₽",
+            "description": self.sentence(rng, 25),
+        }
+
+
+def _resolve_group_id(value: str) -> int | None:
+    value = value.lower()
+    for prefix in ("shop", "club", "public"):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    return int(value) if value.isdigit() else None
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: dict, status: int = 200):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode(), "application/json; charset=utf-8")
+
+    def _send_html(self, body: str, status: int = 200):
+        self._send(status, f"<!DOCTYPE html><html><body>{body}</body></html>".encode(), "text/html; charset=utf-8")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        self.server.count(parsed.path)
+        if parsed.path.startswith("/method/"):
+            self._vk_method(parsed.path[len("/method/"):], params)
+        elif parsed.path.startswith(("/market-", "/uslugi-")):
+            self._catalog(parsed.path.strip("/"))
+        elif parsed.path == "/health":
+            self._send_json({"status": "ok", "requests": self.server.stats()})
+        else:
+            self._send_html("Not found", 404)
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        self.server.count(parsed.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if parsed.path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completion(body)
+        else:
+            self._send_json({"error": {"message": "not found"}}, 404)
+
+    # --- VK API ---
+
+    def _vk_method(self, method: str, params: dict):
+        data = self.server.data
+        if method == "utils.resolveScreenName":
+            group_id = _resolve_group_id(params.get("screen_name", ""))
+            response = {"type": "group", "object_id": group_id} if group_id else []
+            self._send_json({"response": response})
+        elif method == "groups.getById":
+            raw = params.get("group_ids") or params.get("group_id") or ""
+            ids = [_resolve_group_id(value) for value in raw.split(",") if value]
+            groups = [data.group(group_id) for group_id in ids if group_id]
+            if not groups:
+                self._send_json({"error": {"error_code": 100, "error_msg": "group_ids is undefined"}})
+                return
+            self._send_json({"response": groups})
+        elif method == "wall.get":
+            group_id = abs(int(params.get("owner_id", "0")))
+            items = data.posts_for(group_id, int(params.get("count", 15)))
+            self._send_json({"response": {"count": len(items), "items": items}})
+        else:
+            self._send_json({"error": {"error_code": 3, "error_msg": f"Unknown method {method}"}})
+
+    # --- Страницы товаров и услуг ---
+
+    def _catalog(self, path: str):
+        # market-<id>, market-<id>/item-<n>, uslugi-<id>, uslugi-<id>/item-<n>
+        section, _, item = path.partition("/")
+        kind, _, group_id = section.partition("-")
+        if not group_id.isdigit():
+            self._send_html("Not found", 404)
+            return
+        group_id = int(group_id)
+        data = self.server.data
+        if not item:
+            rows = "".join(
+                f'<div class="market_row"><a href="/{kind}-{group_id}/item-{n}">Позиция {n}</a></div>'
+                for n in range(1, data.catalog_items + 1)
+            )
+            self._send_html(rows)
+            return
+        item_id = int(item.removeprefix("item-"))
+        entry = data.catalog_item(kind, group_id, item_id)
+        self._send_html(
+            f'<h1 data-testid="market_item_page_title">{escape(entry["name"])}</h1>'
+            f'<div data-testid="market_item_page_price">{escape(entry["price"])}</div>'
+            f'<div data-testid="showmoretext-in">{escape(entry["description"])}</div>'
+        )
+
+    # --- OpenAI-совместимая LLM ---
+
+    def _chat_completion(self, body: dict):
+        server = self.server
+        delay = max(0.0, server.llm_latency + server.rng_uniform(-server.llm_jitter, server.llm_jitter))
+        time.sleep(delay)
+        prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+        content = (
+            "🎉 Новинка недели! " + " ".join(WORDS[i % len(WORDS)] for i in range(server.llm_completion_words))
+            + " " + " ".join(HASHTAGS[:3])
+        )
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        self._send_json({
+            "id": f"chatcmpl-stub-{next(server.completion_ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, data: StubData, llm_latency_ms: float = 500, llm_jitter_ms: float = 100,
+                 llm_completion_words: int = 120):
+        super().__init__(address, StubRequestHandler)
+        self.data = data
+        self.llm_latency = llm_latency_ms / 1000
+        self.llm_jitter = llm_jitter_ms / 1000
+        self.llm_completion_words = llm_completion_words
+        self._rng = random.Random(data.seed)
+        self._lock = threading.Lock()
+        self._requests: dict[str, int] = {}
+        self.completion_ids = itertools.count(1)
+
+    def rng_uniform(self, low: float, high: float) -> float:
+        with self._lock:
+            return self._rng.uniform(low, high)
+
+    def count(self, path: str) -> int:
+        # Страницы каталога считаем по разделу (/market, /uslugi), а не по каждой позиции
+        key = path if path.startswith(("/method/", "/v1/")) else path.split("-", 1)[0]
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            return self._requests[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._requests)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    data: StubData | None = None,
+    **llm_options,
+) -> StubServer:
+    """Запускает заглушки в фоновом потоке; port=0 — свободный порт, адрес в server.base_url"""
+    server = StubServer((host, port), data or StubData(), **llm_options)
+    threading.Thread(target=server.serve_forever, name="benchmark-stubs", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушки VK API, страниц каталога и LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--posts", type=int, default=15, help="Постов в группе (VK отдаёт не больше count)")
+    parser.add_argument("--catalog-items", type=int, default=15, help="Товаров и услуг на странице группы")
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = StubServer(
+        (args.host, args.port),
+        StubData(seed=args.seed, posts=args.posts, catalog_items=args.catalog_items),
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+    )
+    logger.info(
+        f"🧪 Заглушки на {server.base_url}: VK_API_URL={server.base_url}/method "
+        f"VK_WEB_URL={server.base_url} LLM_BASE_URL={server.base_url}/v1"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Нагрузочный тест чата: N websocket-сессий по M группам с реалистичной смесью сообщений.
+
+    python -m benchmarks.websocket_load --spawn --sessions 50 --group-ids 900200000 --duration 60
+    python -m benchmarks.websocket_load --url http://127.0.0.1:8000 --server-pid 12345 --sessions 20 --group-ids 1 2 3
+
+--spawn поднимает заглушку LLM (benchmarks/stubs.py) и отдельный процесс uvicorn main:app, направленный на неё;
+без --spawn тест идёт на уже запущенный сервер (LLM_BASE_URL у него должен указывать на заглушку).
+--seed-groups заранее сохраняет синтетические группы в PostgreSQL и ChromaDB сервера (как сценарий save в benchmarks.run).
+
+Пользователи (--users) регистрируются и входят через /users/register и /users/login, сессии распределяются
+по ним по кругу. Каждая сессия отправляет сообщения по одному, ждёт ответ и делает паузу --think-ms.
+
+Отчёт: время до первого кадра ответа (TTFB) и до полного ответа (p50/p95/p99) в целом и по типам сообщений,
+доля ошибок и перегрузок, RSS сервера во времени (из /proc/<pid>/status, только Linux).
+Сервер сейчас отправляет ответ одним кадром, поэтому TTFB и полное время почти совпадают — разница появится
+с потоковой отдачей. Код выхода 1 при превышении --max-error-rate или --max-p95-ms.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import httpx
+import websockets
+from benchmarks.run import percentiles, git_commit
+
+logger = logging.getLogger(__name__)
+
+FREE_FORM_MESSAGES = [
+    "Напиши пост про скидку 20% на кружки до конца недели",
+    "Сделай анонс мастер-класса по гончарному делу в субботу",
+    "Придумай пост про новогодние подарки для коллег",
+    "Напиши короткий пост о бесплатной доставке по городу",
+    "Сделай пост про новую коллекцию тарелок, добавь хэштеги",
+    "Перепиши последний пост более дружелюбно",
+    "Пост-знакомство с командой мастерской",
+]
+DEFAULT_MIX = "chat=0.8,auto_idea=0.1,growth_plan=0.1"
+
+# Начало ответа, который сервер отправляет при перегрузке шлюза LLM (app/api/posts.py)
+OVERLOADED_PREFIX = "⚠️ Сервис генерации сейчас перегружен"
+
+
+def parse_mix(value: str) -> list[tuple[str, float]]:
+    """"chat=0.8,auto_idea=0.1,growth_plan=0.1" -> [("chat", 0.8), ...]"""
+    mix = []
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("chat", "auto_idea", "growth_plan", "auto_idea:regenerate", "growth_plan:regenerate"):
+            raise argparse.ArgumentTypeError(f"Неизвестный тип сообщения: {kind}")
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+
+def read_rss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class LoadStats:
+    def __init__(self):
+        self.results: list[dict] = []
+        self.connect_errors: list[str] = []
+        self.open_sessions = 0
+        self.rss_timeline: list[dict] = []
+
+    def summary(self, elapsed: float) -> dict:
+        completed = [r for r in self.results if r["status"] == "ok"]
+        by_kind = {}
+        for kind in sorted({r["kind"] for r in self.results}):
+            ok = [r for r in completed if r["kind"] == kind]
+            by_kind[kind] = {
+                "messages": sum(1 for r in self.results if r["kind"] == kind),
+                "ttfb": percentiles([r["ttfb"] for r in ok]),
+                "full": percentiles([r["full"] for r in ok]),
+            }
+        counts = {}
+        for r in self.results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        total = len(self.results)
+        # Несостоявшееся подключение — тоже неудачная попытка пользователя
+        attempts = total + len(self.connect_errors)
+        failed = attempts - len(completed)
+        rss_values = [point["rss_mb"] for point in self.rss_timeline if point["rss_mb"] is not None]
+        return {
+            "messages": total,
+            "statuses": counts,
+            "connect_errors": len(self.connect_errors),
+            "error_rate": round(failed / attempts, 4) if attempts else None,
+            "messages_per_second": round(len(completed) / elapsed, 2) if elapsed else None,
+            "ttfb": percentiles([r["ttfb"] for r in completed]),
+            "full": percentiles([r["full"] for r in completed]),
+            "by_kind": by_kind,
+            "server_rss": {
+                "start_mb": round(rss_values[0], 1) if rss_values else None,
+                "peak_mb": round(max(rss_values), 1) if rss_values else None,
+                "end_mb": round(rss_values[-1], 1) if rss_values else None,
+            },
+        }
+
+
+async def login_users(base_url: str, count: int, password: str) -> list[str]:
+    """Регистрирует (если нужно) и авторизует пользователей нагрузки; возвращает токены"""
+    tokens = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for i in range(count):
+            email = f"loadtest{i}@example.com"
+            # 400 — пользователь уже есть с прошлого прогона
+            await client.post("/users/register", json={"username": f"loadtest{i}", "email": email, "password": password})
+            response = await client.post("/users/login", json={"email": email, "password": password})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def run_session(
+    ws_url: str, token: str, group_id: int, deadline: float, args, mix: list[tuple[str, float]],
+    stats: LoadStats, rng: random.Random,
+):
+    kinds, weights = zip(*mix)
+    try:
+        connection = await websockets.connect(
+            f"{ws_url}/posts/ws/{group_id}?token={token}", open_timeout=30, max_size=None,
+        )
+    except Exception as e:
+        stats.connect_errors.append(repr(e))
+        return
+
+    stats.open_sessions += 1
+    sent = 0
+    try:
+        async with connection:
+            while time.monotonic() < deadline and (not args.messages_per_session or sent < args.messages_per_session):
+                kind = rng.choices(kinds, weights)[0]
+                message = rng.choice(FREE_FORM_MESSAGES) if kind == "chat" else kind
+                result = {"kind": kind.split(":")[0], "group_id": group_id, "ttfb": None, "full": None}
+                started = time.perf_counter()
+                try:
+                    await connection.send(message)
+                    parts = []
+                    async with asyncio.timeout(args.response_timeout):
+                        async for fragment in connection.recv_streaming():
+                            if result["ttfb"] is None:
+                                result["ttfb"] = time.perf_counter() - started
+                            parts.append(fragment)
+                    result["full"] = time.perf_counter() - started
+                    text = "".join(parts)
+                    if text.startswith(OVERLOADED_PREFIX):
+                        result["status"] = "overloaded"
+                    elif not text.strip():
+                        result["status"] = "empty"
+                    else:
+                        result["status"] = "ok"
+                except TimeoutError:
+                    result["status"] = "timeout"
+                except websockets.ConnectionClosed as e:
+                    result["status"] = f"closed_{e.rcvd.code if e.rcvd else 'abnormal'}"
+                stats.results.append(result)
+                sent += 1
+                if result["status"] not in ("ok", "overloaded", "empty"):
+                    break
+                await asyncio.sleep(args.think_ms / 1000 * rng.uniform(0.5, 1.5))
+    except Exception as e:
+        stats.connect_errors.append(repr(e))
+    finally:
+        stats.open_sessions -= 1
+
+
+async def sample_rss(pid: int | None, interval: float, started: float, stats: LoadStats):
+    while True:
+        rss = read_rss_mb(pid) if pid else None
+        stats.rss_timeline.append({
+            "t": round(time.monotonic() - started, 1),
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "sessions": stats.open_sessions,
+        })
+        await asyncio.sleep(interval)
+
+
+async def run_load(args, base_url: str, server_pid: int | None) -> dict:
+    mix = parse_mix(args.mix)
+    tokens = await login_users(base_url, args.users, args.password)
+    parsed = urlparse(base_url)
+    ws_url = f"{'wss' if parsed.scheme == 'https' else 'ws'}://{parsed.netloc}"
+
+    stats = LoadStats()
+    started = time.monotonic()
+    deadline = started + args.ramp_seconds + args.duration
+    sampler = asyncio.create_task(sample_rss(server_pid, args.rss_interval, started, stats))
+
+    sessions = []
+    for i in range(args.sessions):
+        rng = random.Random(f"{args.seed}:{i}")
+        group_id = args.group_ids[i % len(args.group_ids)]
+        sessions.append(asyncio.create_task(
+            run_session(ws_url, tokens[i % len(tokens)], group_id, deadline, args, mix, stats, rng)
+        ))
+        # Сессии открываются равномерно за --ramp-seconds, а не все в одну миллисекунду
+        if args.ramp_seconds and args.sessions > 1:
+            await asyncio.sleep(args.ramp_seconds / (args.sessions - 1))
+
+    await asyncio.gather(*sessions)
+    elapsed = time.monotonic() - started
+    sampler.cancel()
+
+    summary = stats.summary(elapsed)
+    summary["elapsed_seconds"] = round(elapsed, 1)
+    summary["rss_timeline"] = stats.rss_timeline
+    if stats.connect_errors:
+        summary["connect_error_examples"] = stats.connect_errors[:5]
+    return summary
+
+
+def seed_groups(args):
+    """Сохраняет синтетические группы через save_group_data (нужен тот же PostgreSQL и CHROMA_DB_PATH, что у сервера)"""
+    from benchmarks.run import synthetic_community
+    from benchmarks.stubs import StubData
+    from app.core.db import SessionLocal
+    from app.services.vk_service import save_group_data
+
+    data = StubData(seed=args.seed)
+    for group_id in args.group_ids:
+        with SessionLocal() as db:
+            save_group_data(db, None, synthetic_community(data, group_id, args.seed_groups))
+        logger.info(f"🌱 Группа {group_id} заполнена ({args.seed_groups} записей)")
+
+
+def spawn_server(args, llm_base_url: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_BASE_URL": llm_base_url,
+        "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY", "benchmark"),
+        "AI_MODEL": os.environ.get("AI_MODEL", "benchmark-stub"),
+        "REFRESH_SCHEDULER_ENABLED": "false",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning"],
+        env=env,
+    )
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen | None, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/openapi.json", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Сервер {base_url} не ответил за {timeout} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест websocket-чата")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Адрес сервера (без --spawn)")
+    parser.add_argument("--server-pid", type=int, help="PID сервера для замера RSS (без --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Запустить заглушку LLM и uvicorn main:app")
+    parser.add_argument("--port", type=int, default=8799, help="Порт сервера при --spawn")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--group-ids", type=int, nargs="+", required=True)
+    parser.add_argument("--seed-groups", type=int, default=0, metavar="SIZE",
+                        help="Заполнить группы синтетическими данными такого размера перед тестом")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Доли типов сообщений (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument("--duration", type=float, default=60, help="Секунд нагрузки после разгона")
+    parser.add_argument("--ramp-seconds", type=float, default=10)
+    parser.add_argument("--messages-per-session", type=int, default=0, help="0 — до конца --duration")
+    parser.add_argument("--think-ms", type=float, default=2000, help="Пауза пользователя между сообщениями")
+    parser.add_argument("--response-timeout", type=float, default=300)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=300)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-error-rate", type=float, help="Допустимая доля ошибок (0.01 = 1%%)")
+    parser.add_argument("--max-p95-ms", type=float, help="Допустимый p95 полного ответа")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.seed_groups:
+        seed_groups(args)
+
+    stub_server = process = None
+    base_url, server_pid = args.url.rstrip("/"), args.server_pid
+    if args.spawn:
+        from benchmarks.stubs import start_stub_server
+        stub_server = start_stub_server(llm_latency_ms=args.llm_latency_ms, llm_jitter_ms=args.llm_jitter_ms)
+        process = spawn_server(args, f"{stub_server.base_url}/v1")
+        base_url, server_pid = f"http://127.0.0.1:{args.port}", process.pid
+
+    try:
+        wait_for_server(base_url, process)
+        summary = asyncio.run(run_load(args, base_url, server_pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if stub_server is not None:
+            stub_server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": vars(args),
+        },
+        # Тот же формат, что у benchmarks.run: результаты можно сравнить через benchmarks.compare
+        "scenarios": {"websocket": summary},
+    }
+    print(json.dumps({**report, "scenarios": {"websocket": {k: v for k, v in summary.items() if k != "rss_timeline"}}},
+                     ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = False
+    if args.max_error_rate is not None and (summary["error_rate"] is None or summary["error_rate"] > args.max_error_rate):
+        print(f"❌ Доля ошибок {summary['error_rate']} выше {args.max_error_rate}")
+        failed = True
+    if args.max_p95_ms is not None and summary["full"].get("p95_ms", float("inf")) > args.max_p95_ms:
+        print(f"❌ p95 полного ответа {summary['full'].get('p95_ms')} мс выше {args.max_p95_ms}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
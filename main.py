@@ -1,9 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.api.users import router as users_router
 from app.api.posts import router as posts_router
 from app.api.groups import router as groups_router 
 from app.api.vk import router as vk_router
+from app.api.export import router as export_router
+from app.api.calendar import router as calendar_router
+from app.api.admin import router as admin_router
+from app.services.refresh_scheduler import refresh_scheduler
+from app.services.content_versions import content_versions
+from app.services.content_calendar import resume_calendar_jobs, stop_calendar_jobs
+from app.services.pregeneration import pregenerator
+from app.core.config import REFRESH_SCHEDULER_ENABLED, METRICS_ENABLED, HTTP_CACHE_ENABLED
+from app.core.tracing import setup_tracing
 import os
 import app.core.events  # Импортируем, чтобы обработчики событий зарегистрировались
 os.environ["TOKENIZERS_PARALLELISM"] = "false" 
@@ -18,11 +28,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Трассировка OpenTelemetry (TRACING_EXPORTER=none — выключена)
+setup_tracing(app)
+
 # Подключаем API-маршруты
 app.include_router(users_router, prefix="/users", tags=["Пользователи"])
 app.include_router(posts_router, prefix="/posts", tags=["Посты"])
 app.include_router(groups_router, prefix="/groups", tags=["Группы"])
 app.include_router(vk_router, prefix="/vk", tags=["VK"])
+app.include_router(export_router, prefix="/export", tags=["Экспорт"])
+app.include_router(calendar_router, prefix="/calendar", tags=["Контент-план"])
+app.include_router(admin_router, prefix="/admin", tags=["Администрирование"])
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if REFRESH_SCHEDULER_ENABLED:
+        refresh_scheduler.start()
+    if HTTP_CACHE_ENABLED:
+        content_versions.start_listener()
+    await resume_calendar_jobs()
+    pregenerator.bind_loop()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await refresh_scheduler.stop()
+    await stop_calendar_jobs()
+    await pregenerator.stop()
+    content_versions.stop_listener()
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/")
 def root():
@@ -0,0 +1,43 @@
+"""Add group_profiles
+
+Revision ID: 7a1c3e9d5b20
+Revises: 04b4a3baadaf
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1c3e9d5b20'
+down_revision: Union[str, None] = '04b4a3baadaf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'group_profiles',
+        sa.Column('vk_group_id', sa.Integer(), nullable=False),
+        sa.Column('post_count', sa.Integer(), nullable=True),
+        sa.Column('tone', sa.String(), nullable=True),
+        sa.Column('formality', sa.String(), nullable=True),
+        sa.Column('emoji_rate', sa.Float(), nullable=True),
+        sa.Column('typical_length', sa.Integer(), nullable=True),
+        sa.Column('top_hashtags', sa.JSON(), nullable=True),
+        sa.Column('exemplars', sa.JSON(), nullable=True),
+        sa.Column('catalog_summary', sa.String(), nullable=True),
+        sa.Column('last_post_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['vk_group_id'], ['groups.vk_group_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('vk_group_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('group_profiles')
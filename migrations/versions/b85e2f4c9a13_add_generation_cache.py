@@ -0,0 +1,47 @@
+"""Add generation_cache and groups.content_version
+
+Revision ID: b85e2f4c9a13
+Revises: 7a1c3e9d5b20
+Create Date: 2026-10-19 11:04:17.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b85e2f4c9a13'
+down_revision: Union[str, None] = '7a1c3e9d5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('groups', sa.Column('content_version', sa.Integer(), server_default='0', nullable=False))
+    op.create_table(
+        'generation_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('vk_group_id', sa.Integer(), nullable=False),
+        sa.Column('command', sa.String(), nullable=False),
+        sa.Column('content_version', sa.Integer(), nullable=False),
+        sa.Column('model_version', sa.String(), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['vk_group_id'], ['groups.vk_group_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('vk_group_id', 'command', 'content_version', 'model_version', name='uq_generation_cache_key')
+    )
+    op.create_index(op.f('ix_generation_cache_id'), 'generation_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_generation_cache_vk_group_id'), 'generation_cache', ['vk_group_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_generation_cache_vk_group_id'), table_name='generation_cache')
+    op.drop_index(op.f('ix_generation_cache_id'), table_name='generation_cache')
+    op.drop_table('generation_cache')
+    op.drop_column('groups', 'content_version')
@@ -0,0 +1,28 @@
+"""Add users.last_active_at
+
+Revision ID: c3d9e1f27a64
+Revises: b85e2f4c9a13
+Create Date: 2026-10-19 15:22:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9e1f27a64'
+down_revision: Union[str, None] = 'b85e2f4c9a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('last_active_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'last_active_at')
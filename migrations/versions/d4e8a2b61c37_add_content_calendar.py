@@ -0,0 +1,71 @@
+"""Add calendar_jobs and calendar_posts
+
+Revision ID: d4e8a2b61c37
+Revises: c3d9e1f27a64
+Create Date: 2026-10-19 18:47:05.204611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8a2b61c37'
+down_revision: Union[str, None] = 'c3d9e1f27a64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'calendar_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('days', sa.Integer(), nullable=False),
+        sa.Column('posts_per_day', sa.Integer(), nullable=False),
+        sa.Column('total_posts', sa.Integer(), nullable=False),
+        sa.Column('completed_posts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('failed_posts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_calendar_jobs_id'), 'calendar_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_calendar_jobs_user_id'), 'calendar_jobs', ['user_id'], unique=False)
+    op.create_table(
+        'calendar_posts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('vk_group_id', sa.Integer(), nullable=False),
+        sa.Column('publish_date', sa.Date(), nullable=False),
+        sa.Column('slot', sa.Integer(), nullable=False),
+        sa.Column('publish_at', sa.DateTime(), nullable=True),
+        sa.Column('topic', sa.String(), nullable=True),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('generated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['calendar_jobs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['vk_group_id'], ['groups.vk_group_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_calendar_posts_id'), 'calendar_posts', ['id'], unique=False)
+    op.create_index('ix_calendar_posts_job_group', 'calendar_posts', ['job_id', 'vk_group_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_calendar_posts_job_group', table_name='calendar_posts')
+    op.drop_index(op.f('ix_calendar_posts_id'), table_name='calendar_posts')
+    op.drop_table('calendar_posts')
+    op.drop_index(op.f('ix_calendar_jobs_user_id'), table_name='calendar_jobs')
+    op.drop_index(op.f('ix_calendar_jobs_id'), table_name='calendar_jobs')
+    op.drop_table('calendar_jobs')
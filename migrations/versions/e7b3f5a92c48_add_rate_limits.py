@@ -0,0 +1,33 @@
+"""Add rate_limits
+
+Revision ID: e7b3f5a92c48
+Revises: d4e8a2b61c37
+Create Date: 2026-10-19 21:12:40.518337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3f5a92c48'
+down_revision: Union[str, None] = 'd4e8a2b61c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rate_limits',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('next_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rate_limits')
@@ -0,0 +1,61 @@
+"""
+Пакетный импорт сообществ из командной строки (тот же конвейер, что и POST /vk/bulk_import).
+
+    python -m scripts.bulk_import --email agency@example.com --file links.txt
+    python -m scripts.bulk_import --email agency@example.com https://vk.com/shop1 https://vk.com/shop2
+
+В файле — по одной ссылке на строку, строки с # пропускаются.
+Код выхода 1, если хотя бы одно сообщество не удалось импортировать.
+"""
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from app.core.db import SessionLocal
+from app.models import User
+from app.services.bulk_import import create_job, run_bulk_import
+
+
+def read_links(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный импорт сообществ ВКонтакте")
+    parser.add_argument("links", nargs="*", help="Ссылки на сообщества")
+    parser.add_argument("--file", help="Файл со ссылками, по одной на строку")
+    parser.add_argument("--email", required=True, help="Пользователь, к которому привязываются группы")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    links = list(args.links) + (read_links(args.file) if args.file else [])
+    if not links:
+        parser.error("Нужна хотя бы одна ссылка или --file")
+
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.email == args.email).first()
+    if not user:
+        print(f"❌ Пользователь {args.email} не найден")
+        sys.exit(2)
+
+    job = create_job(user.id, links)
+    asyncio.run(run_bulk_import(job))
+    report = job.to_dict()
+
+    for item in report["items"]:
+        mark = {"done": "✅", "duplicate": "↩️"}.get(item["status"], "❌")
+        details = item["error"] or (f"{item['seconds']} с" if item["seconds"] is not None else "")
+        print(f"{mark} {item['link']} -> {item['vk_group_id']} {item['status']} {details}")
+    print(f"Итого: {report['counts']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if report["counts"].get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
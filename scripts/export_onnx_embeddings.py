@@ -0,0 +1,72 @@
+"""
+Экспорт all-MiniLM-L6-v2 в ONNX с int8-квантизацией для EMBEDDING_BACKEND=onnx.
+
+Запускается один раз на машине с torch и transformers (например, на этапе сборки образа):
+    python -m scripts.export_onnx_embeddings --output models/all-MiniLM-L6-v2-onnx-int8
+
+В рабочем контейнере после этого нужны только onnxruntime и tokenizers.
+"""
+import os
+import shutil
+import argparse
+import tempfile
+from app.core.config import EMBEDDING_MODEL, EMBEDDING_ONNX_DIR
+from app.services.embeddings import ONNX_MODEL_FILE, ONNX_TOKENIZER_FILE
+
+ONNX_OPSET = 14
+
+
+def export(model_name: str, output_dir: str, quantize: bool = True):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["пример текста для экспорта"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model-fp32.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+            )
+
+        target = os.path.join(output_dir, ONNX_MODEL_FILE)
+        if quantize:
+            quantize_dynamic(fp32_path, target, weight_type=QuantType.QInt8)
+        else:
+            shutil.copy(fp32_path, target)
+
+    # Быстрый токенизатор сохраняет tokenizer.json, который читает библиотека tokenizers
+    tokenizer.save_pretrained(output_dir)
+    if not os.path.exists(os.path.join(output_dir, ONNX_TOKENIZER_FILE)):
+        raise RuntimeError("Токенизатор не сохранил tokenizer.json — нужен fast-токенизатор")
+
+    size_mb = os.path.getsize(os.path.join(output_dir, ONNX_MODEL_FILE)) / 2**20
+    print(f"✅ Модель сохранена в {output_dir} ({size_mb:.1f} МБ, int8: {quantize})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт модели эмбеддингов в ONNX")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--output", default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Сохранить fp32-модель без квантизации")
+    args = parser.parse_args()
+    export(args.model, args.output, quantize=not args.no_quantize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Загрузка NDJSON-выгрузки сообществ в PostgreSQL и ChromaDB без VK и Chrome.
+
+    python -m scripts.ingest_dump groups.ndjson.gz --email agency@example.com
+    python -m scripts.ingest_dump groups.ndjson --no-index --chunk-groups 500
+
+Прогресс сохраняется в <файл>.checkpoint: повторный запуск продолжит с последней загруженной пачки.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from app.core.db import SessionLocal
+from app.models import User
+from app.services.dump_ingest import ingest_dump
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка NDJSON-выгрузки сообществ")
+    parser.add_argument("path", help="Файл NDJSON (можно .gz)")
+    parser.add_argument("--email", help="Привязать группы к пользователю")
+    parser.add_argument("--chunk-groups", type=int, default=100, help="Групп в одной транзакции")
+    parser.add_argument("--embed-batch", type=int, default=256, help="Документов в одном батче эмбеддингов")
+    parser.add_argument("--checkpoint", help="Файл прогресса (по умолчанию <path>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Игнорировать сохранённый прогресс")
+    parser.add_argument("--no-index", action="store_true", help="Только PostgreSQL, без профилей и ChromaDB")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    checkpoint = args.checkpoint or f"{args.path}.checkpoint"
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    user_id = None
+    if args.email:
+        with SessionLocal() as db:
+            user = db.query(User).filter(User.email == args.email).first()
+        if not user:
+            print(f"❌ Пользователь {args.email} не найден")
+            sys.exit(2)
+        user_id = user.id
+
+    report = ingest_dump(
+        args.path,
+        user_id=user_id,
+        chunk_groups=args.chunk_groups,
+        embed_batch=args.embed_batch,
+        checkpoint_path=checkpoint,
+        index=not args.no_index,
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
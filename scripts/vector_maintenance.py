@@ -0,0 +1,41 @@
+"""
+Обслуживание векторного хранилища CHROMA_DB_PATH.
+
+    python -m scripts.vector_maintenance                 # отчёт о размере по коллекциям
+    python -m scripts.vector_maintenance --run --dry-run # что будет удалено и перестроено
+    python -m scripts.vector_maintenance --run --vacuum  # удалить осиротевшее, перестроить индексы, сжать sqlite
+
+Можно запускать на работающем сервисе: скорость I/O ограничена VECTOR_MAINTENANCE_IO_MB_PER_SECOND.
+"""
+import sys
+import json
+import logging
+import argparse
+from app.services.vector_maintenance import collect_report, run_maintenance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание векторного хранилища")
+    parser.add_argument("--run", action="store_true", help="Выполнить обслуживание (без флага — только отчёт)")
+    parser.add_argument("--no-gc", action="store_true", help="Не удалять данные групп, которых нет в базе")
+    parser.add_argument("--no-rebuild", action="store_true", help="Не перестраивать фрагментированные индексы")
+    parser.add_argument("--vacuum", action="store_true", help="Сжать chroma.sqlite3")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.run:
+        print(json.dumps(collect_report(), ensure_ascii=False, indent=2))
+        return
+
+    result = run_maintenance(gc=not args.no_gc, rebuild=not args.no_rebuild, vacuum=args.vacuum, dry_run=args.dry_run)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if result["status"] == "locked":
+        print("❌ Обслуживание уже выполняется")
+        sys.exit(2)
+    if result.get("errors"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()